@@ -93,6 +93,14 @@ def to_object_id(value):
     except Exception:
         return None
 
+def resolve_users(credentials, key, fields=('username', 'email')):
+    """Fetch the users referenced by ``key`` on each credential with a single ``$in`` query."""
+    ids = list({cred.get(key) for cred in credentials if cred.get(key) is not None})
+    if not ids:
+        return {}
+    projection = {field: 1 for field in fields}
+    return {user['_id']: user for user in mongo.db.users.find({'_id': {'$in': ids}}, projection)}
+
 # --- Core & Authentication Routes ---
 
 @app.route("/api")
@@ -282,8 +290,10 @@ def get_credentials(current_user):
             ]}), 200
         
         output = []
-        for credential in mongo.db.credentials.find({'recipient_id': current_user['_id']}):
-            issuer = mongo.db.users.find_one({'_id': credential['issuer_id']})
+        credentials = list(mongo.db.credentials.find({'recipient_id': current_user['_id']}))
+        users = resolve_users(credentials, 'issuer_id')
+        for credential in credentials:
+            issuer = users.get(credential['issuer_id'])
             output.append({
                 '_id': str(credential['_id']),
                 'title': credential['title'],
@@ -544,8 +554,10 @@ def get_issued_credentials(current_user):
         if mongo is None:
             return jsonify({'error': 'Database not available'}), 500
         issued_credentials = []
-        for cred in mongo.db.credentials.find({'issuer_id': current_user['_id']}):
-            recipient = mongo.db.users.find_one({'_id': cred['recipient_id']})
+        credentials = list(mongo.db.credentials.find({'issuer_id': current_user['_id']}))
+        users = resolve_users(credentials, 'recipient_id')
+        for cred in credentials:
+            recipient = users.get(cred['recipient_id'])
             issued_credentials.append({
                 '_id': str(cred['_id']),
                 'title': cred.get('title'),
@@ -606,8 +618,10 @@ def search_credentials(current_user):
         if mongo is None:
             return jsonify({'error': 'Database not available'}), 500
         results = []
-        for cred in mongo.db.credentials.find({'title': {'$regex': query, '$options': 'i'}}):
-            issuer = mongo.db.users.find_one({'_id': cred['issuer_id']})
+        credentials = list(mongo.db.credentials.find({'title': {'$regex': query, '$options': 'i'}}))
+        users = resolve_users(credentials, 'issuer_id')
+        for cred in credentials:
+            issuer = users.get(cred['issuer_id'])
             results.append({
                 '_id': str(cred['_id']),
                 'title': cred.get('title'),
@@ -1,13 +1,17 @@
 import os
+import copy
 import datetime
 import jwt
 import secrets
 import base64
 from functools import wraps
 import json
+import csv
+import hashlib
+import time
 
-from flask import Flask, request, jsonify, send_file
-from weasyprint import HTML
+import numpy as np
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 import io
 from flask_pymongo import PyMongo
 from flask_cors import CORS
@@ -17,8 +21,53 @@ from bson.objectid import ObjectId
 from werkzeug.utils import secure_filename
 from web3 import Web3
 
+from services.user_lookup import resolve_credential_users
+from services.listings import BY_ID_DESC, user_credentials, issued_credentials, all_credentials
+from services.serialization import json_serialize
+from services.chain_cache import VerificationCache, ChainEventWatcher
+from services.chain_batch import batch_verify_codes
+from services.chain_indexer import ChainIndexer
+from services.chain_confirmer import ChainConfirmer, is_transaction_hash, PENDING as CHAIN_PENDING, CONFIRMED as CHAIN_CONFIRMED
+from services.batch_stream import parse_stream_args, stream_verifications
+from services.embeddings import to_binary, from_binary, normalize
+from services.embedding_index import EmbeddingIndex
+from services.blob_store import create_blob_store, decode_image
+from services.ttl_cache import TTLCache
+from services.indexes import ensure_indexes
+from services.pagination import keyset_page, parse_page_args
+from services.streaming import iter_batches, ndjson_lines, json_array_chunks
+from services import analytics
+from services.credential_pdf import pdf_fields, cache_key, render_pdf
+from services.pdf_cache import PdfCache
+from services.pdf_bulk import start_render_pool, stream_pdf_zip
+from services.pdf_jobs import PdfJobQueue, QueueFull as PdfQueueFull
+from services.search import search_fields, search_credentials as run_search, suggest_titles, backfill_search_fields, visibility_filter
+from services.verification_log import VerificationLogWriter
+from services.bulk_issue import rows_from_csv, validate_row, upsert_recipients, build_credential, insert_credentials
+
 # --- Mock CLIP Service for functionality without the actual model ---
 class MockClipService:
+    model_name = 'mock'
+    is_ready = True
+
+    def warmup(self, batch_size=None):
+        """Nothing to load for the mock service."""
+
+    def start_background_warmup(self):
+        """Nothing to load for the mock service."""
+
+    def encode_image(self, image_b64):
+        """Mocks CLIP encoding with a deterministic unit vector derived from the image bytes."""
+        image_bytes = image_b64 if isinstance(image_b64, bytes) else decode_image(image_b64)[0]
+        seed = int.from_bytes(hashlib.sha256(image_bytes).digest()[:8], 'big')
+        return normalize(np.random.default_rng(seed).standard_normal(512))
+
+    def compare_embedding(self, image_b64, stored_embedding):
+        """Mocks comparing an image against a precomputed embedding."""
+        if image_b64 and stored_embedding is not None:
+            return {'success': True, 'similarity_score': 0.92}
+        return {'success': False, 'error': 'Invalid image data'}
+
     def compare_images(self, image1_b64, image2_b64):
         """Mocks the comparison of two base64 encoded images."""
         # In a real scenario, this would involve loading models and processing images.
@@ -37,6 +86,16 @@ load_dotenv()  # load environment variables from .env
 
 app = Flask(__name__)
 
+# PDF render processes per app process; every gunicorn worker gets its own pool, so keep it small
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+# The pool is created on the first export. Opt in to forking it now, before any background
+# thread has started (see services.pdf_bulk)
+if os.environ.get('PDF_RENDER_PREFORK', 'false').lower() == 'true':
+    try:
+        start_render_pool(PDF_RENDER_WORKERS)
+    except Exception as e:
+        print(f"⚠️ Failed to start the PDF render pool, it will be created on first export: {e}")
+
 # --- Blockchain Setup ---
 WEB3_PROVIDER_URI = os.environ.get('WEB3_PROVIDER_URI', 'http://127.0.0.1:8545')
 CONTRACT_ADDRESS = os.environ.get('CREDENTIAL_CONTRACT_ADDRESS')
@@ -63,6 +122,41 @@ try:
 except Exception as e:
     print(f'⚠️ Error initializing blockchain contract: {str(e)}')
 
+# verifyCredential results only change on registry events, so cache them per code
+verification_cache = VerificationCache(max_entries=int(os.environ.get('VERIFICATION_CACHE_SIZE', 10000)))
+if contract:
+    chain_event_watcher = ChainEventWatcher(
+        w3, contract, verification_cache,
+        poll_interval=float(os.environ.get('CHAIN_EVENT_POLL_INTERVAL', 5))
+    )
+    chain_event_watcher.start()
+
+# Local mirror of the registry events, started once the database is up
+chain_indexer = None
+
+def verify_on_chain(code):
+    """Return the verifyCredential result tuple for a verification code, from the local mirror when it is current."""
+    if chain_indexer:
+        result = chain_indexer.lookup(code)
+        if result is not None:
+            return result
+    return verification_cache.get_or_fetch(code, lambda c: contract.functions.verifyCredential(c).call())
+
+def verify_many_on_chain(codes):
+    """Resolve many codes: mirror first, then one JSON-RPC batch (through the cache) for whatever it cannot answer"""
+    results = chain_indexer.lookup_many(codes) if chain_indexer else {}
+    misses = [code for code in codes if results.get(code) is None]
+    if misses:
+        results.update(batch_verify_codes(
+            w3, WEB3_PROVIDER_URI, contract, verification_cache, misses,
+            chunk_size=int(os.environ.get('RPC_BATCH_SIZE', 200))
+        ))
+    return results
+
+# Load and warm the image model at worker boot instead of on the first verification
+if os.environ.get('CLIP_WARMUP_ON_BOOT', 'true').lower() == 'true':
+    clip_service.start_background_warmup()
+
 # --- Configurations ---
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "a_default_secret_key")
 app.config["MONGO_URI"] = os.environ.get("MONGO_URI", "mongodb://localhost:27017/blockcreds_db")
@@ -84,6 +178,42 @@ except Exception as e:
     print("🔄 Running in demo mode without database")
     mongo = None
 
+if mongo:
+    ensure_indexes(mongo.db)
+    analytics.ensure_rollups(mongo.db)
+    backfilled = backfill_search_fields(mongo.db)
+    if backfilled:
+        print(f"🔎 Added search fields to {backfilled} existing credentials")
+
+# Credential images live outside the credential documents, referenced by content hash
+blob_store = create_blob_store(mongo.db) if mongo else None
+
+# Mirror registry events into Mongo so chain reads hit an indexed local copy while it keeps up
+if mongo and contract and os.environ.get('CHAIN_INDEXER_ENABLED', 'true').lower() == 'true':
+    chain_indexer = ChainIndexer(
+        mongo.db, w3, WEB3_PROVIDER_URI, contract,
+        start_block=int(os.environ.get('CHAIN_INDEXER_START_BLOCK', 0)),
+        max_lag=int(os.environ.get('CHAIN_INDEXER_MAX_LAG', 5)),
+        poll_interval=float(os.environ.get('CHAIN_INDEXER_POLL_INTERVAL', 2))
+    )
+    chain_indexer.start()
+
+# Issuance transactions are confirmed in the background; credentials start out pending_chain
+if mongo and contract:
+    chain_confirmer = ChainConfirmer(
+        mongo.db, w3, WEB3_PROVIDER_URI,
+        confirmations=int(os.environ.get('CHAIN_CONFIRMATIONS', 2)),
+        poll_interval=float(os.environ.get('CHAIN_CONFIRM_POLL_INTERVAL', 5)),
+        timeout=float(os.environ.get('CHAIN_CONFIRM_TIMEOUT', 3600))
+    )
+    chain_confirmer.start()
+
+def initial_chain_state():
+    """Chain fields of a new credential: pending until confirmed on chain, or confirmed outright without a contract"""
+    if contract:
+        return {'chain_status': CHAIN_PENDING, 'is_verified': False, 'next_check_at': datetime.datetime.utcnow()}
+    return {'chain_status': CHAIN_CONFIRMED, 'is_verified': True}
+
 CORS(app, resources={r"/api/*": {
     "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
     "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
@@ -94,6 +224,12 @@ CORS(app, resources={r"/api/*": {
 bcrypt = Bcrypt(app)
 
 
+# User documents (without the password hash) loaded by token_required, keyed by the user id string from the JWT
+user_cache = TTLCache(
+    max_entries=int(os.environ.get('USER_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('USER_CACHE_TTL', 30))
+)
+
 # --- Helper Functions & Decorators ---
 def token_required(f):
     @wraps(f)
@@ -110,7 +246,14 @@ def token_required(f):
         try:
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
             if mongo:
-                current_user = mongo.db.users.find_one({'_id': ObjectId(data['user_id'])})
+                current_user = user_cache.get(data['user_id'])
+                if current_user is None:
+                    # The password hash never enters the cache (nor reaches handlers)
+                    current_user = mongo.db.users.find_one({'_id': ObjectId(data['user_id'])}, {'password': 0})
+                    if current_user:
+                        user_cache.set(data['user_id'], current_user)
+                # Handlers get their own copy so they cannot mutate the cached document
+                current_user = copy.deepcopy(current_user) if current_user else None
             else:
                 # Demo mode user
                 current_user = {
@@ -146,19 +289,27 @@ def to_object_id(value):
     except Exception:
         return None
 
-def json_serialize(obj):
-    """Helper function to convert non-serializable types to JSON serializable format."""
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    if isinstance(obj, datetime.datetime):
-        return obj.isoformat()
-    if isinstance(obj, bytes):
-        return base64.b64encode(obj).decode('utf-8')
-    if isinstance(obj, dict):
-        return {k: json_serialize(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [json_serialize(item) for item in obj]
-    return obj
+def load_credential_image(credential):
+    """Return the stored image bytes of a credential, or None if it has no image."""
+    if credential.get('image_ref'):
+        return blob_store.get(credential['image_ref'])
+    if credential.get('image'):
+        # Legacy document that still embeds the base64 image
+        return decode_image(credential['image'])[0]
+    return None
+
+def release_images(image_refs):
+    """Drop one reference per deleted credential; a blob is deleted once no credential uses it."""
+    for ref in filter(None, image_refs):
+        blob_store.release(ref)
+
+def paginate(collection, query, sort, projection=None):
+    """
+    Fetch the page selected by the request's ``limit``/``cursor`` args
+    :return: Tuple of ``(documents, next_cursor)``; raises ``ValueError`` on bad args
+    """
+    limit, cursor = parse_page_args(request.args)
+    return keyset_page(collection, query, sort, limit, cursor, projection)
 
 # --- Core & Authentication Routes ---
 # --- Hardcoded Admin User ---
@@ -175,6 +326,7 @@ def ensure_admin_user():
                 "password": hashed_pw,
                 "role": "admin"
             })
+            analytics.record_users(mongo.db, 1)
             print("[INFO] Hardcoded admin user created.")
         elif admin.get("role") != "admin":
             mongo.db.users.update_one({"email": admin_email}, {"$set": {"role": "admin"}})
@@ -182,10 +334,35 @@ def ensure_admin_user():
 
 ensure_admin_user()
 
+# Minimum CLIP similarity for an uploaded image to count as a match
+SIMILARITY_THRESHOLD = 0.85
+
+# In-memory index of stored image embeddings for reverse image lookup; IVF lists probed per query once large
+embedding_index = EmbeddingIndex(nprobe=int(os.environ.get('EMBEDDING_INDEX_NPROBE', 32)))
+if mongo:
+    try:
+        print(f"✅ Loaded {embedding_index.load(mongo.db, clip_service.model_name)} image embeddings into lookup index")
+    except Exception as e:
+        print(f"⚠️ Failed to load image embedding index: {e}")
+
 @app.route("/api")
 def index():
     return jsonify({"message": "Welcome to the BlockCreds API!"})
 
+@app.route('/api/health/ready', methods=['GET'])
+def readiness():
+    """
+    Readiness probe: 503 until the image model has completed a forward pass.
+    Read-only: the warmup started at boot retries until it succeeds; with
+    CLIP_WARMUP_ON_BOOT=false the first request that needs the model loads it.
+    """
+    ready = clip_service.is_ready
+    return jsonify({
+        'ready': ready,
+        'clip_model': clip_service.model_name,
+        'database': mongo is not None
+    }), 200 if ready else 503
+
 @app.route('/api/register', methods=['POST'])
 def register():
     try:
@@ -222,6 +399,7 @@ def register():
         }
         
         new_user_id = users.insert_one(user_doc).inserted_id
+        analytics.record_users(mongo.db, 1)
         return jsonify({'message': 'User registered successfully!', 'user_id': str(new_user_id)}), 201
 
     except Exception as e:
@@ -348,6 +526,7 @@ def update_profile(current_user):
         update_data = {k: v for k, v in data.items() if k in ['username', 'first_name', 'last_name', 'organization']}
         if update_data:
             mongo.db.users.update_one({'_id': current_user['_id']}, {'$set': update_data})
+            user_cache.invalidate(str(current_user['_id']))
         return jsonify({'message': 'Profile updated successfully'}), 200
     except Exception as e:
         print(f"💥 Update profile error: {str(e)}")
@@ -361,53 +540,20 @@ def get_credentials(current_user):
         if not mongo:
             return jsonify({'credentials': [], 'total': 0, 'isIssuer': False})
 
-        user_id = current_user['_id']
-        query = {'$or': [{'recipient_id': user_id}, {'issuer_id': user_id}]}
-        
-        output = []
-        credentials_cursor = mongo.db.credentials.find(query).sort('issue_date', -1)
-
-        for credential in credentials_cursor:
-            try:
-                issuer = None
-                issuer_id = credential.get('issuer_id')
-                if issuer_id:
-                    issuer = mongo.db.users.find_one({'_id': issuer_id})
-
-                is_verified = False
-                if contract and credential.get('transaction_hash'):
-                    try:
-                        is_verified = contract.functions.verifyCredential(str(credential['_id'])).call()
-                    except Exception as e:
-                        print(f"Blockchain verification failed for {credential['_id']}: {e}")
-                        is_verified = credential.get('is_verified', False)
-                else:
-                    is_verified = credential.get('is_verified', False)
-                
-                cred_data = {
-                    '_id': str(credential['_id']),
-                    'title': credential.get('title', 'Untitled'),
-                    'issuer_name': issuer.get('username', 'Unknown Issuer') if issuer else 'Unknown Issuer',
-                    'issuer_id': str(issuer_id) if issuer_id else None,
-                    'recipient_id': str(credential.get('recipient_id')),
-                    'issue_date': credential.get('issue_date').strftime('%Y-%m-%d') if credential.get('issue_date') else None,
-                    'is_verified': bool(is_verified),
-                    'credential_type': credential.get('credential_type', 'General'),
-                    'transaction_hash': credential.get('transaction_hash'),
-                    'metadata': json_serialize(credential.get('credential_data', {}))
-                }
-                output.append(cred_data)
-
-            except Exception as e:
-                print(f"Error processing credential {credential.get('_id')}: {str(e)}")
-                continue
+        limit, cursor = parse_page_args(request.args)
+        output, next_cursor = user_credentials(
+            mongo.db, current_user['_id'], limit, cursor, verify_many_on_chain if contract else None
+        )
 
         return jsonify({
             'credentials': output,
             'total': len(output),
+            'next_cursor': next_cursor,
             'isIssuer': current_user.get('role') in ['issuer', 'admin']
         })
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"💥 Get credentials error: {str(e)}")
         return jsonify({'error': f'Failed to get credentials: {str(e)}'}), 500
@@ -429,31 +575,23 @@ def create_credential(current_user):
                 'status': 'active',
                 'created_at': datetime.datetime.utcnow()
             }).inserted_id
+            analytics.record_users(mongo.db, 1)
         else:
             recipient_id = recipient['_id']
 
         transaction_hash = data.get('transaction_hash')
         if not transaction_hash:
             return jsonify({'error': 'Transaction hash required from frontend'}), 400
-
-        # Verify transaction on-chain if contract is configured
-        if contract:
-            try:
-                tx_receipt = w3.eth.get_transaction_receipt(transaction_hash)
-                if not tx_receipt or tx_receipt['status'] != 1:
-                    return jsonify({'error': 'Transaction not found or failed on blockchain'}), 400
-            except Exception as e:
-                return jsonify({'error': f'Blockchain verification failed: {str(e)}'}), 400
+        if not is_transaction_hash(transaction_hash):
+            return jsonify({'error': 'transaction_hash must be 0x followed by 64 hex characters'}), 400
 
         # Process and save image if provided
         image_data = None
+        image_content_type = None
         if 'image' in data:
             try:
-                # Handle base64 image
-                image_str = data['image']
-                if ',' in image_str:  # Remove data URL prefix if present
-                    image_str = image_str.split(',')[1]
-                image_data = image_str
+                # Handle base64 image (with or without data URL prefix)
+                image_data, image_content_type = decode_image(data['image'])
             except Exception as e:
                 print(f"Error processing image: {e}")
                 return jsonify({'error': 'Invalid image format'}), 400
@@ -467,21 +605,39 @@ def create_credential(current_user):
             'credential_data': data.get('credential_data', {}),
             'transaction_hash': transaction_hash,
             'verification_code': data.get('verification_code'),
-            'image': image_data,  # Store the base64 image
-            'is_verified': True,
+            'image_ref': blob_store.put(image_data) if image_data else None,
+            'image_content_type': image_content_type,
             'created_at': datetime.datetime.utcnow(),
             'updated_at': datetime.datetime.utcnow()
         }
 
+        # Encode the image once at issuance so verification only has to encode the upload
+        if image_data:
+            try:
+                new_credential['image_embedding'] = to_binary(clip_service.encode_image(image_data))
+                new_credential['image_embedding_model'] = clip_service.model_name
+            except Exception as e:
+                print(f"Error computing image embedding, verification will fall back to full comparison: {e}")
+
         # Add optional fields if present
         if 'image_uri' in data:
             new_credential['image_uri'] = data['image_uri']
+        if data.get('credential_type'):
+            new_credential['credential_type'] = data['credential_type']
+
+        # The chain confirmer verifies the transaction in the background, so issuance never waits on a block
+        new_credential.update(initial_chain_state())
+        new_credential.update(search_fields(new_credential, current_user.get('username')))
 
         result = mongo.db.credentials.insert_one(new_credential)
+        analytics.record_credential(mongo.db, new_credential, 1, issuer_name=current_user.get('username'))
+        if 'image_embedding' in new_credential:
+            embedding_index.add(result.inserted_id, from_binary(new_credential['image_embedding']))
         
         # Prepare response
         response_data = json_serialize(new_credential)
         response_data['_id'] = str(result.inserted_id)
+        response_data.pop('image_embedding', None)
         
         return jsonify({'message': 'Credential created successfully', 'credential': response_data}), 201
 
@@ -489,6 +645,82 @@ def create_credential(current_user):
         print(f"💥 Create credential error: {str(e)}")
         return jsonify({'error': f'Failed to create credential: {str(e)}'}), 500
 
+BULK_ISSUE_MAX_ROWS = int(os.environ.get('BULK_ISSUE_MAX_ROWS', 5000))
+
+@app.route('/api/credentials/bulk', methods=['POST'])
+@token_required
+def bulk_create_credentials(current_user):
+    """
+    Issue many credentials in one request
+    Accepts JSON ``{"credentials": [...]}`` with the fields of ``POST /api/credentials`` (images excluded),
+    or CSV (``text/csv`` body or a ``file`` upload) with a header row; unknown CSV columns go into credential_data.
+    Returns one result per row in input order.
+    """
+    if mongo is None:
+        return jsonify({'error': 'Database not available'}), 500
+    try:
+        if 'file' in request.files:
+            rows = rows_from_csv(request.files['file'].read().decode('utf-8-sig'))
+        elif request.mimetype == 'text/csv':
+            rows = rows_from_csv(request.get_data(as_text=True))
+        else:
+            rows = (request.get_json(silent=True) or {}).get('credentials')
+            if not isinstance(rows, list):
+                return jsonify({'error': 'credentials must be a list'}), 400
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': f'Invalid CSV: {str(e)}'}), 400
+    if not rows:
+        return jsonify({'error': 'No credentials provided'}), 400
+    if len(rows) > BULK_ISSUE_MAX_ROWS:
+        return jsonify({'error': f'At most {BULK_ISSUE_MAX_ROWS} credentials per request'}), 400
+
+    try:
+        results = [{'row': i} for i in range(len(rows))]
+        valid = []
+        for i, row in enumerate(rows):
+            error = validate_row(row)
+            if error:
+                results[i].update(status='error', error=error)
+            else:
+                row['recipient_email'] = str(row['recipient_email']).strip()
+                valid.append(i)
+
+        recipients, created_users = upsert_recipients(mongo.db, [rows[i]['recipient_email'] for i in valid])
+        if created_users:
+            analytics.record_users(mongo.db, created_users)
+
+        now = datetime.datetime.utcnow()
+        issuer_name = current_user.get('username')
+        credentials = []
+        for i in valid:
+            credential = build_credential(rows[i], current_user, recipients[rows[i]['recipient_email']], now)
+            for field in ('credential_type', 'image_uri'):
+                if rows[i].get(field):
+                    credential[field] = rows[i][field]
+            credential.update(initial_chain_state())
+            credential.update(search_fields(credential, issuer_name))
+            credentials.append(credential)
+
+        failed = insert_credentials(mongo.db, credentials)
+        inserted = []
+        for position, (i, credential) in enumerate(zip(valid, credentials)):
+            if position in failed:
+                results[i].update(status='error', error=failed[position])
+            else:
+                results[i].update(status='created', credential_id=str(credential['_id']), chain_status=credential['chain_status'])
+                inserted.append(credential)
+        analytics.record_credentials(mongo.db, inserted, issuer_name=issuer_name)
+
+        return jsonify({
+            'message': f'Issued {len(inserted)} of {len(rows)} credentials',
+            'summary': {'created': len(inserted), 'failed': len(rows) - len(inserted), 'recipients_created': created_users},
+            'results': results
+        }), 200
+
+    except Exception as e:
+        print(f"💥 Bulk create credentials error: {str(e)}")
+        return jsonify({'error': f'Failed to create credentials: {str(e)}'}), 500
+
 @app.route('/api/credentials/<credential_id>', methods=['GET'])
 @token_required
 def get_credential_by_id(current_user, credential_id):
@@ -511,6 +743,8 @@ def get_credential_by_id(current_user, credential_id):
             'issuer_name': issuer.get('username') if issuer else 'Unknown',
             'issue_date': cred.get('issue_date').strftime('%Y-%m-%d') if cred.get('issue_date') else None,
             'is_verified': cred.get('is_verified', False),
+            'chain_status': cred.get('chain_status', CHAIN_CONFIRMED),
+            'chain_error': cred.get('chain_error'),
             'credential_data': json_serialize(cred.get('credential_data', {})),
             'transaction_hash': cred.get('transaction_hash')
         }
@@ -519,6 +753,32 @@ def get_credential_by_id(current_user, credential_id):
         print(f"💥 Get credential error: {str(e)}")
         return jsonify({'error': f'Failed to get credential: {str(e)}'}), 500
 
+@app.route('/api/credentials/<credential_id>/image', methods=['GET'])
+@token_required
+def get_credential_image(current_user, credential_id):
+    try:
+        oid = to_object_id(credential_id)
+        if not oid: return jsonify({'error': 'Invalid ID'}), 400
+
+        cred = mongo.db.credentials.find_one(
+            {'_id': oid},
+            {'recipient_id': 1, 'issuer_id': 1, 'image_ref': 1, 'image': 1, 'image_content_type': 1}
+        )
+        if not cred: return jsonify({'error': 'Not found'}), 404
+
+        is_owner = cred.get('recipient_id') == current_user['_id']
+        is_issuer = cred.get('issuer_id') == current_user['_id']
+        if not (is_owner or is_issuer or current_user.get('role') == 'admin'):
+            return jsonify({'error': 'Forbidden'}), 403
+
+        image_bytes = load_credential_image(cred)
+        if image_bytes is None:
+            return jsonify({'error': 'No image stored for this credential'}), 404
+        return send_file(io.BytesIO(image_bytes), mimetype=cred.get('image_content_type') or 'application/octet-stream')
+    except Exception as e:
+        print(f"💥 Get credential image error: {str(e)}")
+        return jsonify({'error': f'Failed to get credential image: {str(e)}'}), 500
+
 @app.route('/api/credentials/<credential_id>', methods=['PUT'])
 @token_required
 def update_credential(current_user, credential_id):
@@ -534,8 +794,12 @@ def update_credential(current_user, credential_id):
 
         data = request.get_json() or {}
         allowed = {k: v for k, v in data.items() if k in ['title', 'credential_data', 'expiry_date', 'is_verified']}
+        if 'title' in allowed or 'credential_data' in allowed:
+            allowed.update(search_fields({**cred, **allowed}, cred.get('issuer_name')))
         if allowed:
             mongo.db.credentials.update_one({'_id': oid}, {'$set': allowed})
+            if 'is_verified' in allowed and bool(allowed['is_verified']) != bool(cred.get('is_verified')):
+                analytics.record_verified(mongo.db, 1 if allowed['is_verified'] else -1)
         return jsonify({'message': 'Credential updated successfully'}), 200
     except Exception as e:
         print(f"💥 Update credential error: {str(e)}")
@@ -555,16 +819,64 @@ def remove_credential(current_user, credential_id):
             return jsonify({'error': 'Forbidden'}), 403
 
         mongo.db.credentials.delete_one({'_id': oid})
+        analytics.record_credential(mongo.db, cred, -1)
+        embedding_index.remove(oid)
+        release_images([cred.get('image_ref')])
         return jsonify({'message': 'Credential deleted successfully'}), 200
     except Exception as e:
         print(f"💥 Delete credential error: {str(e)}")
         return jsonify({'error': f'Failed to delete credential: {str(e)}'}), 500
 
 # --- Verification & Upload Routes ---
+def get_stored_embedding(credential):
+    """
+    Return the credential's precomputed image embedding, backfilling it for
+    credentials issued before embeddings were stored (or with another model).
+    """
+    if credential.get('image_embedding') and credential.get('image_embedding_model') == clip_service.model_name:
+        return from_binary(credential['image_embedding'])
+    if not (credential.get('image_ref') or credential.get('image')):
+        return None
+    try:
+        embedding = clip_service.encode_image(load_credential_image(credential))
+        mongo.db.credentials.update_one({'_id': credential['_id']}, {'$set': {
+            'image_embedding': to_binary(embedding),
+            'image_embedding_model': clip_service.model_name
+        }})
+        embedding_index.add(credential['_id'], embedding)
+        return embedding
+    except Exception as e:
+        print(f"Error backfilling image embedding for {credential['_id']}: {e}")
+        return None
+
+# Verification outcomes are buffered in-process and written in bulk
+verification_log = VerificationLogWriter(
+    mongo.db,
+    max_batch=int(os.environ.get('VERIFICATION_LOG_BATCH', 500)),
+    flush_interval=float(os.environ.get('VERIFICATION_LOG_FLUSH_INTERVAL', 1))
+) if mongo else None
+
+def log_verification(started, code, result, credential=None, is_valid=False,
+                     similarity_score=None, blockchain_verified=None):
+    """Queue a verification outcome for the event log (no database round trip)"""
+    if verification_log is None:
+        return
+    verification_log.record(
+        verification_code=code,
+        credential_id=credential['_id'] if credential else None,
+        recipient_id=credential.get('recipient_id') if credential else None,
+        result=result,
+        is_valid=bool(is_valid),
+        similarity_score=similarity_score,
+        blockchain_verified=blockchain_verified,
+        latency_ms=round((time.perf_counter() - started) * 1000, 2)
+    )
+
 @app.route('/api/verify', methods=['POST'])
 def verify_credential():
     try:
         print("\n=== Starting Credential Verification ===")
+        started = time.perf_counter()
         data = request.get_json()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
@@ -581,6 +893,7 @@ def verify_credential():
 
         if not credential:
             print("Credential not found in database")
+            log_verification(started, code, 'not_found')
             return jsonify({'error': 'Credential not found'}), 404
         
         print("Found credential in database")
@@ -592,7 +905,7 @@ def verify_credential():
             try:
                 verify_code = f"0x{code}"
                 print(f"Calling contract with code: {verify_code}")
-                result = contract.functions.verifyCredential(verify_code).call()
+                result = verify_on_chain(verify_code)
                 blockchain_valid = result[0] if isinstance(result, (list, tuple)) else result
                 print(f"Blockchain verification result: {result}")
             except Exception as e:
@@ -606,20 +919,23 @@ def verify_credential():
 
         # 2. Compare images if provided
         uploaded_image = data.get('image')
-        stored_image = credential.get('image')
+        stored_image = credential.get('image_ref') or credential.get('image')
         images_match = False
         similarity_score = 0.0
 
         if uploaded_image and stored_image:
             print("\nComparing images using CLIP...")
             try:
-                comparison_result = clip_service.compare_images(uploaded_image, stored_image)
+                stored_embedding = get_stored_embedding(credential)
+                if stored_embedding is not None:
+                    comparison_result = clip_service.compare_embedding(uploaded_image, stored_embedding)
+                else:
+                    comparison_result = clip_service.compare_images(uploaded_image, load_credential_image(credential))
                 
                 if comparison_result['success']:
                     similarity_score = comparison_result['similarity_score']
                     print(f"Image similarity score: {similarity_score:.4f}")
                     
-                    SIMILARITY_THRESHOLD = 0.85
                     images_match = similarity_score >= SIMILARITY_THRESHOLD
                 else:
                     print("Image comparison service failed.")
@@ -628,6 +944,7 @@ def verify_credential():
         elif not uploaded_image:
             return jsonify({'error': 'No image provided for verification'}), 400
         elif not stored_image:
+            log_verification(started, code, 'no_stored_image', credential, blockchain_verified=bool(blockchain_valid))
             return jsonify({'error': 'No stored image found for this credential to compare against'}), 404
 
         # Format the final response
@@ -647,6 +964,13 @@ def verify_credential():
             }
         }
 
+        log_verification(
+            started, code, 'valid' if verification_result['is_valid'] else 'invalid', credential,
+            is_valid=verification_result['is_valid'],
+            similarity_score=float(similarity_score),
+            blockchain_verified=bool(blockchain_valid)
+        )
+
         print("\nVerification complete:")
         print(f"Blockchain verified: {blockchain_valid}")
         print(f"Images match: {images_match} (score: {similarity_score:.4f})")
@@ -658,6 +982,59 @@ def verify_credential():
         print(f"💥 Verification error: {str(e)}")
         return jsonify({'error': f'Verification failed: {str(e)}'}), 500
 
+@app.route('/api/verify/lookup', methods=['POST'])
+@token_required
+def lookup_credential_by_image(current_user):
+    """
+    Find the stored credentials matching an uploaded scan, without a verification code.
+    Each lookup costs a CLIP encode, so it requires a signed-in user, and only confident
+    matches are returned. The verification code is a secret of the credential: it is only
+    included for credentials the caller issued or holds (or for admins).
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data.get('image'):
+            return jsonify({'error': 'No image provided for lookup'}), 400
+        if mongo is None:
+            return jsonify({'error': 'Database not available'}), 500
+        try:
+            top_k = max(1, min(int(data.get('top_k', 5)), 50))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'top_k must be an integer'}), 400
+
+        embedding = clip_service.encode_image(data['image'])
+        matches = [(cid, score) for cid, score in embedding_index.search(embedding, top_k=top_k)
+                   if score >= SIMILARITY_THRESHOLD]
+        if not matches:
+            return jsonify({'results': []}), 200
+
+        credentials = {
+            str(c['_id']): c for c in mongo.db.credentials.find(
+                {'_id': {'$in': [ObjectId(cid) for cid, _ in matches]}},
+                {'title': 1, 'issue_date': 1, 'verification_code': 1, 'recipient_id': 1, 'issuer_id': 1}
+            )
+        }
+        is_admin = current_user.get('role') == 'admin'
+        results = []
+        for credential_id, score in matches:
+            credential = credentials.get(credential_id)
+            if not credential:
+                continue
+            result = {
+                'id': credential_id,
+                'title': credential.get('title'),
+                'issue_date': credential.get('issue_date').strftime('%Y-%m-%d') if credential.get('issue_date') else None,
+                'image_match_score': score,
+                'is_match': True
+            }
+            if is_admin or current_user['_id'] in (credential.get('recipient_id'), credential.get('issuer_id')):
+                result['verification_code'] = credential.get('verification_code')
+            results.append(result)
+        return jsonify({'results': results}), 200
+    except Exception as e:
+        print(f"💥 Image lookup error: {str(e)}")
+        return jsonify({'error': f'Image lookup failed: {str(e)}'}), 500
+
 @app.route('/api/verify/<verification_code>', methods=['GET'])
 def verify_by_code(verification_code):
     """Verify credential by code (GET for link-based verification)"""
@@ -687,25 +1064,56 @@ def verify_by_code(verification_code):
 @token_required
 def batch_verify(current_user):
     """Batch verify multiple credentials"""
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
     codes = data.get('codes', [])
     if not codes:
         return jsonify({'error': 'No codes provided'}), 400
+    if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+        return jsonify({'error': 'codes must be a list of strings'}), 400
+    if data.get('stream') or request.args.get('stream'):
+        try:
+            max_workers, timeout = parse_stream_args(data, BATCH_VERIFY_MAX_WORKERS, BATCH_VERIFY_MAX_TIMEOUT)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return _stream_batch_verify(codes, max_workers, timeout)
+    chain_results = {}
+    if contract:
+        try:
+            chain_results = verify_many_on_chain(codes)
+        except Exception as e:
+            print(f"Batch blockchain verification failed: {e}")
     results = []
     for c in codes:
-        is_valid = False
-        if contract:
-            try:
-                is_valid = contract.functions.verifyCredential(c).call()
-            except Exception:
-                is_valid = False
-        results.append({'credential_id': c, 'is_valid': is_valid})
+        result = chain_results.get(c)
+        results.append({'credential_id': c, 'is_valid': bool(result[0]) if result else False})
     return jsonify({
         'message': f'Batch verification completed for {len(codes)} credentials',
         'results': results,
         'summary': {'valid': sum(r['is_valid'] for r in results), 'invalid': sum(not r['is_valid'] for r in results)}
     }), 200
 
+BATCH_VERIFY_MAX_WORKERS = int(os.environ.get('BATCH_VERIFY_MAX_WORKERS', 16))
+BATCH_VERIFY_MAX_TIMEOUT = float(os.environ.get('BATCH_VERIFY_MAX_TIMEOUT', 30))
+
+def _stream_batch_verify(codes, max_workers, timeout):
+    """Stream batch results as NDJSON, one line per code in completion order plus a summary line"""
+    def verify(code):
+        return bool(verify_on_chain(code)[0]) if contract else False
+
+    def generate():
+        valid = invalid = 0
+        for result in stream_verifications(codes, verify, max_workers=max_workers, timeout=timeout):
+            if result['is_valid']:
+                valid += 1
+            else:
+                invalid += 1
+            yield json.dumps(result) + '\n'
+        yield json.dumps({'summary': {'valid': valid, 'invalid': invalid}}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/upload', methods=['POST'])
 @token_required
 def upload_file(current_user):
@@ -748,17 +1156,12 @@ def upload_file(current_user):
 def get_issued_credentials(current_user):
     if current_user.get('role') not in ['issuer', 'admin']:
         return jsonify({'error': 'Issuer access required'}), 403
-    issued = []
-    for cred in mongo.db.credentials.find({'issuer_id': current_user['_id']}):
-        recipient = mongo.db.users.find_one({'_id': cred['recipient_id']})
-        issued.append({
-            '_id': str(cred['_id']),
-            'title': cred['title'],
-            'recipient': recipient['email'] if recipient else 'Unknown',
-            'issue_date': cred['issue_date'].strftime('%Y-%m-%d'),
-            'status': cred.get('status', 'active')
-        })
-    return jsonify({'credentials': issued}), 200
+    try:
+        limit, cursor = parse_page_args(request.args)
+        issued, next_cursor = issued_credentials(mongo.db, current_user['_id'], limit, cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'credentials': issued, 'next_cursor': next_cursor}), 200
 
 @app.route('/api/issuer/templates', methods=['GET'])
 @token_required
@@ -801,11 +1204,14 @@ def get_all_users(current_user):
                 {'_id': 'demo_user_2', 'username': 'Jane Smith', 'email': 'jane@example.com', 'role': 'issuer'}
             ]}), 200
 
-        all_users = list(mongo.db.users.find({'_id': {'$ne': current_user['_id']}}))
+        all_users, next_cursor = paginate(
+            mongo.db.users, {'_id': {'$ne': current_user['_id']}}, BY_ID_DESC, {'password': 0}
+        )
         for user in all_users:
             user['_id'] = str(user['_id'])
-            user.pop('password', None)
-        return jsonify({'users': all_users}), 200
+        return jsonify({'users': all_users, 'next_cursor': next_cursor}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"💥 Get users error: {str(e)}")
         return jsonify({'error': f'Failed to get users: {str(e)}'}), 500
@@ -822,6 +1228,7 @@ def update_user(current_user, user_id):
             return jsonify({'error': 'Only admin can change roles'}), 403
         
         result = mongo.db.users.update_one({'_id': ObjectId(user_id)}, {'$set': update_data})
+        user_cache.invalidate(str(ObjectId(user_id)))
         if result.matched_count == 0:
             return jsonify({'error': 'User not found'}), 404
         
@@ -840,8 +1247,20 @@ def update_user(current_user, user_id):
 def delete_user(current_user, user_id):
     try:
         oid = ObjectId(user_id)
+        removed = list(mongo.db.credentials.find({'recipient_id': oid}, {
+            'image_ref': 1, 'credential_type': 1, 'is_verified': 1, 'issuer_id': 1,
+            'recipient_id': 1, 'created_at': 1, 'issue_date': 1
+        }))
         mongo.db.credentials.delete_many({'recipient_id': oid})
+        for credential in removed:
+            embedding_index.remove(credential['_id'])
+            analytics.record_credential(mongo.db, credential, -1)
+        release_images(c.get('image_ref') for c in removed)
         result = mongo.db.users.delete_one({'_id': oid})
+        user_cache.invalidate(str(oid))
+        if result.deleted_count:
+            analytics.record_users(mongo.db, -1)
+            mongo.db[analytics.ROLLUPS].delete_one({'_id': analytics.user_rollup_id(oid)})
         if result.deleted_count == 0:
             return jsonify({'error': 'User not found'}), 404
         return jsonify({'message': 'User and their credentials deleted'}), 200
@@ -854,27 +1273,89 @@ def delete_user(current_user, user_id):
 @admin_required
 def get_all_credentials(current_user):
     try:
-        all_credentials = list(mongo.db.credentials.find())
-        for cred in all_credentials:
-            cred['_id'] = str(cred['_id'])
-            cred['recipient_id'] = str(cred.get('recipient_id'))
-            cred['issuer_id'] = str(cred.get('issuer_id'))
-            owner = mongo.db.users.find_one({'_id': ObjectId(cred['recipient_id'])})
-            cred['owner'] = owner['username'] if owner else 'Unknown'
-        return jsonify({'credentials': all_credentials}), 200
+        limit, cursor = parse_page_args(request.args)
+        credentials, next_cursor = all_credentials(mongo.db, limit, cursor)
+        return jsonify({'credentials': credentials, 'next_cursor': next_cursor}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"💥 Get all credentials error: {str(e)}")
         return jsonify({'error': f'Failed to get credentials: {str(e)}'}), 500
 
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+@app.route('/api/admin/credentials/export', methods=['GET'])
+@token_required
+@admin_required
+def export_all_credentials(current_user):
+    """Stream every credential as NDJSON (default) or a JSON array in constant memory"""
+    if mongo is None:
+        return jsonify({'error': 'Database not available'}), 500
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'json'):
+        return jsonify({'error': 'format must be ndjson or json'}), 400
+
+    def records():
+        cursor = mongo.db.credentials.find({}, {'image_embedding': 0, 'image': 0}).batch_size(EXPORT_BATCH_SIZE)
+        for batch in iter_batches(cursor, EXPORT_BATCH_SIZE):
+            users = resolve_credential_users(mongo.db, batch, keys=('recipient_id',))
+            for cred in batch:
+                owner = users.get(cred.get('recipient_id'))
+                record = json_serialize(cred)
+                record['owner'] = owner.get('username', 'Unknown') if owner else 'Unknown'
+                yield record
+
+    if export_format == 'json':
+        body, mimetype = json_array_chunks(records()), 'application/json'
+    else:
+        body, mimetype = ndjson_lines(records()), 'application/x-ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=credentials.{export_format}'}
+    )
+
 # --- Miscellaneous and Mock Routes ---
 @app.route('/api/search', methods=['GET'])
 @token_required
 def search_credentials(current_user):
-    query = request.args.get('q', '')
-    return jsonify({'results': [
-        {'_id': 'search_1', 'title': f'Diploma matching "{query}"', 'issuer': 'Demo University'},
-        {'_id': 'search_2', 'title': f'Certificate matching "{query}"', 'issuer': 'Demo Institute'}
-    ]}), 200
+    """Ranked full-text search over title, issuer, type and metadata of the credentials the caller can see"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search query (q) is required'}), 400
+    try:
+        if mongo is None:
+            return jsonify({'error': 'Database not available'}), 500
+        page = max(1, int(request.args.get('page', 1)))
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        credentials, has_more = run_search(mongo.db, query, current_user, page=page, limit=limit)
+        results = [{
+            '_id': str(cred['_id']),
+            'title': cred.get('title'),
+            'issuer': cred.get('issuer_name') or 'Unknown',
+            'credential_type': cred.get('credential_type', 'General'),
+            'issue_date': cred.get('issue_date').strftime('%Y-%m-%d') if cred.get('issue_date') else None,
+            'score': round(cred.get('score', 0), 4)
+        } for cred in credentials]
+        return jsonify({'results': results, 'page': page, 'has_more': has_more}), 200
+    except ValueError:
+        return jsonify({'error': 'page and limit must be integers'}), 400
+    except Exception as e:
+        print(f"💥 Search error: {str(e)}")
+        return jsonify({'error': f'Failed to search: {str(e)}'}), 500
+
+@app.route('/api/search/suggest', methods=['GET'])
+@token_required
+def suggest_credentials(current_user):
+    """Prefix autocomplete for the search box"""
+    prefix = request.args.get('q', '')
+    try:
+        if mongo is None:
+            return jsonify({'suggestions': []}), 200
+        return jsonify({'suggestions': suggest_titles(mongo.db, prefix, current_user)}), 200
+    except Exception as e:
+        print(f"💥 Suggest error: {str(e)}")
+        return jsonify({'error': f'Failed to get suggestions: {str(e)}'}), 500
 
 @app.route('/api/analytics/overview', methods=['GET'])
 @token_required
@@ -883,128 +1364,66 @@ def get_analytics_overview(current_user):
         if not mongo:
             return jsonify({'error': 'Database not available'}), 500
 
-        now = datetime.datetime.utcnow()
-        this_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        this_week = now - datetime.timedelta(days=now.weekday())
-        
-        # Current period stats
-        analytics = {
-            'summary': {
-                'credentials': {
-                    'total': mongo.db.credentials.count_documents({'owner_id': current_user['_id']}),
-                    'this_month': mongo.db.credentials.count_documents({
-                        'owner_id': current_user['_id'],
-                        'created_at': {'$gte': this_month}
-                    })
-                },
-                'verifications': {
-                    'total': mongo.db.verifications.count_documents({'credential.owner_id': current_user['_id']}),
-                    'this_week': mongo.db.verifications.count_documents({
-                        'credential.owner_id': current_user['_id'],
-                        'created_at': {'$gte': this_week}
-                    })
-                }
-            }
-        }
-        
-        # Calculate success rate
-        total_verifications = analytics['summary']['verifications']['total']
-        successful_verifications = mongo.db.verifications.count_documents({
-            'credential.owner_id': current_user['_id'],
-            'is_valid': True
-        })
-        analytics['summary']['success_rate'] = round((successful_verifications / total_verifications * 100) if total_verifications > 0 else 0, 1)
-        
-        # Credential types distribution
-        type_pipeline = [{'$group': {'_id': '$credential_type', 'count': {'$sum': 1}}}]
-        type_results = list(mongo.db.credentials.aggregate(type_pipeline))
-        total_creds = sum(r['count'] for r in type_results)
-        analytics['credential_types'] = [{'type': r['_id'] or 'Other', 'count': r['count'], 'percentage': round((r['count'] / total_creds * 100) if total_creds > 0 else 0, 1)} for r in type_results]
-        
-        # Top issuers
-        issuer_pipeline = [{'$group': {'_id': '$issuer_id', 'count': {'$sum': 1}}}, {'$sort': {'count': -1}}, {'$limit': 5}]
-        issuer_results = list(mongo.db.credentials.aggregate(issuer_pipeline))
-        analytics['top_issuers'] = []
-        for r in issuer_results:
-            issuer = mongo.db.users.find_one({'_id': r['_id']})
-            if issuer:
-                analytics['top_issuers'].append({'name': issuer.get('username', 'Unknown'), 'count': r['count']})
-        
-        # Summary statistics
-        analytics['summary']['total_credentials'] = total_creds
-        analytics['summary']['total_verified'] = mongo.db.credentials.count_documents({'is_verified': True})
-        analytics['summary']['total_users'] = mongo.db.users.count_documents({})
-        
-        return jsonify({'analytics': analytics}), 200
+        # Counters are maintained incrementally on writes, see services/analytics.py
+        return jsonify({'analytics': analytics.read_overview(mongo.db, current_user['_id'])}), 200
         
     except Exception as e:
         print(f"💥 Analytics error: {str(e)}")
         return jsonify({'error': f'Failed to get analytics: {str(e)}'}), 500
 
-# Setup PDF routes
-#setup_pdf_routes(app, mongo, token_required)
+# Rendered PDFs keyed by a hash of their content, so unchanged credentials are never re-rendered
+pdf_cache = PdfCache(
+    os.environ.get('PDF_CACHE_PATH', './pdf_cache'),
+    max_bytes=int(os.environ.get('PDF_CACHE_MAX_MB', 512)) * 1024 * 1024
+)
+
+PDF_RECIPIENT_FIELDS = ('name', 'username', 'email')
+
+def credential_pdf_fields(credential, recipient, host_url):
+    """Fields rendered into a credential's PDF"""
+    recipient = recipient or {}
+    recipient_name = recipient.get('name') or recipient.get('username') or recipient.get('email')
+    return pdf_fields(credential, recipient_name, f"{host_url}verification/{credential['_id']}")
+
+def exportable_pdf_fields(current_user, credential_id):
+    """
+    Load a credential the caller may export (recipient, issuer or admin) and build its PDF fields
+    :return: Tuple of ``(fields, None)``, or ``(None, error_response)``
+    """
+    oid = to_object_id(credential_id)
+    if not oid:
+        return None, (jsonify({'error': 'Invalid ID'}), 400)
+
+    credential = mongo.db.credentials.find_one({'_id': oid}, {'image_embedding': 0, 'image': 0})
+    if not credential:
+        return None, (jsonify({'error': 'Credential not found'}), 404)
+
+    is_owner = credential.get('recipient_id') == current_user['_id']
+    is_issuer = credential.get('issuer_id') == current_user['_id']
+    if not (is_owner or is_issuer or current_user.get('role') == 'admin'):
+        return None, (jsonify({'error': 'Unauthorized'}), 403)
+
+    if is_owner:
+        recipient = current_user
+    else:
+        recipient = mongo.db.users.find_one(
+            {'_id': credential.get('recipient_id')},
+            {field: 1 for field in PDF_RECIPIENT_FIELDS}
+        )
+    return credential_pdf_fields(credential, recipient, request.host_url), None
 
 # PDF Export Route
 @app.route('/api/credentials/<credential_id>/export', methods=['GET'])
 @token_required
 def export_credential_pdf(current_user, credential_id):
     try:
-        # Get credential from database
-        credential = mongo.db.credentials.find_one({'_id': ObjectId(credential_id)})
-        if not credential:
-            return jsonify({'error': 'Credential not found'}), 404
-            
-        if str(credential.get('owner_id')) != str(current_user['_id']):
-            return jsonify({'error': 'Unauthorized'}), 403
-
-        # Generate HTML for the credential
-        html_content = f"""
-        <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; margin: 40px; }}
-                    .header {{ text-align: center; margin-bottom: 30px; }}
-                    .credential-info {{ margin: 20px 0; }}
-                    .footer {{ text-align: center; margin-top: 30px; font-size: 12px; }}
-                    .blockchain-info {{ background: #f5f5f5; padding: 15px; border-radius: 5px; }}
-                </style>
-            </head>
-            <body>
-                <div class="header">
-                    <h1>{credential.get('title', 'Blockchain Verified Credential')}</h1>
-                    <p>Issued on: {credential.get('issue_date').strftime('%B %d, %Y')}</p>
-                </div>
-                
-                <div class="credential-info">
-                    <h2>Credential Details</h2>
-                    <p><strong>Issuer:</strong> {credential.get('issuer_name')}</p>
-                    <p><strong>Recipient:</strong> {current_user.get('name', current_user.get('username'))}</p>
-                    <p><strong>Type:</strong> {credential.get('credential_type', 'Certificate')}</p>
-                    {'<p><strong>Expiry:</strong> ' + credential['expiry_date'].strftime('%B %d, %Y') + '</p>' if credential.get('expiry_date') else ''}
-                </div>
-                
-                <div class="blockchain-info">
-                    <h3>Blockchain Verification</h3>
-                    <p>This credential has been verified and stored on the blockchain.</p>
-                    <p><strong>Transaction ID:</strong> {credential.get('blockchain_tx_id', 'N/A')}</p>
-                    <p><strong>Verification Date:</strong> {datetime.utcnow().strftime('%B %d, %Y')}</p>
-                </div>
-                
-                <div class="footer">
-                    <p>This is an official credential issued through the BlockCreds platform.</p>
-                    <p>Verify this credential at: {request.host_url}verification/{credential_id}</p>
-                </div>
-            </body>
-        </html>
-        """
-
-        # Create PDF from HTML
-        pdf_buffer = io.BytesIO()
-        HTML(string=html_content).write_pdf(pdf_buffer)
-        pdf_buffer.seek(0)
-        
+        fields, error = exportable_pdf_fields(current_user, credential_id)
+        if error:
+            return error
+        pdf_bytes = pdf_cache.get_or_render(cache_key(fields), lambda: render_pdf(fields))
+
         return send_file(
-            pdf_buffer,
+            io.BytesIO(pdf_bytes),
             mimetype='application/pdf',
             as_attachment=True,
             download_name=f'credential-{credential_id}.pdf'
@@ -1014,6 +1433,141 @@ def export_credential_pdf(current_user, credential_id):
         print(f"Error generating PDF: {str(e)}")
         return jsonify({'error': 'Failed to generate PDF'}), 500
 
+BULK_PDF_EXPORT_MAX = int(os.environ.get('BULK_PDF_EXPORT_MAX', 10000))
+
+@app.route('/api/credentials/export', methods=['POST'])
+@token_required
+def export_credentials_zip(current_user):
+    """
+    Export many credential PDFs as one streamed ZIP
+    Body: ``{"credential_ids": [...]}`` or ``{"filter": {"credential_type", "issued_after", "issued_before"}}``
+    (dates as ``YYYY-MM-DD``). Only credentials the caller issued or holds are exported, or any for admins.
+    """
+    if mongo is None:
+        return jsonify({'error': 'Database not available'}), 500
+    data = request.get_json() or {}
+    try:
+        if data.get('credential_ids'):
+            ids = [to_object_id(cid) for cid in data['credential_ids']]
+            if not all(ids):
+                return jsonify({'error': 'Invalid credential ID'}), 400
+            query = {'_id': {'$in': ids}}
+        elif isinstance(data.get('filter'), dict):
+            criteria = data['filter']
+            query = {}
+            if criteria.get('credential_type'):
+                query['credential_type'] = str(criteria['credential_type'])
+            issued = {}
+            if criteria.get('issued_after'):
+                issued['$gte'] = datetime.datetime.strptime(criteria['issued_after'], '%Y-%m-%d')
+            if criteria.get('issued_before'):
+                issued['$lt'] = datetime.datetime.strptime(criteria['issued_before'], '%Y-%m-%d')
+            if issued:
+                query['issue_date'] = issued
+        else:
+            return jsonify({'error': 'credential_ids or filter is required'}), 400
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid filter'}), 400
+
+    scope = visibility_filter(current_user)
+    if scope:
+        query = {'$and': [query, scope]}
+    total = mongo.db.credentials.count_documents(query, limit=BULK_PDF_EXPORT_MAX + 1)
+    if total == 0:
+        return jsonify({'error': 'No credentials match'}), 404
+    if total > BULK_PDF_EXPORT_MAX:
+        return jsonify({'error': f'Too many credentials, export at most {BULK_PDF_EXPORT_MAX} at a time'}), 400
+
+    host_url = request.host_url
+
+    def entries():
+        cursor = mongo.db.credentials.find(query, {'image_embedding': 0, 'image': 0}).batch_size(EXPORT_BATCH_SIZE)
+        for batch in iter_batches(cursor, EXPORT_BATCH_SIZE):
+            users = resolve_credential_users(mongo.db, batch, keys=('recipient_id',), fields=PDF_RECIPIENT_FIELDS)
+            for cred in batch:
+                fields = credential_pdf_fields(cred, users.get(cred.get('recipient_id')), host_url)
+                yield f"credential-{cred['_id']}.pdf", fields
+
+    return Response(
+        stream_with_context(stream_pdf_zip(entries(), pdf_cache, max_workers=PDF_RENDER_WORKERS)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename=credentials.zip'}
+    )
+
+# Asynchronous PDF export: submit a job, poll (or long-poll) its status, then download the artifact
+# Jobs (and the finished PDFs) live in Mongo, so any app process can answer the poll and the download
+pdf_jobs = PdfJobQueue(
+    mongo.db,
+    pdf_cache,
+    max_workers=PDF_RENDER_WORKERS,
+    max_pending=int(os.environ.get('PDF_JOB_MAX_PENDING', 64)),
+    job_ttl=int(os.environ.get('PDF_JOB_TTL', 600)),
+    render_timeout=int(os.environ.get('PDF_JOB_RENDER_TIMEOUT', 300))
+) if mongo else None
+PDF_JOB_MAX_WAIT = float(os.environ.get('PDF_JOB_MAX_WAIT', 30))
+
+def pdf_job_response(job):
+    body = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'status_url': f"/api/export/jobs/{job['id']}",
+    }
+    if job['status'] == 'done':
+        body['download_url'] = f"/api/export/jobs/{job['id']}/download"
+    if job['error']:
+        body['error'] = job['error']
+    return body
+
+@app.route('/api/credentials/<credential_id>/export/jobs', methods=['POST'])
+@token_required
+def create_pdf_export_job(current_user, credential_id):
+    if pdf_jobs is None:
+        return jsonify({'error': 'Database not available'}), 500
+    try:
+        fields, error = exportable_pdf_fields(current_user, credential_id)
+        if error:
+            return error
+        try:
+            job = pdf_jobs.submit(fields, current_user['_id'], f'credential-{credential_id}.pdf')
+        except PdfQueueFull:
+            response = jsonify({'error': 'Too many PDF exports in progress, retry shortly'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        return jsonify(pdf_job_response(job)), 202
+    except Exception as e:
+        print(f"Error queueing PDF export: {str(e)}")
+        return jsonify({'error': 'Failed to queue PDF export'}), 500
+
+@app.route('/api/export/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_pdf_export_job(current_user, job_id):
+    """Job status; ``?wait=<seconds>`` holds the request until the job finishes or the wait runs out"""
+    if pdf_jobs is None:
+        return jsonify({'error': 'Database not available'}), 500
+    try:
+        wait = max(0.0, min(float(request.args.get('wait', 0)), PDF_JOB_MAX_WAIT))
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    job = pdf_jobs.get(job_id, current_user['_id'], wait=wait)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(pdf_job_response(job)), 200
+
+@app.route('/api/export/jobs/<job_id>/download', methods=['GET'])
+@token_required
+def download_pdf_export_job(current_user, job_id):
+    if pdf_jobs is None:
+        return jsonify({'error': 'Database not available'}), 500
+    job = pdf_jobs.get(job_id, current_user['_id'])
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify(pdf_job_response(job)), 409
+    pdf_bytes = pdf_jobs.artifact(job)
+    if pdf_bytes is None:
+        return jsonify({'error': 'Export expired, submit a new job'}), 410
+    return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True, download_name=job['filename'])
+
 # --- Main Application Runner ---
 if __name__ == "__main__":
     print("🚀 Starting BlockCreds API Server...")
@@ -0,0 +1,98 @@
+"""
+Benchmark reverse image lookup queries against the in-memory embedding index.
+
+Fills an ``EmbeddingIndex`` with unit vectors grouped around ``--clusters``
+random centres (``--clusters 0`` for structureless random vectors), trains
+its IVF layer and times ``search``. Each query is a stored embedding plus a
+little noise, the way a fresh scan of an issued credential looks to CLIP.
+The exact scan of the whole matrix is timed on the same queries, and recall
+is the share of queries whose best IVF match is the best exact match. Run
+from the backend directory:
+
+    python bench_embedding_index.py [--rows 1000000] [--queries 200] [--nprobe 32]
+"""
+import argparse
+import os
+import platform
+import time
+
+import numpy as np
+
+from services.embedding_index import EmbeddingIndex
+
+
+def vectors(rows, dim, clusters, spread, chunk=10000):
+    """Yield chunks of unit vectors, ``spread`` controlling how far they sit from their centre"""
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((clusters, dim)) if clusters else None
+    for start in range(0, rows, chunk):
+        noise = rng.standard_normal((min(chunk, rows - start), dim))
+        if centres is None:
+            yield noise
+            continue
+        centres_of = centres[rng.integers(0, clusters, len(noise))]
+        centres_of /= np.linalg.norm(centres_of, axis=1, keepdims=True)
+        yield centres_of + spread * noise / np.sqrt(dim)
+
+
+def fill(index, args):
+    row = 0
+    for chunk in vectors(args.rows, args.dim, args.clusters, args.spread):
+        for vector in chunk:
+            index.add(f'bench-{row}', vector)
+            row += 1
+
+
+def percentiles(timings):
+    return np.percentile(timings, 50), np.percentile(timings, 95)
+
+
+def bench(index, args):
+    rng = np.random.default_rng(1)
+    count = len(index)
+    matrix = index._matrix[:count]
+    exact_ms, ivf_ms, hits, overlap = [], [], 0, 0
+    for row in rng.choice(count, args.queries, replace=False):
+        # A rescan: the stored embedding, slightly perturbed (cosine ~0.95)
+        query = matrix[row] + 0.3 * rng.standard_normal(args.dim) / np.sqrt(args.dim)
+        query = (query / np.linalg.norm(query)).astype(np.float32)
+
+        started = time.perf_counter()
+        exact, _ = EmbeddingIndex._top(matrix, count, query, args.top_k)
+        exact_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        found = index.search(query, top_k=args.top_k)
+        ivf_ms.append((time.perf_counter() - started) * 1000)
+
+        expected = [f'bench-{i}' for i in exact]
+        hits += found[0][0] == expected[0]
+        overlap += len({cid for cid, _ in found} & set(expected))
+    return percentiles(exact_ms), percentiles(ivf_ms), hits / args.queries, overlap / (args.queries * args.top_k)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--clusters', type=int, default=4096)
+    parser.add_argument('--spread', type=float, default=1.0)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--nprobe', type=int, default=32)
+    args = parser.parse_args()
+
+    index = EmbeddingIndex(dim=args.dim, initial_capacity=args.rows, nprobe=args.nprobe, auto_train=False)
+    fill(index, args)
+    started = time.perf_counter()
+    nlist = index.train()
+    trained = time.perf_counter() - started
+
+    (exact_p50, exact_p95), (ivf_p50, ivf_p95), recall_1, recall_k = bench(index, args)
+    print(f"{platform.processor() or platform.machine()}, {os.cpu_count()} CPUs, numpy {np.__version__}")
+    print(f"{args.rows} x {args.dim} float32 ({args.rows * args.dim * 4 / 2**30:.2f} GiB), "
+          f"{args.clusters or 'no'} clusters")
+    print(f"exact scan:        p50 {exact_p50:.1f} ms, p95 {exact_p95:.1f} ms per query")
+    print(f"IVF {nlist} lists, nprobe {args.nprobe}: p50 {ivf_p50:.1f} ms, p95 {ivf_p95:.1f} ms per query "
+          f"(trained in {trained:.1f}s)")
+    print(f"recall: top-1 {recall_1:.1%}, top-{args.top_k} {recall_k:.1%}")
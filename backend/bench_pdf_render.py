@@ -0,0 +1,77 @@
+"""
+Benchmark credential PDF rendering throughput.
+
+Compares the original approach (inline stylesheet re-parsed and fonts
+reloaded on every ``HTML(...).write_pdf()``) with the shared per-process
+``TemplateRenderer``. Run from the backend directory:
+
+    python bench_pdf_render.py [--renders 50] [--rounds 3]
+
+Each credential gets a distinct title so nothing is served from a cache.
+The two paths alternate for ``--rounds`` rounds and the median rate of each
+is reported, so a noisy round does not decide the comparison. WeasyPrint
+needs the pango system libraries (``libpango-1.0-0``, ``libpangoft2-1.0-0``).
+"""
+import argparse
+import datetime
+import statistics
+import sys
+import time
+
+try:
+    from weasyprint import HTML
+
+    from services.credential_pdf import STYLESHEET, get_renderer, pdf_fields, render_html
+except OSError as e:
+    # WeasyPrint raises OSError, not ImportError, when pango is missing
+    sys.exit(f"WeasyPrint cannot load its system libraries: {e}")
+
+
+def sample_fields(i):
+    credential = {
+        '_id': f'bench-{i}',
+        'title': f'Bachelor of Science #{i}',
+        'issue_date': datetime.datetime(2024, 6, 1),
+        'issuer_name': 'Example University',
+        'credential_type': 'Degree',
+        'transaction_hash': '0x' + f'{i:064x}',
+    }
+    return pdf_fields(credential, 'Jane Doe', f'https://example.org/verification/bench-{i}')
+
+
+def render_uncached(fields):
+    """The pre-renderer approach: stylesheet inlined and fonts configured per call"""
+    html = render_html(fields).replace('<html>', f'<html><head><style>{STYLESHEET}</style></head>', 1)
+    return HTML(string=html).write_pdf()
+
+
+def render_shared(fields):
+    return get_renderer().render(fields)
+
+
+def bench(name, render, renders):
+    started = time.perf_counter()
+    for i in range(renders):
+        render(sample_fields(i))
+    elapsed = time.perf_counter() - started
+    rate = renders / elapsed
+    print(f"{name:<10} {renders} renders in {elapsed:.2f}s  ({rate:.1f} renders/s)")
+    return rate
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--renders', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    # Warm up imports, fonts and the shared renderer outside the timed rounds
+    render_uncached(sample_fields(-1))
+    render_shared(sample_fields(-1))
+    before, after = [], []
+    for _ in range(args.rounds):
+        before.append(bench('before', render_uncached, args.renders))
+        after.append(bench('after', render_shared, args.renders))
+    before, after = statistics.median(before), statistics.median(after)
+    print(f"median of {args.rounds} rounds: before {before:.1f} renders/s, after {after:.1f} renders/s")
+    print(f"📈 Speedup: {after / before:.2f}x")
@@ -0,0 +1,65 @@
+"""
+Move base64 images embedded in credential documents into the blob store.
+
+Run from the backend directory with the same environment as the API
+(MONGO_URI, BLOB_STORE, BLOB_STORE_PATH):
+
+    python migrate_credential_images.py [--batch-size 500] [--dry-run]
+
+The migration is idempotent: only documents that still carry an ``image``
+field are touched, so it can be interrupted and re-run safely. It finishes
+by recounting the credentials that use each blob (``rebuild_ref_counts``),
+which also covers images moved by an earlier run; stop the API first.
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from services.blob_store import create_blob_store, decode_image, rebuild_ref_counts
+
+
+def migrate(db, blob_store, batch_size=500, dry_run=False):
+    query = {'image': {'$type': 'string'}}
+    migrated = failed = 0
+    updates = []
+    for cred in db.credentials.find(query, {'image': 1}).batch_size(batch_size):
+        try:
+            image_bytes, content_type = decode_image(cred['image'])
+            ref = blob_store.put(image_bytes) if image_bytes and not dry_run else None
+        except Exception as e:
+            print(f"⚠️ Skipping credential {cred['_id']}: {e}")
+            failed += 1
+            continue
+        updates.append(UpdateOne(
+            {'_id': cred['_id']},
+            {'$set': {'image_ref': ref, 'image_content_type': content_type}, '$unset': {'image': ''}}
+        ))
+        if len(updates) >= batch_size:
+            migrated += _flush(db, updates, dry_run)
+    migrated += _flush(db, updates, dry_run)
+    if not dry_run:
+        rebuild_ref_counts(db)
+    return migrated, failed
+
+
+def _flush(db, updates, dry_run):
+    count = len(updates)
+    if updates and not dry_run:
+        db.credentials.bulk_write(updates, ordered=False)
+    updates.clear()
+    return count
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true', help='Report what would be migrated without writing')
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017/blockcreds_db'))
+    db = client.get_default_database()
+    migrated, failed = migrate(db, create_blob_store(db), batch_size=args.batch_size, dry_run=args.dry_run)
+    print(f"✅ Migrated {migrated} credential images ({failed} failed){' [dry run]' if args.dry_run else ''}")
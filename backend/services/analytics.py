@@ -0,0 +1,299 @@
+"""Materialized analytics counters.
+
+The analytics overview used to run a dozen counts and two full-collection
+aggregations per dashboard load. Instead, writers ``$inc`` counters in the
+``analytics_rollups`` collection as credentials, users and verifications
+come and go, and the overview reads two small documents:
+
+- ``global``: credential/user totals, counts per credential type and per issuer
+- ``user:<id>``: a recipient's credential and verification counters, bucketed
+  by month (``YYYY-MM``) and ISO week (``YYYY-Www``)
+
+``rebuild_rollups`` recomputes everything from the source collections and is
+used to backfill existing data (``python -m services.analytics rebuild``).
+It holds a lease document in the rollups collection while it runs, so workers
+booting together against an empty database rebuild once, and it replaces the
+rollup documents one by one instead of emptying the collection first.
+"""
+import datetime
+import os
+import uuid
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+ROLLUPS = 'analytics_rollups'
+GLOBAL_ID = 'global'
+REBUILD_LEASE_ID = 'rebuild_lease'
+# A crashed rebuild stops blocking others after this long
+REBUILD_LEASE_SECONDS = 600
+
+
+def user_rollup_id(user_id):
+    return f'user:{user_id}'
+
+
+def _field_key(value):
+    """Map a value onto a safe Mongo field name (no dots, no leading $)"""
+    value = str(value) if value not in (None, '') else 'Other'
+    return value.replace('.', '_').replace('$', '_')
+
+
+def month_key(when):
+    return when.strftime('%Y-%m')
+
+
+def week_key(when):
+    return when.strftime('%G-W%V')
+
+
+def record_credential(db, credential, delta=1, issuer_name=None):
+    """
+    Apply a credential creation (``delta=1``) or deletion (``delta=-1``) to the counters
+    :param credential: Credential document as stored
+    :param issuer_name: Display name to remember for the issuer on creation
+    """
+    created_at = credential.get('created_at') or credential.get('issue_date') or datetime.datetime.utcnow()
+    global_update = {'$inc': {
+        'total_credentials': delta,
+        f"by_type.{_field_key(credential.get('credential_type'))}": delta,
+    }}
+    if credential.get('is_verified'):
+        global_update['$inc']['total_verified'] = delta
+    if credential.get('issuer_id'):
+        global_update['$inc'][f"by_issuer.{credential['issuer_id']}"] = delta
+        if issuer_name:
+            global_update['$set'] = {f"issuer_names.{credential['issuer_id']}": issuer_name}
+
+    ops = [UpdateOne({'_id': GLOBAL_ID}, global_update, upsert=True)]
+    if credential.get('recipient_id'):
+        ops.append(UpdateOne(
+            {'_id': user_rollup_id(credential['recipient_id'])},
+            {'$inc': {'credentials_total': delta, f'credentials_by_month.{month_key(created_at)}': delta}},
+            upsert=True
+        ))
+    db[ROLLUPS].bulk_write(ops, ordered=False)
+
+
+def record_credentials(db, credentials, issuer_name=None):
+    """Apply many credential creations at once, with one ``$inc`` per touched rollup document"""
+    global_inc = {}
+    user_incs = {}
+    issuer_names = {}
+
+    def add(inc, key, value=1):
+        inc[key] = inc.get(key, 0) + value
+
+    for credential in credentials:
+        created_at = credential.get('created_at') or credential.get('issue_date') or datetime.datetime.utcnow()
+        add(global_inc, 'total_credentials')
+        add(global_inc, f"by_type.{_field_key(credential.get('credential_type'))}")
+        if credential.get('is_verified'):
+            add(global_inc, 'total_verified')
+        if credential.get('issuer_id'):
+            add(global_inc, f"by_issuer.{credential['issuer_id']}")
+            if issuer_name:
+                issuer_names[f"issuer_names.{credential['issuer_id']}"] = issuer_name
+        if credential.get('recipient_id'):
+            inc = user_incs.setdefault(credential['recipient_id'], {})
+            add(inc, 'credentials_total')
+            add(inc, f'credentials_by_month.{month_key(created_at)}')
+
+    if not global_inc:
+        return
+    global_update = {'$inc': global_inc}
+    if issuer_names:
+        global_update['$set'] = issuer_names
+    ops = [UpdateOne({'_id': GLOBAL_ID}, global_update, upsert=True)]
+    ops.extend(
+        UpdateOne({'_id': user_rollup_id(recipient_id)}, {'$inc': inc}, upsert=True)
+        for recipient_id, inc in user_incs.items()
+    )
+    db[ROLLUPS].bulk_write(ops, ordered=False)
+
+
+def record_verified(db, delta=1):
+    """Count credentials whose issuance transaction was confirmed after creation"""
+    db[ROLLUPS].update_one({'_id': GLOBAL_ID}, {'$inc': {'total_verified': delta}}, upsert=True)
+
+
+def record_users(db, delta=1):
+    db[ROLLUPS].update_one({'_id': GLOBAL_ID}, {'$inc': {'total_users': delta}}, upsert=True)
+
+
+def verification_ops(recipient_id, is_valid, when, count=1):
+    """Counter updates for ``count`` verifications of one recipient's credentials"""
+    inc = {'verifications_total': count, f'verifications_by_week.{week_key(when)}': count}
+    if is_valid:
+        inc['verifications_valid'] = count
+    return [UpdateOne({'_id': user_rollup_id(recipient_id)}, {'$inc': inc}, upsert=True)]
+
+
+def read_overview(db, user_id, now=None):
+    """Build the analytics overview from the rollup documents with a single query"""
+    now = now or datetime.datetime.utcnow()
+    docs = {doc['_id']: doc for doc in db[ROLLUPS].find({'_id': {'$in': [GLOBAL_ID, user_rollup_id(user_id)]}})}
+    totals = docs.get(GLOBAL_ID, {})
+    mine = docs.get(user_rollup_id(user_id), {})
+
+    total_verifications = mine.get('verifications_total', 0)
+    valid_verifications = mine.get('verifications_valid', 0)
+
+    by_type = {k: v for k, v in totals.get('by_type', {}).items() if v > 0}
+    total_creds = sum(by_type.values())
+    issuer_names = totals.get('issuer_names', {})
+    top_issuers = sorted(
+        ((issuer_id, count) for issuer_id, count in totals.get('by_issuer', {}).items() if count > 0),
+        key=lambda item: item[1], reverse=True
+    )[:5]
+
+    return {
+        'summary': {
+            'credentials': {
+                'total': mine.get('credentials_total', 0),
+                'this_month': mine.get('credentials_by_month', {}).get(month_key(now), 0)
+            },
+            'verifications': {
+                'total': total_verifications,
+                'this_week': mine.get('verifications_by_week', {}).get(week_key(now), 0)
+            },
+            'success_rate': round((valid_verifications / total_verifications * 100) if total_verifications > 0 else 0, 1),
+            'total_credentials': total_creds,
+            'total_verified': totals.get('total_verified', 0),
+            'total_users': totals.get('total_users', 0)
+        },
+        'credential_types': [
+            {'type': t, 'count': c, 'percentage': round((c / total_creds * 100) if total_creds > 0 else 0, 1)}
+            for t, c in by_type.items()
+        ],
+        'top_issuers': [
+            {'name': issuer_names.get(issuer_id, 'Unknown'), 'count': count}
+            for issuer_id, count in top_issuers
+        ]
+    }
+
+
+def _acquire_rebuild_lease(db, owner):
+    """Take the rebuild lease unless another live rebuild holds it"""
+    now = datetime.datetime.utcnow()
+    try:
+        db[ROLLUPS].update_one(
+            {'_id': REBUILD_LEASE_ID, 'expires_at': {'$lt': now}},
+            {'$set': {'owner': owner, 'expires_at': now + datetime.timedelta(seconds=REBUILD_LEASE_SECONDS)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The lease exists and has not expired, so the upsert collided with it
+        return False
+
+
+def rebuild_rollups(db):
+    """
+    Recompute every rollup from the source collections. Run while writes are quiet:
+    an ``$inc`` landing between the source reads and the replace is overwritten.
+    :return: Number of rollup documents written, or ``None`` if another rebuild holds the lease
+    """
+    owner = uuid.uuid4().hex
+    if not _acquire_rebuild_lease(db, owner):
+        return None
+    try:
+        return _rebuild(db)
+    finally:
+        db[ROLLUPS].delete_one({'_id': REBUILD_LEASE_ID, 'owner': owner})
+
+
+def _rebuild(db):
+    credentials = db.credentials
+    by_type = {}
+    for r in credentials.aggregate([{'$group': {'_id': '$credential_type', 'count': {'$sum': 1}}}]):
+        # Distinct types can share a field key (None/''/'Other', 'a.b'/'a_b'), so accumulate
+        key = _field_key(r['_id'])
+        by_type[key] = by_type.get(key, 0) + r['count']
+    by_issuer = {
+        str(r['_id']): r['count']
+        for r in credentials.aggregate([{'$group': {'_id': '$issuer_id', 'count': {'$sum': 1}}}])
+        if r['_id'] is not None
+    }
+    issuer_names = {
+        str(u['_id']): u.get('username', 'Unknown')
+        for u in db.users.find({'_id': {'$in': [r for r in credentials.distinct('issuer_id') if r is not None]}},
+                               {'username': 1})
+    }
+    docs = {GLOBAL_ID: {
+        '_id': GLOBAL_ID,
+        'total_credentials': sum(by_type.values()),
+        'total_verified': credentials.count_documents({'is_verified': True}),
+        'total_users': db.users.count_documents({}),
+        'by_type': by_type,
+        'by_issuer': by_issuer,
+        'issuer_names': issuer_names,
+    }}
+
+    def user_doc(recipient_id):
+        key = user_rollup_id(recipient_id)
+        return docs.setdefault(key, {'_id': key})
+
+    month_pipeline = [
+        {'$match': {'recipient_id': {'$ne': None}}},
+        {'$group': {
+            '_id': {'recipient': '$recipient_id',
+                    'month': {'$dateToString': {'format': '%Y-%m', 'date': {'$ifNull': ['$created_at', '$issue_date']}}}},
+            'count': {'$sum': 1}
+        }}
+    ]
+    for r in credentials.aggregate(month_pipeline):
+        doc = user_doc(r['_id']['recipient'])
+        doc['credentials_total'] = doc.get('credentials_total', 0) + r['count']
+        doc.setdefault('credentials_by_month', {})[r['_id']['month'] or 'unknown'] = r['count']
+
+    week_pipeline = [
+        {'$match': {'recipient_id': {'$ne': None}}},
+        {'$group': {
+            '_id': {'recipient': '$recipient_id',
+                    'week': {'$dateToString': {'format': '%G-W%V', 'date': '$created_at'}}},
+            'count': {'$sum': 1},
+            'valid': {'$sum': {'$cond': ['$is_valid', 1, 0]}}
+        }}
+    ]
+    for r in db.verifications.aggregate(week_pipeline):
+        doc = user_doc(r['_id']['recipient'])
+        doc['verifications_total'] = doc.get('verifications_total', 0) + r['count']
+        doc['verifications_valid'] = doc.get('verifications_valid', 0) + r['valid']
+        doc.setdefault('verifications_by_week', {})[r['_id']['week'] or 'unknown'] = r['count']
+
+    # Replace in place (the collection is never empty), then drop rollups of users that no longer have any
+    for key, doc in docs.items():
+        db[ROLLUPS].replace_one({'_id': key}, doc, upsert=True)
+    db[ROLLUPS].delete_many({'_id': {'$nin': list(docs) + [REBUILD_LEASE_ID]}})
+    return len(docs)
+
+
+def ensure_rollups(db):
+    """Backfill the rollups on first start, logging (not raising) on failure so the API still boots"""
+    try:
+        if db[ROLLUPS].find_one({'_id': GLOBAL_ID}, {'_id': 1}) is not None:
+            return
+        built = rebuild_rollups(db)
+        if built is None:
+            print("📊 Analytics rollups are being rebuilt by another worker")
+        else:
+            print(f"📊 Built {built} analytics rollup documents")
+    except Exception as e:
+        print(f"⚠️ Failed to build analytics rollups: {e}")
+
+
+if __name__ == '__main__':
+    import sys
+
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    if sys.argv[1:] != ['rebuild']:
+        sys.exit('usage: python -m services.analytics rebuild')
+    database = MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017/blockcreds_db')).get_default_database()
+    rebuilt = rebuild_rollups(database)
+    if rebuilt is None:
+        sys.exit('Another rebuild is running (lease held), try again later')
+    print(f"✅ Rebuilt {rebuilt} analytics rollup documents")
@@ -0,0 +1,79 @@
+"""Concurrent, streaming verification of large code batches.
+
+``stream_verifications`` fans lookups out over a bounded thread pool and
+yields each outcome as soon as it completes. Only ``max_workers * 2`` codes
+are in flight at any time, so memory stays flat however long the batch is,
+and a code that outlives ``timeout`` seconds is reported instead of stalling
+the stream.
+"""
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def parse_stream_args(data, max_workers_limit, max_timeout):
+    """
+    Read ``concurrency`` and ``timeout`` from a batch request body, clamped to the server limits
+    :return: Tuple of ``(max_workers, timeout)``; raises ``ValueError`` on malformed values
+    """
+    try:
+        max_workers = int(data.get('concurrency', 8))
+    except (TypeError, ValueError):
+        raise ValueError('concurrency must be an integer') from None
+    try:
+        timeout = float(data.get('timeout', 10))
+    except (TypeError, ValueError):
+        raise ValueError('timeout must be a number') from None
+    if not math.isfinite(timeout):
+        raise ValueError('timeout must be a number')
+    return max(1, min(max_workers, max_workers_limit)), max(0.1, min(timeout, max_timeout))
+
+
+def stream_verifications(codes, verify, max_workers=8, timeout=10.0):
+    """
+    Verify ``codes`` concurrently and yield results in completion order
+    :param codes: Iterable of verification codes
+    :param verify: Callable ``verify(code) -> bool`` run in the worker pool
+    :param max_workers: Number of worker threads
+    :param timeout: Seconds a code may spend queued and running before it is reported as timed out
+    :return: Generator of ``{'credential_id', 'is_valid'[, 'error']}`` dictionaries
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch-verify')
+    pending = iter(codes)
+    in_flight = {}
+
+    def submit_next():
+        for code in pending:
+            in_flight[executor.submit(verify, code)] = (code, time.monotonic())
+            return True
+        return False
+
+    try:
+        for _ in range(max_workers * 2):
+            if not submit_next():
+                break
+
+        while in_flight:
+            oldest = min(started for _, started in in_flight.values())
+            remaining = max(0.0, oldest + timeout - time.monotonic())
+            done, _ = wait(list(in_flight), timeout=remaining, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                code, _ = in_flight.pop(future)
+                try:
+                    yield {'credential_id': code, 'is_valid': bool(future.result())}
+                except Exception as e:
+                    yield {'credential_id': code, 'is_valid': False, 'error': str(e)}
+                submit_next()
+
+            now = time.monotonic()
+            for future, (code, started) in list(in_flight.items()):
+                if now - started >= timeout:
+                    # The worker thread cannot be interrupted; its result is simply dropped
+                    future.cancel()
+                    del in_flight[future]
+                    yield {'credential_id': code, 'is_valid': False, 'error': 'timeout'}
+                    submit_next()
+    finally:
+        # Also runs when the client disconnects and the generator is closed
+        executor.shutdown(wait=False, cancel_futures=True)
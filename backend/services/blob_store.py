@@ -0,0 +1,170 @@
+"""Content-addressed storage for credential images.
+
+Credential documents used to embed the full base64 image, so every listing,
+admin and analytics query dragged megabytes over the wire. Images now live in
+a blob store keyed by the SHA-256 of their bytes and the credential only keeps
+the ``image_ref``. Identical uploads are stored once.
+
+Two backends share the same interface:
+- ``LocalBlobStore``: sharded files under ``BLOB_STORE_PATH`` (single host)
+- ``GridFSBlobStore``: GridFS bucket in the application database (multi host)
+
+Since blobs are shared, ``RefCountedBlobStore`` keeps one ``blob_refs``
+document per blob counting the credentials that use it: ``put`` increments
+it, ``release`` decrements it and deletes the blob only once it reaches zero.
+The deleting release marks the count document while it removes the blob, and
+a ``put`` of the same bytes waits for the removal to finish before it stores
+them again, so a concurrent upload can never end up pointing at a blob that
+was deleted under it. A mark left behind by a crashed process expires after
+``DELETE_TIMEOUT`` seconds.
+"""
+import base64
+import datetime
+import hashlib
+import os
+import tempfile
+import time
+
+import gridfs
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+BLOB_REFS = 'blob_refs'
+DELETE_TIMEOUT = 60
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def decode_image(image_str):
+    """
+    Split a (data URL or bare) base64 image into bytes and content type
+    :return: Tuple of ``(bytes, content_type)``
+    """
+    content_type = 'application/octet-stream'
+    if ',' in image_str:
+        prefix, image_str = image_str.split(',', 1)
+        if prefix.startswith('data:') and ';' in prefix:
+            content_type = prefix[5:prefix.index(';')]
+    return base64.b64decode(image_str), content_type
+
+
+class LocalBlobStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, ref):
+        return os.path.join(self.root, ref[:2], ref[2:4], ref)
+
+    def put(self, data):
+        """Store ``data`` and return its reference. Storing the same bytes twice is a no-op."""
+        ref = content_hash(data)
+        path = self._path(ref)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so readers never see a partial blob
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return ref
+
+    def get(self, ref):
+        with open(self._path(ref), 'rb') as f:
+            return f.read()
+
+    def delete(self, ref):
+        try:
+            os.remove(self._path(ref))
+        except FileNotFoundError:
+            pass
+
+
+class GridFSBlobStore:
+    def __init__(self, db, collection='credential_images'):
+        self.fs = gridfs.GridFS(db, collection=collection)
+
+    def put(self, data):
+        ref = content_hash(data)
+        if not self.fs.exists(ref):
+            self.fs.put(data, _id=ref)
+        return ref
+
+    def get(self, ref):
+        return self.fs.get(ref).read()
+
+    def delete(self, ref):
+        self.fs.delete(ref)
+
+
+class RefCountedBlobStore:
+    def __init__(self, store, db, retry_delay=0.05):
+        self.store = store
+        self.refs = db[BLOB_REFS]
+        self.retry_delay = retry_delay
+
+    def put(self, data):
+        """Store ``data`` for one more credential and return its reference"""
+        ref = content_hash(data)
+        while True:
+            stale = datetime.datetime.utcnow() - datetime.timedelta(seconds=DELETE_TIMEOUT)
+            try:
+                self.refs.update_one(
+                    {'_id': ref, '$or': [{'deleting_at': None}, {'deleting_at': {'$lt': stale}}]},
+                    {'$inc': {'count': 1}, '$unset': {'deleting_at': ''}},
+                    upsert=True
+                )
+                break
+            except DuplicateKeyError:
+                # A release is deleting this blob; store it again once that is done
+                time.sleep(self.retry_delay)
+        # Counted before writing, so from here on no release can delete it
+        self.store.put(data)
+        return ref
+
+    def get(self, ref):
+        return self.store.get(ref)
+
+    def release(self, ref):
+        """Drop one credential's reference to ``ref``, deleting the blob when it was the last one"""
+        counted = self.refs.find_one_and_update(
+            {'_id': ref}, {'$inc': {'count': -1}}, return_document=ReturnDocument.AFTER
+        )
+        if counted is None or counted['count'] > 0:
+            # No count document: a blob stored before counting existed, kept until rebuild_ref_counts runs
+            return
+        marker = datetime.datetime.utcnow()
+        claimed = self.refs.update_one(
+            {'_id': ref, 'count': {'$lte': 0}, 'deleting_at': None}, {'$set': {'deleting_at': marker}}
+        )
+        if not claimed.modified_count:
+            return
+        self.store.delete(ref)
+        self.refs.delete_one({'_id': ref, 'deleting_at': marker})
+
+
+def rebuild_ref_counts(db):
+    """
+    Recount the credentials using each blob, e.g. for blobs stored before reference counting.
+    Run it while the API is stopped: a credential created or deleted meanwhile can be miscounted.
+    :return: Number of blobs counted
+    """
+    counted = 0
+    for group in db.credentials.aggregate([
+        {'$match': {'image_ref': {'$type': 'string'}}},
+        {'$group': {'_id': '$image_ref', 'count': {'$sum': 1}}},
+    ]):
+        db[BLOB_REFS].update_one({'_id': group['_id']}, {'$set': {'count': group['count']}}, upsert=True)
+        counted += 1
+    return counted
+
+
+def create_blob_store(db):
+    """Build the blob store selected by the ``BLOB_STORE`` environment variable (``local`` or ``gridfs``)"""
+    if os.environ.get('BLOB_STORE', 'local') == 'gridfs':
+        store = GridFSBlobStore(db)
+    else:
+        store = LocalBlobStore(os.environ.get('BLOB_STORE_PATH', './blob_store'))
+    return RefCountedBlobStore(store, db)
@@ -0,0 +1,119 @@
+"""Bulk credential issuance.
+
+Issuing one credential per request costs a recipient ``find_one``, maybe a
+recipient ``insert_one`` and a credential ``insert_one``. For a batch of
+rows the same work becomes:
+
+- one ``bulk_write`` of recipient upserts keyed by email, plus one ``$in``
+  query to map every email to its user id
+- one unordered ``insert_many`` of credentials
+
+Every row gets its own result, so a bad row never fails the batch.
+"""
+import csv
+import datetime
+import io
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from services.chain_confirmer import is_transaction_hash
+
+REQUIRED_FIELDS = ('recipient_email', 'title', 'transaction_hash')
+CREDENTIAL_FIELDS = REQUIRED_FIELDS + ('verification_code', 'credential_type', 'expiry_date', 'image_uri', 'credential_data')
+
+
+def rows_from_csv(text):
+    """
+    Parse CSV rows. Known columns map onto credential fields; any other
+    non-empty column is collected into ``credential_data``
+    """
+    rows = []
+    for record in csv.DictReader(io.StringIO(text)):
+        row = {'credential_data': {}}
+        for column, value in record.items():
+            if column is None or value is None:
+                continue
+            column, value = column.strip(), value.strip()
+            if column in CREDENTIAL_FIELDS and column != 'credential_data':
+                if value:
+                    row[column] = value
+            elif value:
+                row['credential_data'][column] = value
+        rows.append(row)
+    return rows
+
+
+def validate_row(row):
+    """Return an error message for a malformed row, or ``None``"""
+    if not isinstance(row, dict):
+        return 'Row must be an object'
+    missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+    if missing:
+        return f"Missing required fields: {', '.join(missing)}"
+    if '@' not in str(row['recipient_email']):
+        return 'Invalid recipient_email'
+    if not is_transaction_hash(row['transaction_hash']):
+        return 'transaction_hash must be 0x followed by 64 hex characters'
+    if not isinstance(row.get('credential_data', {}), dict):
+        return 'credential_data must be an object'
+    return None
+
+
+def upsert_recipients(db, emails):
+    """
+    Resolve recipients by email, creating the missing ones, with one ``bulk_write``
+    :return: Tuple of ``(email -> user _id, number of users created)``
+    """
+    emails = list(dict.fromkeys(emails))
+    if not emails:
+        return {}, 0
+    now = datetime.datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {'email': email},
+            {'$setOnInsert': {'email': email, 'role': 'recipient', 'status': 'active', 'created_at': now}},
+            upsert=True
+        )
+        for email in emails
+    ]
+    try:
+        created = db.users.bulk_write(ops, ordered=False).upserted_count
+    except BulkWriteError as e:
+        # Duplicate key: a concurrent request created the same recipient first, the lookup below finds it
+        if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+            raise
+        created = e.details.get('nUpserted', 0)
+    ids = {user['email']: user['_id'] for user in db.users.find({'email': {'$in': emails}}, {'email': 1})}
+    return ids, created
+
+
+def build_credential(row, issuer, recipient_id, now):
+    return {
+        'title': row['title'],
+        'issuer_id': issuer['_id'],
+        'recipient_id': recipient_id,
+        'issue_date': now,
+        'expiry_date': row.get('expiry_date'),
+        'credential_data': row.get('credential_data') or {},
+        'transaction_hash': row['transaction_hash'],
+        'verification_code': row.get('verification_code'),
+        'image_ref': None,
+        'image_content_type': None,
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+def insert_credentials(db, credentials):
+    """
+    Insert credentials with one unordered ``insert_many``
+    :return: Dictionary mapping the index of each failed credential to its error message
+    """
+    if not credentials:
+        return {}
+    try:
+        db.credentials.insert_many(credentials, ordered=False)
+    except BulkWriteError as e:
+        return {error['index']: error.get('errmsg', 'Insert failed') for error in e.details.get('writeErrors', [])}
+    return {}
@@ -0,0 +1,139 @@
+"""JSON-RPC batching for registry view calls and receipt lookups.
+
+``/api/verify/batch`` used to issue one ``eth_call`` per code. ``batch_verify_codes``
+ABI-encodes every lookup up front, posts them to the node as JSON-RPC batch
+requests of ``chunk_size`` calls each and decodes the results locally, so a
+thousand codes cost a handful of HTTP round trips. ``batch_get_receipts`` does
+the same for transaction receipts.
+"""
+import requests
+
+from services.chain_cache import normalize_code
+
+
+def _function_abi(contract, name):
+    return next(item for item in contract.abi if item.get('type') == 'function' and item.get('name') == name)
+
+
+def _encode_call(contract, name, args):
+    # web3 v7 renamed encodeABI(fn_name=...) to encode_abi(abi_element_identifier)
+    if hasattr(contract, 'encode_abi'):
+        return contract.encode_abi(name, args=args)
+    return contract.encodeABI(fn_name=name, args=args)
+
+
+def batch_call(w3, endpoint_uri, contract, name, args_list, chunk_size=200, timeout=30):
+    """
+    Run one view function for many argument lists using JSON-RPC batches
+    :param w3: Web3 instance (used for ABI decoding and the sequential fallback)
+    :param endpoint_uri: HTTP JSON-RPC endpoint of the node
+    :param contract: Contract instance
+    :param name: View function name
+    :param args_list: List of argument lists, one per call
+    :param chunk_size: Maximum number of calls per HTTP request
+    :return: List of decoded results (tuples) aligned with ``args_list``; ``None`` for calls that failed
+    """
+    output_types = [output['type'] for output in _function_abi(contract, name)['outputs']]
+    results = [None] * len(args_list)
+
+    for start in range(0, len(args_list), chunk_size):
+        chunk = args_list[start:start + chunk_size]
+        payload = [
+            {
+                'jsonrpc': '2.0',
+                'id': start + offset,
+                'method': 'eth_call',
+                'params': [{'to': contract.address, 'data': _encode_call(contract, name, args)}, 'latest']
+            }
+            for offset, args in enumerate(chunk)
+        ]
+        response = requests.post(endpoint_uri, json=payload, timeout=timeout)
+        response.raise_for_status()
+        replies = response.json()
+
+        if not isinstance(replies, list):
+            # Node does not support batching, fall back to one call per item
+            print(f"⚠️ JSON-RPC batch rejected ({replies.get('error')}), falling back to sequential calls")
+            for offset, args in enumerate(chunk):
+                try:
+                    results[start + offset] = tuple(getattr(contract.functions, name)(*args).call())
+                except Exception:
+                    results[start + offset] = None
+            continue
+
+        # Batch replies may arrive in any order
+        for reply in replies:
+            if 'result' not in reply:
+                continue
+            try:
+                raw = bytes.fromhex(reply['result'][2:])
+                results[reply['id']] = tuple(w3.codec.decode(output_types, raw))
+            except Exception as e:
+                print(f"Failed to decode batched {name} result: {e}")
+
+    return results
+
+
+def batch_verify_codes(w3, endpoint_uri, contract, cache, codes, chunk_size=200):
+    """
+    Resolve ``verifyCredential`` for many codes, serving cache hits locally
+    :return: Dictionary mapping each input code to its result tuple (``None`` on failure)
+    """
+    results = {}
+    misses = []
+    # Read before the node calls: an event processed while they are in flight must not be overwritten
+    generation = cache.generation
+    for code in codes:
+        cached = cache.get(code)
+        if cached is None:
+            misses.append(code)
+        else:
+            results[code] = cached
+
+    unique_misses = list(dict.fromkeys(misses))
+    fetched = batch_call(
+        w3, endpoint_uri, contract, 'verifyCredential',
+        [[normalize_code(code)] for code in unique_misses],
+        chunk_size=chunk_size
+    )
+    for code, result in zip(unique_misses, fetched):
+        if result is not None:
+            # Skipped if an event invalidated entries while the batch was in flight
+            cache.put_if_generation(code, result, generation)
+        results[code] = result
+    return results
+
+
+def batch_get_receipts(w3, endpoint_uri, tx_hashes, chunk_size=200, timeout=30):
+    """
+    Fetch many transaction receipts using JSON-RPC batches
+    :param tx_hashes: List of 0x-prefixed transaction hashes
+    :return: Dictionary mapping each hash to its receipt (raw JSON-RPC dict), or ``None`` when not mined yet or failed
+    """
+    hashes = list(dict.fromkeys(tx_hashes))
+    receipts = {}
+
+    for start in range(0, len(hashes), chunk_size):
+        chunk = hashes[start:start + chunk_size]
+        payload = [
+            {'jsonrpc': '2.0', 'id': offset, 'method': 'eth_getTransactionReceipt', 'params': [tx_hash]}
+            for offset, tx_hash in enumerate(chunk)
+        ]
+        response = requests.post(endpoint_uri, json=payload, timeout=timeout)
+        response.raise_for_status()
+        replies = response.json()
+
+        if not isinstance(replies, list):
+            print(f"⚠️ JSON-RPC batch rejected ({replies.get('error')}), falling back to sequential receipts")
+            for tx_hash in chunk:
+                try:
+                    receipt = w3.eth.get_transaction_receipt(tx_hash)
+                    receipts[tx_hash] = {'status': hex(receipt['status']), 'blockNumber': hex(receipt['blockNumber'])}
+                except Exception:
+                    receipts[tx_hash] = None
+            continue
+
+        for reply in replies:
+            receipts[chunk[reply['id']]] = reply.get('result')
+
+    return receipts
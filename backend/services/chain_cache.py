@@ -0,0 +1,219 @@
+"""On-chain verification result cache.
+
+``verifyCredential`` is a view call, so its answer only changes when the
+registry emits an event (issuance, revocation, issuer authorization or
+revocation) or when the credential passes its ``expiresAt`` timestamp. ``VerificationCache`` keeps the
+last answer per verification code in a bounded LRU, and ``ChainEventWatcher``
+follows the registry logs in the background and evicts affected entries.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from web3 import Web3
+
+# Positions in the tuple returned by CredentialRegistry.verifyCredential
+RESULT_CREDENTIAL_ID = 1
+RESULT_ISSUER = 3
+RESULT_EXPIRES_AT = 6
+
+INVALIDATING_EVENTS = {
+    'CredentialIssued': 'CredentialIssued(uint256,bytes32,address,address,string)',
+    'CredentialRevoked': 'CredentialRevoked(uint256,address,uint256)',
+    'IssuerAuthorized': 'IssuerAuthorized(address,string,address)',
+    'IssuerRevoked': 'IssuerRevoked(address,address)',
+}
+
+
+def normalize_code(code):
+    """Return the ``0x``-prefixed form the registry stores verification codes under."""
+    code = str(code)
+    return code if code.startswith('0x') else f"0x{code}"
+
+
+class VerificationCache:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._by_credential_id = {}
+        self._by_issuer = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, code):
+        """Return the cached ``verifyCredential`` result for ``code`` or ``None``"""
+        code = normalize_code(code)
+        with self._lock:
+            result = self._entries.get(code)
+            if result is None:
+                self.misses += 1
+                return None
+            expires_at = result[RESULT_EXPIRES_AT]
+            if expires_at and expires_at <= time.time():
+                # The contract reports expired credentials as invalid, re-ask the node
+                self._remove(code)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(code)
+            self.hits += 1
+            return result
+
+    @property
+    def generation(self):
+        """Bumped on every invalidation; read it before a node call and pass it to ``put_if_generation``"""
+        return self._generation
+
+    def put(self, code, result):
+        with self._lock:
+            self._store(normalize_code(code), tuple(result))
+
+    def put_if_generation(self, code, result, generation):
+        """
+        Store ``result`` unless an invalidation happened since ``generation`` was read
+        :return: True if the result was stored
+        """
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._store(normalize_code(code), tuple(result))
+            return True
+
+    def _store(self, code, result):
+        """Insert ``code`` and its secondary index entries. Caller must hold the lock."""
+        if code in self._entries:
+            self._remove(code)
+        self._entries[code] = result
+        if result[RESULT_CREDENTIAL_ID]:
+            self._by_credential_id[result[RESULT_CREDENTIAL_ID]] = code
+            self._by_issuer.setdefault(result[RESULT_ISSUER].lower(), set()).add(code)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def get_or_fetch(self, code, fetch):
+        """
+        Return the cached result for ``code``, calling ``fetch(code)`` on a miss
+        :param code: Verification code (with or without ``0x`` prefix)
+        :param fetch: Callable performing the ``verifyCredential`` call
+        """
+        result = self.get(code)
+        if result is None:
+            generation = self.generation
+            result = fetch(normalize_code(code))
+            # Skip the store if an event invalidated entries while the call was in flight
+            self.put_if_generation(code, result, generation)
+        return result
+
+    def invalidate(self, code):
+        with self._lock:
+            self._generation += 1
+            self._remove(normalize_code(code))
+
+    def invalidate_credential(self, credential_id):
+        with self._lock:
+            self._generation += 1
+            code = self._by_credential_id.get(credential_id)
+            if code:
+                self._remove(code)
+
+    def invalidate_issuer(self, issuer):
+        with self._lock:
+            self._generation += 1
+            for code in list(self._by_issuer.get(issuer.lower(), ())):
+                self._remove(code)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_credential_id.clear()
+            self._by_issuer.clear()
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _remove(self, code):
+        """Drop ``code`` and its secondary index entries. Caller must hold the lock."""
+        result = self._entries.pop(code, None)
+        if result is None or not result[RESULT_CREDENTIAL_ID]:
+            return
+        self._by_credential_id.pop(result[RESULT_CREDENTIAL_ID], None)
+        issuer = result[RESULT_ISSUER].lower()
+        codes = self._by_issuer.get(issuer)
+        if codes:
+            codes.discard(code)
+            if not codes:
+                del self._by_issuer[issuer]
+
+
+class ChainEventWatcher:
+    """Polls CredentialRegistry logs and evicts cache entries they affect."""
+
+    def __init__(self, w3, contract, cache, poll_interval=5.0):
+        self.w3 = w3
+        self.contract = contract
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.last_block = None
+        self._topics = {
+            Web3.to_hex(Web3.keccak(text=signature)): name
+            for name, signature in INVALIDATING_EVENTS.items()
+        }
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='chain-event-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def poll(self):
+        """Process logs emitted since the last poll. Returns the number of events handled."""
+        latest = self.w3.eth.block_number
+        if self.last_block is None:
+            # Nothing is cached from before the watcher started, so start at the head
+            self.last_block = latest
+            return 0
+        if latest <= self.last_block:
+            return 0
+
+        logs = self.w3.eth.get_logs({
+            'address': self.contract.address,
+            'fromBlock': self.last_block + 1,
+            'toBlock': latest,
+            'topics': [list(self._topics)],
+        })
+        for log in logs:
+            self._handle(log)
+        self.last_block = latest
+        return len(logs)
+
+    def _handle(self, log):
+        name = self._topics.get(Web3.to_hex(log['topics'][0]))
+        if not name:
+            return
+        args = getattr(self.contract.events, name)().process_log(log)['args']
+        if name == 'CredentialIssued':
+            self.cache.invalidate(args['verificationCode'])
+        elif name == 'CredentialRevoked':
+            self.cache.invalidate_credential(args['credentialId'])
+        elif name in ('IssuerAuthorized', 'IssuerRevoked'):
+            # Both change issuerOrganizations[issuer], which every cached result of the issuer carries
+            self.cache.invalidate_issuer(args['issuer'])
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                # A failed poll leaves last_block untouched so the range is retried,
+                # but the cache can no longer be trusted to be fresh
+                print(f"⚠️ Chain event poll failed: {e}")
+                self.cache.clear()
+            self._stop.wait(self.poll_interval)
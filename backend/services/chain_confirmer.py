@@ -0,0 +1,146 @@
+"""Background confirmation of credential issuance transactions.
+
+Credentials are accepted with ``chain_status: 'pending_chain'`` instead of
+blocking the request on ``get_transaction_receipt``. ``ChainConfirmer``
+polls the receipts of all pending credentials in JSON-RPC batches and, once
+a transaction is ``confirmations`` blocks deep, flips the credential to
+``confirmed`` (and ``is_verified``). Reverted transactions, and ones still
+unmined after ``timeout`` seconds, are marked ``failed``.
+
+Each poll takes the ``batch_size`` pending credentials with the earliest
+``next_check_at`` and pushes every one it leaves pending to the back of the
+queue: mined ones to the next poll, unmined ones back off with their age (up
+to ``MAX_RECHECK_DELAY``). So a burst of dropped or bogus hashes can delay
+newer credentials by a poll, never starve them until it times out.
+
+Updates are filtered on ``chain_status: 'pending_chain'``, so several API
+processes can run a confirmer each without double counting.
+"""
+import datetime
+import re
+import threading
+
+from pymongo import UpdateMany, UpdateOne
+
+from services import analytics
+from services.chain_batch import batch_get_receipts
+
+PENDING = 'pending_chain'
+CONFIRMED = 'confirmed'
+FAILED = 'failed'
+
+TX_HASH_PATTERN = re.compile(r'^0x[0-9a-fA-F]{64}$')
+# Unmined transactions are rechecked after a tenth of their age, at most this many seconds apart
+MAX_RECHECK_DELAY = 300
+
+
+def is_transaction_hash(value):
+    """True for a ``0x``-prefixed 32-byte hex transaction hash"""
+    return isinstance(value, str) and TX_HASH_PATTERN.match(value) is not None
+
+
+class ChainConfirmer:
+    def __init__(self, db, w3, endpoint_uri, confirmations=2, poll_interval=5.0, timeout=3600, batch_size=500):
+        self.db = db
+        self.w3 = w3
+        self.endpoint_uri = endpoint_uri
+        self.confirmations = max(1, confirmations)
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='chain-confirmer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def poll(self):
+        """Check the pending transactions that are due once. Returns ``(confirmed, failed)`` credential counts."""
+        started = datetime.datetime.utcnow()
+        pending = list(
+            # Credentials from before next_check_at existed lack the field and sort first
+            self.db.credentials.find(
+                {'chain_status': PENDING, 'next_check_at': {'$not': {'$gt': started}}},
+                {'transaction_hash': 1, 'created_at': 1}
+            )
+            .sort('next_check_at', 1)
+            .limit(self.batch_size)
+        )
+        if not pending:
+            return 0, 0
+
+        head = self.w3.eth.block_number
+        receipts = batch_get_receipts(self.w3, self.endpoint_uri, [c['transaction_hash'] for c in pending])
+        stale_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.timeout)
+
+        now = datetime.datetime.utcnow()
+        confirmed, reverted, expired = set(), set(), set()
+        rechecks = []
+        for credential in pending:
+            tx_hash = credential['transaction_hash']
+            receipt = receipts.get(tx_hash)
+            if receipt is None:
+                if credential.get('created_at') and credential['created_at'] < stale_before:
+                    expired.add(tx_hash)
+                else:
+                    rechecks.append((credential['_id'], now + self._recheck_delay(credential, now)))
+            elif int(receipt.get('status', '0x0'), 16) != 1:
+                reverted.add(tx_hash)
+            elif head - int(receipt['blockNumber'], 16) + 1 >= self.confirmations:
+                confirmed.add(tx_hash)
+            else:
+                # Mined but not deep enough yet, look again next poll
+                rechecks.append((credential['_id'], now))
+
+        if rechecks:
+            self.db.credentials.bulk_write([
+                UpdateOne({'_id': credential_id, 'chain_status': PENDING}, {'$set': {'next_check_at': when}})
+                for credential_id, when in rechecks
+            ], ordered=False)
+        newly_confirmed = 0
+        if confirmed:
+            result = self.db.credentials.bulk_write([
+                UpdateMany(
+                    {'transaction_hash': tx_hash, 'chain_status': PENDING},
+                    {'$set': {'chain_status': CONFIRMED, 'is_verified': True, 'confirmed_at': now, 'updated_at': now}}
+                )
+                for tx_hash in confirmed
+            ], ordered=False)
+            # modified_count only covers what this process flipped, so concurrent confirmers never double count
+            newly_confirmed = result.modified_count
+            if newly_confirmed:
+                analytics.record_verified(self.db, newly_confirmed)
+
+        failures = [
+            UpdateMany(
+                {'transaction_hash': tx_hash, 'chain_status': PENDING},
+                {'$set': {'chain_status': FAILED, 'chain_error': error, 'updated_at': now}}
+            )
+            for error, hashes in (('Transaction reverted', reverted), ('Transaction not mined in time', expired))
+            for tx_hash in hashes
+        ]
+        if failures:
+            self.db.credentials.bulk_write(failures, ordered=False)
+        return newly_confirmed, len(reverted) + len(expired)
+
+    def _recheck_delay(self, credential, now):
+        """Back off on an unmined transaction in proportion to its age"""
+        age = (now - credential['created_at']).total_seconds() if credential.get('created_at') else 0
+        return datetime.timedelta(seconds=min(max(self.poll_interval, age / 10), MAX_RECHECK_DELAY))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                confirmed, failed = self.poll()
+                if confirmed or failed:
+                    print(f"⛓️ Confirmed {confirmed} credentials, {failed} failed on chain")
+            except Exception as e:
+                print(f"⚠️ Chain confirmation poll failed: {e}")
+            self._stop.wait(self.poll_interval)
@@ -0,0 +1,459 @@
+"""Local Mongo mirror of the CredentialRegistry event log.
+
+``ChainIndexer`` follows the registry's ``CredentialIssued``,
+``CredentialRevoked``, ``IssuerAuthorized``, ``IssuerRevoked`` and
+``CredentialVerified`` logs and maintains:
+
+- ``chain_events``: every log, keyed by ``<tx hash>:<log index>``
+- ``chain_credentials``: one document per credential id with the fields
+  ``verifyCredential`` reports (the immutable struct fields are fetched once,
+  in a JSON-RPC batch, when the issuance is indexed; if that fetch fails the
+  document is flagged ``details_pending`` and re-fetched on later polls)
+- ``chain_issuers``: organization and authorization state per issuer
+- ``chain_checkpoints``: the last indexed block plus the hashes of recent
+  blocks, used to detect reorgs
+
+Reorgs: before each poll the stored recent block hashes are compared with
+the node's, newest first. On a mismatch every event above the newest block
+that still matches is deleted, the affected credentials and issuers are
+rebuilt from the remaining events, and indexing resumes from that block.
+A reorg deeper than the stored window triggers a full rebuild.
+
+Applying a block range twice (a poll that failed before saving its
+checkpoint is retried) leaves the mirror unchanged: events are upserted by
+id and derived fields, the verification count included, are recomputed
+from the stored events rather than incremented.
+
+Only one process indexes at a time (a lease on the checkpoint document,
+renewed at every step of a poll so a long backfill keeps it, and checked
+before anything is written); every process reads the mirror. ``lookup`` answers from the mirror only
+while it is within ``max_lag`` blocks of the head and returns ``None``
+otherwise (or for codes it has not seen), so callers fall back to the node.
+"""
+import datetime
+import os
+import threading
+import time
+import uuid
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from web3 import Web3
+
+from services.chain_batch import batch_call
+from services.chain_cache import normalize_code
+
+EVENTS = 'chain_events'
+CREDENTIALS = 'chain_credentials'
+ISSUERS = 'chain_issuers'
+CHECKPOINTS = 'chain_checkpoints'
+
+INDEXED_EVENTS = {
+    'CredentialIssued': 'CredentialIssued(uint256,bytes32,address,address,string)',
+    'CredentialRevoked': 'CredentialRevoked(uint256,address,uint256)',
+    'IssuerAuthorized': 'IssuerAuthorized(address,string,address)',
+    'IssuerRevoked': 'IssuerRevoked(address,address)',
+    'CredentialVerified': 'CredentialVerified(uint256,address,uint256)',
+}
+
+CHAIN_INDEXES = {
+    EVENTS: [
+        IndexModel([('block_number', ASCENDING)], name='block_number'),
+        IndexModel([('credential_id', ASCENDING), ('event', ASCENDING)], name='credential_event', sparse=True),
+        IndexModel([('issuer', ASCENDING), ('block_number', ASCENDING)], name='issuer_block', sparse=True),
+    ],
+    CREDENTIALS: [
+        IndexModel([('verification_code', ASCENDING)], name='verification_code'),
+        IndexModel([('details_pending', ASCENDING)], name='details_pending', sparse=True),
+    ],
+}
+
+# Issuances whose struct fields are re-fetched per poll after a failed fetch
+DETAILS_RETRY_BATCH = 500
+
+
+class LeaseLost(Exception):
+    """Another process took over indexing while this one was polling"""
+
+
+def _hex(value):
+    return Web3.to_hex(value) if isinstance(value, (bytes, bytearray)) else value
+
+
+def _int(value):
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+class ChainIndexer:
+    def __init__(self, db, w3, endpoint_uri, contract, start_block=0, max_lag=5, poll_interval=2.0,
+                 block_range=2000, reorg_window=64, lease_seconds=30):
+        self.db = db
+        self.w3 = w3
+        self.endpoint_uri = endpoint_uri
+        self.contract = contract
+        self.start_block = start_block
+        self.max_lag = max_lag
+        self.poll_interval = poll_interval
+        self.block_range = block_range
+        self.reorg_window = reorg_window
+        self.lease_seconds = lease_seconds
+        self.checkpoint_id = f'CredentialRegistry:{contract.address}'
+        self.worker_id = f'{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.head = None
+        self.last_block = None
+        self._polled_at = None
+        self._topics = {Web3.to_hex(Web3.keccak(text=sig)): name for name, sig in INDEXED_EVENTS.items()}
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Reads ---
+
+    def is_current(self):
+        """Whether the mirror is within ``max_lag`` blocks of the head as of a recent poll"""
+        if self.head is None or self.last_block is None or self._polled_at is None:
+            return False
+        # Failing polls leave head stale, so an old measurement does not count
+        if time.monotonic() - self._polled_at > max(5 * self.poll_interval, 10):
+            return False
+        return self.head - self.last_block <= self.max_lag
+
+    def lookup_many(self, codes):
+        """
+        ``verifyCredential``-shaped result tuples from the mirror
+        :return: Dictionary mapping each input code to its tuple, or to ``None`` when the node must be asked
+            (mirror lagging, code not indexed yet, or issuance details not fetched)
+        """
+        if not self.is_current():
+            return {code: None for code in codes}
+        normalized = {code: normalize_code(code) for code in codes}
+        docs = {
+            doc['verification_code']: doc
+            for doc in self.db[CREDENTIALS].find({'verification_code': {'$in': list(set(normalized.values()))}})
+        }
+        organizations = {
+            issuer['_id']: issuer.get('organization', '')
+            for issuer in self.db[ISSUERS].find({'_id': {'$in': list({d['issuer'] for d in docs.values()})}})
+        }
+        now = time.time()
+        results = {}
+        for code, key in normalized.items():
+            doc = docs.get(key)
+            if not doc or doc.get('issued_at') is None:
+                results[code] = None
+                continue
+            expired = bool(doc['expires_at']) and now > doc['expires_at']
+            results[code] = (
+                not doc['is_revoked'] and not expired,
+                doc['_id'],
+                bytes.fromhex(doc['credential_hash'][2:]),
+                doc['issuer'],
+                doc['owner'],
+                doc['issued_at'],
+                doc['expires_at'],
+                doc['is_revoked'],
+                organizations.get(doc['issuer'], ''),
+            )
+        return results
+
+    def lookup(self, code):
+        return self.lookup_many([code])[code]
+
+    # --- Indexing ---
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='chain-indexer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def poll(self):
+        """Index up to ``block_range`` new blocks if this process holds the lease. Returns the events indexed."""
+        self.head = self.w3.eth.block_number
+        checkpoint = self._acquire_lease()
+        if checkpoint is None:
+            # Another process indexes; just track how far it got
+            current = self.db[CHECKPOINTS].find_one({'_id': self.checkpoint_id}, {'last_block': 1})
+            self._caught_up(current.get('last_block') if current else None)
+            return 0
+
+        self._retry_details()
+        last_block = checkpoint.get('last_block')
+        recent = checkpoint.get('recent', [])
+        if last_block is not None:
+            ancestor = self._common_ancestor(recent)
+            if ancestor is None:
+                print(f"⚠️ Reorg deeper than {self.reorg_window} blocks, rebuilding the chain mirror")
+                self._rollback(self.start_block - 1)
+                last_block, recent = None, []
+            elif ancestor < last_block:
+                print(f"⚠️ Chain reorg detected, rolling the mirror back to block {ancestor}")
+                self._rollback(ancestor)
+                last_block, recent = ancestor, [entry for entry in recent if entry['number'] <= ancestor]
+            if last_block != checkpoint.get('last_block'):
+                self._save_checkpoint(last_block, recent)
+
+        from_block = self.start_block if last_block is None else last_block + 1
+        to_block = min(self.head, from_block + self.block_range - 1)
+        if from_block > to_block:
+            self._caught_up(last_block)
+            return 0
+
+        to_hash = Web3.to_hex(self.w3.eth.get_block(to_block)['hash'])
+        logs = self.w3.eth.get_logs({
+            'address': self.contract.address,
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'topics': [list(self._topics)],
+        })
+        events = [event for event in (self._decode(log) for log in logs) if event]
+        # get_logs over a long range can outlast the lease; never write once another process took over
+        self._renew_lease()
+        self._apply(events)
+
+        seen = {entry['number']: entry['hash'] for entry in recent}
+        seen.update({event['block_number']: event['block_hash'] for event in events})
+        seen[to_block] = to_hash
+        recent = [{'number': n, 'hash': h} for n, h in sorted(seen.items())][-self.reorg_window:]
+        self._save_checkpoint(to_block, recent)
+        self._caught_up(to_block)
+        return len(events)
+
+    def _save_checkpoint(self, last_block, recent):
+        saved = self.db[CHECKPOINTS].update_one(
+            {'_id': self.checkpoint_id, 'lease_owner': self.worker_id},
+            {'$set': {'last_block': last_block, 'recent': recent, 'updated_at': datetime.datetime.utcnow(),
+                      'lease_until': self._lease_until()}}
+        )
+        if not saved.matched_count:
+            raise LeaseLost(f'Lease on {self.checkpoint_id} taken over before block {last_block} was saved')
+
+    def _caught_up(self, last_block):
+        self.last_block = last_block
+        self._polled_at = time.monotonic()
+
+    def _lease_until(self):
+        return datetime.datetime.utcnow() + datetime.timedelta(seconds=self.lease_seconds)
+
+    def _acquire_lease(self):
+        now = datetime.datetime.utcnow()
+        try:
+            return self.db[CHECKPOINTS].find_one_and_update(
+                {'_id': self.checkpoint_id,
+                 '$or': [{'lease_owner': self.worker_id}, {'lease_until': {'$lt': now}}, {'lease_owner': None}]},
+                {'$set': {'lease_owner': self.worker_id, 'lease_until': self._lease_until()}},
+                upsert=True,
+                return_document=True
+            )
+        except DuplicateKeyError:
+            # The document exists and another live process holds the lease
+            return None
+
+    def _renew_lease(self):
+        """Extend the lease held since ``_acquire_lease``; raises ``LeaseLost`` if it expired and was taken"""
+        renewed = self.db[CHECKPOINTS].update_one(
+            {'_id': self.checkpoint_id, 'lease_owner': self.worker_id},
+            {'$set': {'lease_until': self._lease_until()}}
+        )
+        if not renewed.matched_count:
+            raise LeaseLost(f'Lease on {self.checkpoint_id} taken over by another process')
+
+    def _common_ancestor(self, recent):
+        """Newest stored block whose hash still matches the node, or ``None`` if none does"""
+        if not recent:
+            return None
+        for entry in reversed(recent):
+            block = self.w3.eth.get_block(entry['number'])
+            if Web3.to_hex(block['hash']) == entry['hash']:
+                return entry['number']
+        return None
+
+    def _decode(self, log):
+        name = self._topics.get(Web3.to_hex(log['topics'][0]))
+        if not name:
+            return None
+        args = getattr(self.contract.events, name)().process_log(log)['args']
+        event = {
+            '_id': f"{Web3.to_hex(log['transactionHash'])}:{_int(log['logIndex'])}",
+            'event': name,
+            'block_number': _int(log['blockNumber']),
+            'block_hash': Web3.to_hex(log['blockHash']),
+            'log_index': _int(log['logIndex']),
+        }
+        if name == 'CredentialIssued':
+            event.update(credential_id=args['credentialId'], credential_hash=_hex(args['credentialHash']),
+                         issuer=args['issuer'], owner=args['owner'], verification_code=args['verificationCode'])
+        elif name == 'CredentialRevoked':
+            event.update(credential_id=args['credentialId'], revoked_by=args['revokedBy'], revoked_at=args['revokedAt'])
+        elif name == 'IssuerAuthorized':
+            event.update(issuer=args['issuer'], organization=args['organization'], authorized_by=args['authorizedBy'])
+        elif name == 'IssuerRevoked':
+            event.update(issuer=args['issuer'], revoked_by=args['revokedBy'])
+        elif name == 'CredentialVerified':
+            event.update(credential_id=args['credentialId'], verifier=args['verifier'], verified_at=args['verifiedAt'])
+        return event
+
+    def _apply(self, events):
+        """Record events and fold them into the credential and issuer documents, in log order"""
+        if not events:
+            return
+        self.db[EVENTS].bulk_write(
+            [UpdateOne({'_id': e['_id']}, {'$set': e}, upsert=True) for e in events], ordered=False
+        )
+
+        issued = [e for e in events if e['event'] == 'CredentialIssued']
+        details = self._fetch_credentials([e['credential_id'] for e in issued])
+        self._ensure_issuers({e['issuer'] for e in issued})
+        self._renew_lease()
+
+        ops = []
+        for event in events:
+            name = event['event']
+            if name == 'CredentialIssued':
+                update = self._details_update(details.get(event['credential_id']))
+                update['$set'].update({
+                    'verification_code': event['verification_code'],
+                    'credential_hash': event['credential_hash'],
+                    'issuer': event['issuer'],
+                    'owner': event['owner'],
+                    'issued_block': event['block_number'],
+                })
+                update['$setOnInsert'] = {'is_revoked': False, 'verifications': 0}
+                ops.append((CREDENTIALS, UpdateOne({'_id': event['credential_id']}, update, upsert=True)))
+            elif name == 'CredentialRevoked':
+                ops.append((CREDENTIALS, UpdateOne(
+                    {'_id': event['credential_id']},
+                    {'$set': {'is_revoked': True, 'revoked_block': event['block_number']}}
+                )))
+            elif name == 'IssuerAuthorized':
+                ops.append((ISSUERS, UpdateOne({'_id': event['issuer']}, {'$set': {
+                    'organization': event['organization'], 'authorized': True, 'block_number': event['block_number']
+                }}, upsert=True)))
+            elif name == 'IssuerRevoked':
+                # The contract deletes the organization on revocation
+                ops.append((ISSUERS, UpdateOne({'_id': event['issuer']}, {'$set': {
+                    'organization': '', 'authorized': False, 'block_number': event['block_number']
+                }}, upsert=True)))
+
+        # Counted from the stored events, so re-applying a range never counts a verification twice
+        verified = {e['credential_id'] for e in events if e['event'] == 'CredentialVerified'}
+        for credential_id, count in self._count_verifications(verified).items():
+            ops.append((CREDENTIALS, UpdateOne({'_id': credential_id}, {'$set': {'verifications': count}})))
+
+        for collection in (CREDENTIALS, ISSUERS):
+            batch = [op for target, op in ops if target == collection]
+            if batch:
+                # Ordered: a revocation must land after the issuance it refers to
+                self.db[collection].bulk_write(batch, ordered=True)
+
+    @staticmethod
+    def _details_update(struct):
+        """
+        Update writing the ``credentials(id)`` struct fields, or flagging the document for ``_retry_details``
+        :param struct: Decoded struct, ``None`` when the fetch failed (the fields are then left out, not nulled)
+        """
+        if struct is None:
+            return {'$set': {'details_pending': True}}
+        return {'$set': {'metadata_hash': _hex(struct[2]), 'issued_at': struct[5], 'expires_at': struct[6]},
+                '$unset': {'details_pending': ''}}
+
+    def _count_verifications(self, credential_ids):
+        """Number of stored ``CredentialVerified`` events per credential id (0 for ids without any)"""
+        counts = {credential_id: 0 for credential_id in credential_ids}
+        if counts:
+            for group in self.db[EVENTS].aggregate([
+                {'$match': {'credential_id': {'$in': list(counts)}, 'event': 'CredentialVerified'}},
+                {'$group': {'_id': '$credential_id', 'count': {'$sum': 1}}},
+            ]):
+                counts[group['_id']] = group['count']
+        return counts
+
+    def _retry_details(self):
+        """Fetch the struct fields of issuances indexed while the fetch failed"""
+        pending = [doc['_id'] for doc in self.db[CREDENTIALS].find({'details_pending': True}, {'_id': 1})
+                   .limit(DETAILS_RETRY_BATCH)]
+        details = self._fetch_credentials(pending)
+        if details:
+            self.db[CREDENTIALS].bulk_write([
+                UpdateOne({'_id': credential_id, 'details_pending': True}, self._details_update(struct))
+                for credential_id, struct in details.items()
+            ], ordered=False)
+
+    def _fetch_credentials(self, credential_ids):
+        """The immutable credential struct fields, one JSON-RPC batch for all new issuances"""
+        if not credential_ids:
+            return {}
+        try:
+            results = batch_call(self.w3, self.endpoint_uri, self.contract, 'credentials', [[cid] for cid in credential_ids])
+        except Exception as e:
+            # Indexed without the details for now; _retry_details fills them in on a later poll
+            print(f"⚠️ Failed to fetch {len(credential_ids)} credential structs, will retry: {e}")
+            return {}
+        return {cid: result for cid, result in zip(credential_ids, results) if result is not None}
+
+    def _ensure_issuers(self, issuers):
+        """Issuers authorized without an event (the contract owner) are looked up once"""
+        known = {doc['_id'] for doc in self.db[ISSUERS].find({'_id': {'$in': list(issuers)}}, {'_id': 1})}
+        unknown = [issuer for issuer in issuers if issuer not in known]
+        if not unknown:
+            return
+        results = batch_call(self.w3, self.endpoint_uri, self.contract, 'getIssuerOrganization', [[i] for i in unknown])
+        ops = [
+            UpdateOne({'_id': issuer}, {'$setOnInsert': {'organization': result[0], 'authorized': True}}, upsert=True)
+            for issuer, result in zip(unknown, results) if result is not None
+        ]
+        if ops:
+            self.db[ISSUERS].bulk_write(ops, ordered=False)
+
+    def _rollback(self, ancestor):
+        """Forget every event above ``ancestor`` and rebuild the documents they touched"""
+        orphaned = list(self.db[EVENTS].find({'block_number': {'$gt': ancestor}}))
+        if not orphaned:
+            return
+        self.db[EVENTS].delete_many({'block_number': {'$gt': ancestor}})
+        credential_ids = {e['credential_id'] for e in orphaned if 'credential_id' in e}
+        issuers = {e['issuer'] for e in orphaned if e['event'] in ('IssuerAuthorized', 'IssuerRevoked')}
+
+        self.db[CREDENTIALS].delete_many({'_id': {'$in': list(credential_ids)}, 'issued_block': {'$gt': ancestor}})
+        verifications = self._count_verifications(credential_ids)
+        for credential_id in credential_ids:
+            self.db[CREDENTIALS].update_one({'_id': credential_id}, {'$set': {
+                'is_revoked': self.db[EVENTS].count_documents(
+                    {'credential_id': credential_id, 'event': 'CredentialRevoked'}, limit=1) > 0,
+                'verifications': verifications[credential_id],
+            }})
+
+        for issuer in issuers:
+            latest = self.db[EVENTS].find_one(
+                {'issuer': issuer, 'event': {'$in': ['IssuerAuthorized', 'IssuerRevoked']}},
+                sort=[('block_number', -1), ('log_index', -1)]
+            )
+            if latest is None:
+                # Back to the pre-event state; _ensure_issuers re-reads it from the contract when next needed
+                self.db[ISSUERS].delete_one({'_id': issuer})
+            else:
+                authorized = latest['event'] == 'IssuerAuthorized'
+                self.db[ISSUERS].update_one({'_id': issuer}, {'$set': {
+                    'organization': latest.get('organization', '') if authorized else '',
+                    'authorized': authorized,
+                    'block_number': latest['block_number'],
+                }})
+
+    def _run(self):
+        while not self._stop.is_set():
+            caught_up = True
+            try:
+                indexed = self.poll()
+                if indexed:
+                    print(f"⛓️ Indexed {indexed} registry events up to block {self.last_block}")
+                caught_up = self.head is None or self.last_block is None or self.last_block >= self.head
+            except LeaseLost as e:
+                print(f"⚠️ Chain indexer stopped mid-poll: {e}")
+            except Exception as e:
+                print(f"⚠️ Chain indexer poll failed: {e}")
+            # Keep going without a pause while backfilling history
+            if caught_up:
+                self._stop.wait(self.poll_interval)
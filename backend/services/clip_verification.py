@@ -1,18 +1,72 @@
+import os
+import threading
+
 import torch
 import clip
 from PIL import Image
 import io
 import base64
 
+from services.embeddings import cosine_similarity
+from services.model_serving import BackgroundWarmup, EncodeBatcher
+
+
 class ClipVerificationService:
+    """
+    CLIP-backed image comparison. The model is loaded lazily on first use
+    (or by ``warmup``), so importing this module stays cheap; ``is_ready``
+    turns true once the model is loaded and any forward pass (warmup batch
+    or real request) has succeeded.
+    """
+    model_name = "ViT-B/32"
+
     def __init__(self):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"Loading CLIP model on {self.device}...")
-        self.model, self.preprocess = clip.load("ViT-B/32", device=self.device)
-        print("CLIP model loaded successfully!")
+        self.model = None
+        self.preprocess = None
+        self.batcher = None
+        self.is_ready = False
+        self._load_lock = threading.Lock()
+        self._background_warmup = BackgroundWarmup(self.warmup, lambda: self.is_ready)
+
+    def _ensure_loaded(self):
+        if self.batcher is not None:
+            return
+        with self._load_lock:
+            if self.batcher is not None:
+                return
+            print(f"Loading CLIP model on {self.device}...")
+            self.model, self.preprocess = clip.load(self.model_name, device=self.device)
+            print("CLIP model loaded successfully!")
+            self.batcher = EncodeBatcher(
+                self._encode_batch,
+                stack=lambda inputs: torch.cat(inputs, dim=0),
+                max_batch_size=int(os.environ.get('CLIP_MAX_BATCH_SIZE', 16)),
+                max_wait_ms=float(os.environ.get('CLIP_MAX_WAIT_MS', 5))
+            )
+
+    def warmup(self, batch_size=None):
+        """
+        Load the model and run a dummy batch so the first real request does not
+        pay JIT and allocator warmup. Intended to run at worker boot.
+        """
+        self._ensure_loaded()
+        batch_size = batch_size or self.batcher.max_batch_size
+        resolution = self.model.visual.input_resolution
+        self._encode_batch(torch.zeros((batch_size, 3, resolution, resolution), device=self.device))
+        print(f"CLIP model warmed up with a batch of {batch_size}")
+
+    def start_background_warmup(self):
+        """
+        Run ``warmup`` on a daemon thread so the worker can answer health checks
+        meanwhile, retrying with exponential backoff until a forward pass succeeds.
+        Does nothing if the service is ready or a warmup thread is already running.
+        """
+        return self._background_warmup.start()
 
     def _process_image(self, image_data):
         """Helper function to process image data into CLIP format"""
+        self._ensure_loaded()
         if isinstance(image_data, str):
             # Handle base64 string
             if ',' in image_data:
@@ -21,11 +75,47 @@ class ClipVerificationService:
         else:
             # Handle direct bytes
             image_bytes = image_data
-        
+
         image = Image.open(io.BytesIO(image_bytes))
         image_input = self.preprocess(image).unsqueeze(0).to(self.device)
         return image_input, image.size
 
+    def _encode_batch(self, image_inputs):
+        """Run one forward pass over an (N, C, H, W) batch, returns N normalized float32 embeddings"""
+        with torch.no_grad():
+            features = self.model.encode_image(image_inputs)
+            features = features / features.norm(dim=-1, keepdim=True)
+        embeddings = features.float().cpu().numpy()
+        # Whichever pass succeeds first (warmup or a lazily served request) makes the worker ready
+        self.is_ready = True
+        return embeddings
+
+    def encode_image(self, image_data):
+        """
+        Encode an image into a normalized CLIP embedding
+        :param image_data: Image (base64 or bytes)
+        :return: 1-D float32 numpy array with unit norm
+        """
+        image_input, _ = self._process_image(image_data)
+        return self.batcher.submit(image_input).result()
+
+    def compare_embedding(self, image_data, stored_embedding):
+        """
+        Compare an image against a precomputed embedding, encoding only the image
+        :param image_data: Uploaded image (base64 or bytes)
+        :param stored_embedding: Normalized embedding produced by ``encode_image``
+        :return: Dictionary containing similarity score, same shape as ``compare_images``
+        """
+        try:
+            similarity = cosine_similarity(self.encode_image(image_data), stored_embedding)
+            print(f"CLIP similarity against stored embedding: {similarity:.4f}")
+            return {'success': True, 'similarity_score': similarity}
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
     def compare_images(self, image1_data, image2_data):
         """
         Compare two images using CLIP embeddings and cosine similarity
@@ -37,26 +127,19 @@ class ClipVerificationService:
             # Process both images
             image1_input, size1 = self._process_image(image1_data)
             image2_input, size2 = self._process_image(image2_data)
-            
-            # Get image embeddings
-            with torch.no_grad():
-                image1_features = self.model.encode_image(image1_input)
-                image2_features = self.model.encode_image(image2_input)
-                
-                # Normalize embeddings
-                image1_features = image1_features / image1_features.norm(dim=-1, keepdim=True)
-                image2_features = image2_features / image2_features.norm(dim=-1, keepdim=True)
-                
-                # Calculate cosine similarity
-                similarity = float((image1_features @ image2_features.T)[0][0])
-            
+
+            # Both images join the same (or a concurrent) batched forward pass
+            future1 = self.batcher.submit(image1_input)
+            future2 = self.batcher.submit(image2_input)
+            similarity = cosine_similarity(future1.result(), future2.result())
+
             # Print debug information
             print("\n=== CLIP Image Comparison Results ===")
             print(f"Image 1 size: {size1}")
             print(f"Image 2 size: {size2}")
             print(f"Similarity score: {similarity:.4f}")
             print("===================================\n")
-            
+
             return {
                 'success': True,
                 'similarity_score': similarity,
@@ -65,12 +148,12 @@ class ClipVerificationService:
                     'image2_size': size2
                 }
             }
-            
+
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e)
             }
 
-# Initialize the service (singleton)
+# Initialize the service (singleton, the model itself loads on first use)
 clip_service = ClipVerificationService()
@@ -0,0 +1,140 @@
+"""Credential PDF rendering.
+
+A PDF is a pure function of the fields returned by ``pdf_fields`` and of
+``TEMPLATE_VERSION``; ``cache_key`` hashes exactly those, so any edit to the
+credential (or to the template, via a version bump) produces a new key.
+Bump ``TEMPLATE_VERSION`` whenever the markup or stylesheet changes.
+
+``bench_pdf_render.py`` on one core (WeasyPrint 70, pango 1.44), median of
+5 rounds of 50 renders: 3.8 renders/s re-parsing the stylesheet and fonts
+per render, 4.0 renders/s with the shared ``TemplateRenderer`` (1.04x).
+Layout and PDF serialisation dominate, so the throughput gains for exports
+come from the PDF cache and the render pool, not from the renderer.
+"""
+import datetime
+import hashlib
+import json
+import os
+from html import escape
+
+from services.qr_codes import verification_qr_data_uri
+
+TEMPLATE_VERSION = '2'
+
+
+def _format_date(value, fmt='%B %d, %Y'):
+    return value.strftime(fmt) if isinstance(value, (datetime.date, datetime.datetime)) else None
+
+
+def pdf_fields(credential, recipient_name, verify_url):
+    """Collect every value that appears in the rendered PDF"""
+    return {
+        'title': credential.get('title', 'Blockchain Verified Credential'),
+        'issue_date': _format_date(credential.get('issue_date')),
+        'issuer_name': credential.get('issuer_name'),
+        'recipient_name': recipient_name,
+        'credential_type': credential.get('credential_type', 'Certificate'),
+        'expiry_date': _format_date(credential.get('expiry_date')),
+        'transaction_id': credential.get('transaction_hash') or credential.get('blockchain_tx_id', 'N/A'),
+        # A stored date, never "today", so an unchanged credential keeps its cache key: the on-chain
+        # confirmation time, or the issue date for credentials confirmed outright
+        'verification_date': _format_date(credential.get('confirmed_at') or credential.get('issue_date')),
+        'verify_url': verify_url,
+    }
+
+
+def cache_key(fields):
+    payload = json.dumps({'template': TEMPLATE_VERSION, 'fields': fields}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+STYLESHEET = """
+    body { font-family: Arial, sans-serif; margin: 40px; }
+    .header { text-align: center; margin-bottom: 30px; }
+    .credential-info { margin: 20px 0; }
+    .footer { text-align: center; margin-top: 30px; font-size: 12px; }
+    .qr-code { text-align: center; margin: 20px 0; }
+    .blockchain-info { background: #f5f5f5; padding: 15px; border-radius: 5px; }
+"""
+
+TEMPLATE = """
+<html>
+    <body>
+        <div class="header">
+            <h1>{title}</h1>
+            <p>Issued on: {issue_date}</p>
+        </div>
+
+        <div class="credential-info">
+            <h2>Credential Details</h2>
+            <p><strong>Issuer:</strong> {issuer_name}</p>
+            <p><strong>Recipient:</strong> {recipient_name}</p>
+            <p><strong>Type:</strong> {credential_type}</p>
+            {expiry}
+        </div>
+
+        <div class="blockchain-info">
+            <h3>Blockchain Verification</h3>
+            <p>This credential has been verified and stored on the blockchain.</p>
+            <p><strong>Transaction ID:</strong> {transaction_id}</p>
+            <p><strong>Verification Date:</strong> {verification_date}</p>
+        </div>
+
+        <div class="qr-code">
+            <img src="{qr_code}" width="150" height="150">
+            <p>Scan to verify this credential</p>
+        </div>
+
+        <div class="footer">
+            <p>This is an official credential issued through the BlockCreds platform.</p>
+            <p>Verify this credential at: {verify_url}</p>
+        </div>
+    </body>
+</html>
+"""
+
+
+class TemplateRenderer:
+    """
+    Renders the credential template with a font configuration and stylesheet
+    that are built once and reused, so each render only lays out the
+    per-credential markup
+    """
+
+    def __init__(self):
+        # Imported here, not at module level: WeasyPrint loads pango when imported,
+        # and only the processes that render need it
+        from weasyprint import CSS, HTML
+        from weasyprint.text.fonts import FontConfiguration
+
+        self._html = HTML
+        self.font_config = FontConfiguration()
+        self.stylesheet = CSS(string=STYLESHEET, font_config=self.font_config)
+
+    def render(self, fields):
+        html = self._html(string=render_html(fields))
+        return html.write_pdf(stylesheets=[self.stylesheet], font_config=self.font_config)
+
+
+_renderer = None
+_renderer_pid = None
+
+
+def get_renderer():
+    """The renderer of the current process, rebuilt after a fork so workers never share font state"""
+    global _renderer, _renderer_pid
+    if _renderer is None or _renderer_pid != os.getpid():
+        _renderer, _renderer_pid = TemplateRenderer(), os.getpid()
+    return _renderer
+
+
+def render_html(fields):
+    f = {k: escape(str(v)) if v is not None else '' for k, v in fields.items()}
+    f['expiry'] = f"<p><strong>Expiry:</strong> {f['expiry_date']}</p>" if fields.get('expiry_date') else ''
+    f['qr_code'] = verification_qr_data_uri(fields['verify_url'])
+    return TEMPLATE.format(**f)
+
+
+def render_pdf(fields):
+    """Render the credential PDF and return its bytes"""
+    return get_renderer().render(fields)
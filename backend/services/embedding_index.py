@@ -0,0 +1,259 @@
+"""In-memory nearest-neighbour index over credential image embeddings.
+
+Embeddings are unit vectors, so cosine similarity against every stored
+credential is a single matrix-vector product. That exact scan reads the whole
+float32 matrix on every query and is bound by memory bandwidth: ~40 ms at
+200k ViT-B/32 rows but ~165 ms at 1M (~2 GB) on one core.
+
+From ``IVF_MIN_ROWS`` rows on, the index adds an inverted-file (IVF) layer:
+spherical k-means centroids over a sample of the rows, and the list (nearest
+centroid) of every row. A query scores the centroids, keeps the ``nprobe``
+closest lists and scores only their rows exactly, so it reads
+``nprobe / nlist`` of the matrix. A scan of a stored credential lands next
+to its own embedding, so the list holding it is among the probed ones. The
+centroids are trained in a background thread and retrained whenever the
+index has doubled since; searches use the exact scan until they are ready.
+
+``bench_embedding_index.py`` on one core (OpenBLAS), 1M x 512 rows, queries
+being perturbed stored embeddings: exact p50 165 ms / p95 205 ms; IVF with
+1000 lists and nprobe 32 p50 31 ms / p95 39 ms, best match identical to the
+exact scan for 100% of queries on clustered data (99.5% on random vectors).
+Training took ~17 s in the background.
+
+Searches score the matrix outside the lock and only retry if a write landed
+meanwhile, so a slow query never blocks issuance or other lookups.
+Rows are kept dense: removing a credential moves the last row into its slot.
+"""
+import threading
+
+import numpy as np
+
+from services.embeddings import EMBEDDING_DTYPE, from_binary, normalize
+
+
+def _kmeans(sample, nlist, iterations, rng):
+    """Spherical k-means over unit rows: rows join the centroid with the largest dot product"""
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(labels, kind='stable')
+        ordered = labels[order]
+        starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Empty lists keep their previous centroid
+        centroids[ordered[starts]] = sums / np.where(norms > 0, norms, 1)
+    return centroids
+
+
+def _nearest(rows, centroids, chunk=65536):
+    """List of each row, computed in chunks so the score matrix stays small"""
+    labels = np.empty(len(rows), dtype=np.int32)
+    for start in range(0, len(rows), chunk):
+        labels[start:start + chunk] = np.argmax(rows[start:start + chunk] @ centroids.T, axis=1)
+    return labels
+
+
+class EmbeddingIndex:
+    OPTIMISTIC_ATTEMPTS = 3
+    # Below this the exact scan is fast enough and k-means is not worth training
+    IVF_MIN_ROWS = 100000
+    # k-means is trained on this many sampled rows per list
+    IVF_SAMPLE_PER_LIST = 64
+    IVF_ITERATIONS = 10
+
+    def __init__(self, dim=512, initial_capacity=1024, nprobe=32, auto_train=True):
+        """
+        :param nprobe: Lists scored per query once the IVF layer is trained
+        :param auto_train: Train the IVF layer in the background as the index grows;
+            without it only an explicit ``train()`` builds it
+        """
+        self.dim = dim
+        self.nprobe = nprobe
+        self.auto_train = auto_train
+        self._matrix = np.zeros((initial_capacity, dim), dtype=EMBEDDING_DTYPE)
+        self._ids = []
+        self._positions = {}
+        self._lock = threading.Lock()
+        # Bumped by every write, so a search scoring rows outside the lock can tell it raced one
+        self._version = 0
+        # IVF layer: unit centroids and the list of every row, None until trained
+        self._centroids = None
+        self._lists = np.zeros(initial_capacity, dtype=np.int32)
+        self._trained_rows = 0
+        self._training = False
+        # Rows written while a training pass runs, re-listed when it installs its centroids
+        self._dirty = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def nlist(self):
+        """Number of IVF lists, 0 while searches use the exact scan"""
+        centroids = self._centroids
+        return 0 if centroids is None else len(centroids)
+
+    def load(self, db, model_name, batch_size=5000):
+        """
+        (Re)build the index from every credential embedded with ``model_name``
+        :return: Number of embeddings loaded
+        """
+        cursor = db.credentials.find(
+            {'image_embedding': {'$exists': True}, 'image_embedding_model': model_name},
+            {'image_embedding': 1}
+        ).batch_size(batch_size)
+        with self._lock:
+            self._version += 1
+            self._ids = []
+            self._positions = {}
+            for doc in cursor:
+                self._add(str(doc['_id']), from_binary(doc['image_embedding']))
+            self._trained_rows = 0
+            self._maybe_train()
+        return len(self._ids)
+
+    def add(self, credential_id, embedding):
+        """Insert or replace the embedding for ``credential_id``"""
+        with self._lock:
+            self._add(str(credential_id), normalize(embedding))
+            self._maybe_train()
+
+    def remove(self, credential_id):
+        with self._lock:
+            credential_id = str(credential_id)
+            row = self._positions.pop(credential_id, None)
+            if row is None:
+                return
+            self._version += 1
+            last = len(self._ids) - 1
+            if row != last:
+                moved_id = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._lists[row] = self._lists[last]
+                self._ids[row] = moved_id
+                self._positions[moved_id] = row
+                if self._dirty is not None:
+                    self._dirty.add(row)
+            self._ids.pop()
+
+    def search(self, embedding, top_k=5):
+        """
+        Find the credentials whose embeddings are most similar to ``embedding``
+        :return: List of ``(credential_id, similarity)`` sorted by similarity, best first
+        """
+        query = normalize(embedding)
+        for _ in range(self.OPTIMISTIC_ATTEMPTS):
+            with self._lock:
+                count, matrix, version = len(self._ids), self._matrix, self._version
+                centroids, lists = self._centroids, self._lists
+            if count == 0:
+                return []
+            # Scoring reads many rows, so it runs without blocking writers or other searches
+            rows = self._candidates(centroids, lists, count, query, top_k)
+            top, scores = self._top(matrix, count, query, top_k, rows)
+            with self._lock:
+                if version == self._version:
+                    return [(self._ids[i], float(score)) for i, score in zip(top, scores)]
+        # Writes kept landing mid-search, score under the lock instead
+        with self._lock:
+            count = len(self._ids)
+            if count == 0:
+                return []
+            rows = self._candidates(self._centroids, self._lists, count, query, top_k)
+            top, scores = self._top(self._matrix, count, query, top_k, rows)
+            return [(self._ids[i], float(score)) for i, score in zip(top, scores)]
+
+    def train(self, nlist=None):
+        """
+        Build the IVF layer from the current rows. k-means and the listing of the
+        rows run outside the lock; rows written meanwhile are re-listed on install.
+        :param nlist: Number of lists, ``sqrt(rows)`` by default
+        :return: Number of lists, or 0 if the index is below ``IVF_MIN_ROWS``
+        """
+        with self._lock:
+            count, matrix = len(self._ids), self._matrix
+            if count < self.IVF_MIN_ROWS:
+                self._training = False
+                return 0
+            self._training = True
+            self._dirty = set()
+        try:
+            nlist = min(nlist or int(np.sqrt(count)), count)
+            rng = np.random.default_rng()
+            sample = matrix[np.sort(rng.choice(count, min(count, nlist * self.IVF_SAMPLE_PER_LIST), replace=False))]
+            centroids = _kmeans(sample, nlist, self.IVF_ITERATIONS, rng)
+            lists = _nearest(matrix[:count], centroids)
+        except Exception:
+            with self._lock:
+                self._training, self._dirty = False, None
+            raise
+
+        with self._lock:
+            current = len(self._ids)
+            installed = np.zeros(len(self._matrix), dtype=np.int32)
+            installed[:min(count, current)] = lists[:current]
+            stale = sorted({row for row in self._dirty if row < current} | set(range(count, current)))
+            if stale:
+                installed[stale] = _nearest(self._matrix[stale], centroids)
+            self._version += 1
+            self._centroids, self._lists = centroids, installed
+            self._trained_rows = current
+            self._training, self._dirty = False, None
+        return nlist
+
+    def _maybe_train(self):
+        """Start a background training pass once the index is large enough, or has doubled. Caller must hold the lock."""
+        count = len(self._ids)
+        if not self.auto_train or self._training or count < self.IVF_MIN_ROWS or count < 2 * self._trained_rows:
+            return
+        self._training = True
+        threading.Thread(target=self._train_in_background, name='embedding-index-train', daemon=True).start()
+
+    def _train_in_background(self):
+        try:
+            print(f"🧭 Trained {self.train()} embedding index lists over {len(self)} rows")
+        except Exception as e:
+            print(f"⚠️ Embedding index training failed: {e}")
+
+    def _candidates(self, centroids, lists, count, query, top_k):
+        """Rows in the ``nprobe`` lists closest to ``query``, or None to scan every row"""
+        if centroids is None or count < self.IVF_MIN_ROWS:
+            return None
+        nprobe = min(self.nprobe, len(centroids))
+        probed = np.zeros(len(centroids), dtype=bool)
+        probed[np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]] = True
+        rows = np.flatnonzero(probed[lists[:count]])
+        return rows if len(rows) >= top_k else None
+
+    @staticmethod
+    def _top(matrix, count, query, top_k, rows=None):
+        """Positions of the ``top_k`` best scoring rows (among ``rows`` if given), best first, and their scores"""
+        scores = (matrix[:count] if rows is None else matrix[rows]) @ query
+        top_k = min(top_k, len(scores))
+        # argpartition is O(n); only the k winners get sorted
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return (top if rows is None else rows[top]), scores[top]
+
+    def _add(self, credential_id, embedding):
+        """Caller must hold the lock."""
+        self._version += 1
+        row = self._positions.get(credential_id)
+        if row is None:
+            row = len(self._ids)
+            if row == len(self._matrix):
+                capacity = max(1, len(self._matrix)) * 2
+                grown = np.zeros((capacity, self.dim), dtype=EMBEDDING_DTYPE)
+                grown[:row] = self._matrix
+                self._matrix = grown
+                lists = np.zeros(capacity, dtype=np.int32)
+                lists[:row] = self._lists[:row]
+                self._lists = lists
+            self._ids.append(credential_id)
+            self._positions[credential_id] = row
+        self._matrix[row] = embedding
+        if self._centroids is not None:
+            self._lists[row] = int(np.argmax(self._centroids @ embedding))
+        if self._dirty is not None:
+            self._dirty.add(row)
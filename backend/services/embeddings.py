@@ -0,0 +1,31 @@
+"""Storage helpers for CLIP image embeddings.
+
+Embeddings are L2-normalized float32 vectors persisted on the credential as a
+BSON binary blob (2 KB for ViT-B/32), so cosine similarity is a plain dot
+product and nothing has to be re-encoded at verification time.
+"""
+import numpy as np
+from bson.binary import Binary
+
+EMBEDDING_DTYPE = np.float32
+
+
+def normalize(vector):
+    vector = np.asarray(vector, dtype=EMBEDDING_DTYPE).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def to_binary(vector):
+    """Serialize an embedding for storage in a credential document"""
+    return Binary(normalize(vector).tobytes())
+
+
+def from_binary(data):
+    """Deserialize an embedding stored with ``to_binary``"""
+    return np.frombuffer(bytes(data), dtype=EMBEDDING_DTYPE)
+
+
+def cosine_similarity(a, b):
+    """Cosine similarity of two already-normalized embeddings"""
+    return float(np.dot(a, b))
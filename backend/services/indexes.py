@@ -0,0 +1,128 @@
+"""Index declarations for the hot collections and a query-plan guard.
+
+``ensure_indexes`` runs at startup and creates every index in ``INDEXES``
+(``create_indexes`` is a no-op for indexes that already exist).
+``find_collscans`` runs ``explain()`` on a representative query for each
+route in ``ROUTE_QUERIES`` and reports the ones whose winning plan contains a
+COLLSCAN stage; ``assert_no_collscans`` wraps it for tests and CI:
+
+    python -m services.indexes    # from the backend directory
+
+``tests/test_indexes.py`` runs the same check against the MongoDB server at
+``MONGO_TEST_URI`` (default ``localhost:27017``) and skips when none is
+reachable, since mongomock cannot ``explain()``.
+"""
+import datetime
+import os
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from services.chain_indexer import CHAIN_INDEXES
+from services.pdf_jobs import PDF_JOB_INDEXES
+from services.search import SEARCH_INDEXES
+
+INDEXES = {
+    'credentials': [
+        IndexModel([('verification_code', ASCENDING)], name='verification_code'),
+        # _id completes the keyset pagination sort so pages never need an in-memory sort
+        IndexModel([('recipient_id', ASCENDING), ('issue_date', DESCENDING), ('_id', DESCENDING)],
+                   name='recipient_issue_date_id'),
+        IndexModel([('issuer_id', ASCENDING), ('issue_date', DESCENDING), ('_id', DESCENDING)],
+                   name='issuer_issue_date_id'),
+        IndexModel([('image_ref', ASCENDING)], name='image_ref', sparse=True),
+        # Only pending credentials are indexed, so the confirmer's poll stays cheap however many are confirmed
+        IndexModel([('chain_status', ASCENDING), ('next_check_at', ASCENDING)], name='chain_pending_next_check',
+                   partialFilterExpression={'chain_status': 'pending_chain'}),
+        *SEARCH_INDEXES,
+    ],
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email', unique=True),
+    ],
+    'notifications': [
+        IndexModel([('user_id', ASCENDING)], name='user_id'),
+    ],
+    'verifications': [
+        IndexModel([('recipient_id', ASCENDING), ('created_at', DESCENDING)], name='recipient_created_at'),
+        IndexModel([('verification_code', ASCENDING)], name='verification_code'),
+    ],
+    **CHAIN_INDEXES,
+    **PDF_JOB_INDEXES,
+}
+
+_sample_id = ObjectId()
+_sample_time = datetime.datetime(2024, 1, 1)
+
+# (route, collection, filter, sort) for the filtered queries issued on hot paths
+ROUTE_QUERIES = [
+    ('POST /api/verify', 'credentials', {'verification_code': {'$in': ['abc', '0xabc']}}, None),
+    ('GET /api/credentials', 'credentials',
+     {'$or': [{'recipient_id': _sample_id}, {'issuer_id': _sample_id}]},
+     [('issue_date', DESCENDING), ('_id', DESCENDING)]),
+    ('GET /api/issuer/credentials', 'credentials', {'issuer_id': _sample_id},
+     [('issue_date', DESCENDING), ('_id', DESCENDING)]),
+    ('DELETE /api/admin/users/<id>', 'credentials', {'recipient_id': _sample_id}, None),
+    ('DELETE /api/credentials/<id>', 'credentials', {'image_ref': 'sample'}, None),
+    ('GET /api/search', 'credentials', {'$text': {'$search': 'diploma'}}, None),
+    ('GET /api/search/suggest', 'credentials', {'search_terms': {'$regex': '^dip'}}, None),
+    ('chain confirmer', 'credentials', {'chain_status': 'pending_chain', 'next_check_at': {'$not': {'$gt': _sample_time}}},
+     [('next_check_at', ASCENDING)]),
+    ('chain mirror lookup', 'chain_credentials', {'verification_code': {'$in': ['0xabc']}}, None),
+    ('POST /api/login', 'users', {'email': 'sample@example.com'}, None),
+]
+
+
+def ensure_indexes(db):
+    """Create every declared index, logging (not raising) on failure so the API still boots"""
+    for collection, models in INDEXES.items():
+        try:
+            created = db[collection].create_indexes(models)
+            print(f"✅ Indexes ensured on {collection}: {', '.join(created)}")
+        except Exception as e:
+            print(f"⚠️ Failed to ensure indexes on {collection}: {e}")
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def find_collscans(db, queries=ROUTE_QUERIES):
+    """
+    Explain each route query and collect the ones that scan a whole collection
+    :return: List of ``(route, collection, winning_plan)`` tuples
+    """
+    offenders = []
+    for route, collection, query, sort in queries:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain()['queryPlanner']['winningPlan']
+        if 'COLLSCAN' in _plan_stages(winning_plan):
+            offenders.append((route, collection, winning_plan))
+    return offenders
+
+
+def assert_no_collscans(db, queries=ROUTE_QUERIES):
+    offenders = find_collscans(db, queries)
+    if offenders:
+        routes = ', '.join(f"{route} ({collection})" for route, collection, _ in offenders)
+        raise AssertionError(f"Queries fall back to COLLSCAN: {routes}")
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    database = MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017/blockcreds_db')).get_default_database()
+    ensure_indexes(database)
+    assert_no_collscans(database)
+    print("✅ No route query uses a collection scan")
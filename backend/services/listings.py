@@ -0,0 +1,110 @@
+"""Read paths of the credential listing endpoints.
+
+Each listing fetches one keyset page of credentials and resolves every user
+the page references with a single ``$in`` query, so a page costs one
+credentials query plus one users query however many rows it holds. The
+routes only parse the page arguments and wrap these rows in JSON, which
+lets the tests count the commands of the code the endpoints actually run.
+"""
+from services.chain_confirmer import CONFIRMED as CHAIN_CONFIRMED
+from services.pagination import keyset_page
+from services.serialization import json_serialize
+from services.user_lookup import resolve_credential_users
+
+# Sort keys for keyset pagination; both match a declared compound index
+NEWEST_FIRST = [('issue_date', -1), ('_id', -1)]
+BY_ID_DESC = [('_id', -1)]
+
+
+def _format_date(value):
+    return value.strftime('%Y-%m-%d') if value else None
+
+
+def user_credentials(db, user_id, limit, cursor=None, verify_many=None):
+    """
+    One page of the credentials a user holds or issued, for ``GET /api/credentials``
+    :param verify_many: Optional callable mapping a list of verification codes to
+        ``verifyCredential`` results, asked once for the whole page
+    :return: Tuple of ``(rows, next_cursor)``
+    """
+    query = {'$or': [{'recipient_id': user_id}, {'issuer_id': user_id}]}
+    credentials, next_cursor = keyset_page(db.credentials, query, NEWEST_FIRST, limit, cursor)
+    users = resolve_credential_users(db, credentials, keys=('issuer_id',))
+
+    # One mirror/batch lookup for the whole page instead of an eth_call per credential
+    chain_results = {}
+    if verify_many:
+        try:
+            chain_results = verify_many([
+                c['verification_code'] for c in credentials if c.get('transaction_hash') and c.get('verification_code')
+            ])
+        except Exception as e:
+            print(f"Blockchain verification failed for credential listing: {e}")
+
+    rows = []
+    for credential in credentials:
+        try:
+            issuer_id = credential.get('issuer_id')
+            issuer = users.get(issuer_id)
+
+            chain_result = chain_results.get(credential.get('verification_code'))
+            if chain_result is not None and credential.get('transaction_hash'):
+                is_verified = chain_result[0]
+            else:
+                is_verified = credential.get('is_verified', False)
+
+            rows.append({
+                '_id': str(credential['_id']),
+                'title': credential.get('title', 'Untitled'),
+                'issuer_name': issuer.get('username', 'Unknown Issuer') if issuer else 'Unknown Issuer',
+                'issuer_id': str(issuer_id) if issuer_id else None,
+                'recipient_id': str(credential.get('recipient_id')),
+                'issue_date': _format_date(credential.get('issue_date')),
+                'is_verified': bool(is_verified),
+                'chain_status': credential.get('chain_status', CHAIN_CONFIRMED),
+                'credential_type': credential.get('credential_type', 'General'),
+                'transaction_hash': credential.get('transaction_hash'),
+                'metadata': json_serialize(credential.get('credential_data', {}))
+            })
+        except Exception as e:
+            print(f"Error processing credential {credential.get('_id')}: {str(e)}")
+            continue
+    return rows, next_cursor
+
+
+def issued_credentials(db, issuer_id, limit, cursor=None):
+    """
+    One page of the credentials issued by ``issuer_id``, for ``GET /api/issuer/credentials``
+    :return: Tuple of ``(rows, next_cursor)``
+    """
+    credentials, next_cursor = keyset_page(db.credentials, {'issuer_id': issuer_id}, NEWEST_FIRST, limit, cursor)
+    users = resolve_credential_users(db, credentials, keys=('recipient_id',))
+    rows = []
+    for cred in credentials:
+        recipient = users.get(cred['recipient_id'])
+        rows.append({
+            '_id': str(cred['_id']),
+            'title': cred['title'],
+            'recipient': recipient['email'] if recipient else 'Unknown',
+            'issue_date': _format_date(cred['issue_date']),
+            'status': cred.get('status', 'active')
+        })
+    return rows, next_cursor
+
+
+def all_credentials(db, limit, cursor=None):
+    """
+    One page of every credential, for ``GET /api/admin/credentials``
+    :return: Tuple of ``(rows, next_cursor)``
+    """
+    credentials, next_cursor = keyset_page(
+        db.credentials, {}, BY_ID_DESC, limit, cursor, {'image_embedding': 0, 'image': 0}
+    )
+    users = resolve_credential_users(db, credentials, keys=('recipient_id',))
+    for cred in credentials:
+        owner = users.get(cred.get('recipient_id'))
+        cred['_id'] = str(cred['_id'])
+        cred['recipient_id'] = str(cred.get('recipient_id'))
+        cred['issuer_id'] = str(cred.get('issuer_id'))
+        cred['owner'] = owner.get('username', 'Unknown') if owner else 'Unknown'
+    return credentials, next_cursor
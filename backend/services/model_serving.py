@@ -0,0 +1,105 @@
+"""Request batching and background warmup for the image model.
+
+Nothing here imports torch: the batcher is handed the function that runs a
+forward pass (and the one that stacks inputs into a batch), and the warmup
+the function that loads and exercises the model. ``clip_verification`` wires
+them to CLIP; tests drive them with fake encoders.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class EncodeBatcher:
+    """
+    Coalesces concurrent encode requests into batched forward passes.
+    The first request of a batch waits at most ``max_wait_ms`` for others to
+    join, so a lone request pays a few milliseconds while concurrent load is
+    served ``max_batch_size`` images per forward pass.
+    """
+
+    def __init__(self, encode_batch, stack=list, max_batch_size=16, max_wait_ms=5):
+        """
+        :param encode_batch: Runs one forward pass over a stacked batch, returns one row per input
+        :param stack: Combines the list of submitted inputs into the batch ``encode_batch`` takes
+        """
+        self.encode_batch = encode_batch
+        self.stack = stack
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='clip-encode-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, model_input):
+        """Queue one input, returns a Future resolving to its row of the batch output"""
+        future = Future()
+        self._queue.put((model_input, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            inputs = [item[0] for item in batch]
+            futures = [item[1] for item in batch]
+            try:
+                features = self.encode_batch(self.stack(inputs))
+                for future, row in zip(futures, features):
+                    future.set_result(row)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+
+
+class BackgroundWarmup:
+    """
+    Runs ``warmup`` on a daemon thread, retrying with exponential backoff
+    until ``is_ready()`` turns true, so the worker answers health checks
+    while the model loads and a failed load does not leave it unready forever.
+    """
+
+    def __init__(self, warmup, is_ready, retry_delay=5.0, max_retry_delay=300.0):
+        self.warmup = warmup
+        self.is_ready = is_ready
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """
+        Start the warmup thread, unless the model is ready or a warmup is already running
+        :return: The running warmup thread, or ``None`` when already ready
+        """
+        with self._lock:
+            if self.is_ready():
+                return None
+            if self._thread and self._thread.is_alive():
+                return self._thread
+            self._thread = threading.Thread(target=self._run, name='clip-warmup', daemon=True)
+            self._thread.start()
+            return self._thread
+
+    def _run(self):
+        delay = self.retry_delay
+        while not self.is_ready():
+            try:
+                self.warmup()
+            except Exception as e:
+                print(f"⚠️ CLIP warmup failed, retrying in {delay:.0f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
@@ -0,0 +1,75 @@
+"""Keyset (cursor) pagination for listing endpoints.
+
+Instead of ``skip``/``limit`` (which re-reads every skipped document) each
+page continues from the sort key of the previous page's last document, so
+fetching page N costs the same as fetching page 1. The sort key always ends
+with ``_id`` to make it unique, and the continuation token handed to clients
+is an opaque base64 encoding of that key.
+"""
+import base64
+
+from bson import json_util
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    """Decode a continuation token, raising ``ValueError`` if it was tampered with or truncated"""
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid pagination cursor') from None
+    if not isinstance(values, list):
+        raise ValueError('Invalid pagination cursor')
+    return values
+
+
+def parse_page_args(args, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """
+    Read ``limit`` and ``cursor`` from request args
+    :return: Tuple of ``(limit, cursor_token)``; raises ``ValueError`` on a malformed limit
+    """
+    try:
+        limit = int(args.get('limit', default))
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer') from None
+    return max(1, min(limit, maximum)), args.get('cursor') or None
+
+
+def _after(sort, values):
+    """Build the filter selecting documents strictly after ``values`` in ``sort`` order"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        clause[field] = {'$lt' if direction < 0 else '$gt': values[i]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {'$or': clauses}
+
+
+def keyset_page(collection, query, sort, limit, cursor=None, projection=None):
+    """
+    Fetch one page of ``collection``
+    :param query: Base filter
+    :param sort: List of ``(field, direction)`` ending with ``('_id', direction)``
+    :param limit: Page size
+    :param cursor: Continuation token returned with the previous page
+    :return: Tuple of ``(documents, next_cursor)``; ``next_cursor`` is ``None`` on the last page
+    """
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(sort):
+            raise ValueError('Invalid pagination cursor')
+        query = {'$and': [query, _after(sort, values)]} if query else _after(sort, values)
+
+    documents = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor([last.get(field) for field, _ in sort])
+    return documents, next_cursor
@@ -0,0 +1,168 @@
+"""Bulk credential PDF export as a streamed ZIP.
+
+WeasyPrint is CPU-bound and holds the GIL, so renders run in a shared
+process pool. ``stream_pdf_zip`` keeps at most ``max_workers * 2`` renders
+in flight and writes each PDF into the archive as soon as it finishes. The
+archive is written to an unseekable sink (``ZipFile`` then emits data
+descriptors instead of seeking back), and every chunk is yielded to the
+client right away, so neither the archive nor the batch is ever held in
+memory. PDFs already in the ``PdfCache`` skip the pool entirely.
+
+The pool forks its workers, which is only safe while the parent has no other
+threads (a lock held by another thread at fork time stays locked forever in
+the child). By default the pool is created on the first export, with the
+app's threads already running; ``start_render_pool`` forks it eagerly
+instead, and app.py calls it before any background thread starts when
+``PDF_RENDER_PREFORK`` is set. If a worker dies (OOM, a crash inside
+WeasyPrint) the pool is broken for good: ``discard_pool`` drops it, renders
+that were in flight are resubmitted once, and the next submit forks a new
+pool. A late fork is still safe in practice because the children only run
+``render_pdf``, which takes none of the locks those threads use (Mongo
+client, web3 session, the verification log buffer, the CLIP batcher queue).
+"""
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+from services.credential_pdf import cache_key, get_renderer, render_pdf
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render_pool(max_workers=None):
+    """Process pool shared by bulk exports and export jobs, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Fork, not spawn: app.py connects to Mongo and the chain at import time,
+            # and spawned workers would re-import it as their __main__
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count(),
+                mp_context=context,
+                initializer=get_renderer  # build fonts and stylesheet once per worker, before the first job
+            )
+        return _pool
+
+
+def start_render_pool(max_workers=None):
+    """Create the pool and fork all of its workers now, while the process has no other threads"""
+    pool = render_pool(max_workers)
+    try:
+        # With the fork start method every worker is forked on the first submit
+        pool.submit(os.getpid).result()
+    except BrokenProcessPool:
+        discard_pool(pool)
+        raise
+
+
+def discard_pool(pool):
+    """Forget a broken pool so the next ``render_pool`` call creates a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def submit_render(fields, max_workers=None):
+    """
+    Submit ``render_pdf(fields)`` to the shared pool, replacing the pool if it is broken
+    :return: Tuple of ``(pool, future)``; pass ``pool`` to ``discard_pool`` if the future
+        fails with ``BrokenProcessPool``
+    """
+    pool = render_pool(max_workers)
+    try:
+        return pool, pool.submit(render_pdf, fields)
+    except BrokenProcessPool:
+        discard_pool(pool)
+        pool = render_pool(max_workers)
+        return pool, pool.submit(render_pdf, fields)
+
+
+class _ChunkSink:
+    """Write-only file object that collects what ``ZipFile`` writes until it is drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_pdf_zip(entries, pdf_cache, max_workers=None):
+    """
+    Render credential PDFs in parallel and stream them as a ZIP archive
+    :param entries: Iterable of ``(filename, fields)`` pairs, ``fields`` as returned by ``pdf_fields``
+    :param pdf_cache: ``PdfCache`` consulted before rendering and filled with new renders
+    :param max_workers: Size of the render pool (defaults to the CPU count)
+    :return: Generator of ZIP bytes; failed renders are listed in ``errors.txt`` at the end
+    """
+    max_workers = max_workers or os.cpu_count()
+    sink = _ChunkSink()
+    pending = iter(entries)
+    in_flight = {}
+    errors = []
+
+    def submit(filename, fields, key, retried=False):
+        pool, future = submit_render(fields, max_workers)
+        in_flight[future] = (filename, fields, key, pool, retried)
+
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        try:
+            while True:
+                # Top up the pool, writing cache hits straight into the archive
+                for filename, fields in pending:
+                    key = cache_key(fields)
+                    cached = pdf_cache.get(key)
+                    if cached:
+                        archive.writestr(filename, cached)
+                        yield sink.drain()
+                    else:
+                        submit(filename, fields, key)
+                    if len(in_flight) >= max_workers * 2:
+                        break
+                if not in_flight:
+                    break
+
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    filename, fields, key, pool, retried = in_flight.pop(future)
+                    try:
+                        pdf_bytes = future.result()
+                    except BrokenProcessPool as e:
+                        # A worker died and took every in-flight render with it; retry each once on a new pool
+                        discard_pool(pool)
+                        if retried:
+                            errors.append(f'{filename}: {e}')
+                        else:
+                            submit(filename, fields, key, retried=True)
+                        continue
+                    except Exception as e:
+                        errors.append(f'{filename}: {e}')
+                        continue
+                    pdf_cache.put(key, pdf_bytes)
+                    archive.writestr(filename, pdf_bytes)
+                    yield sink.drain()
+        finally:
+            # Also runs when the client disconnects: drop queued renders, the pool itself stays up
+            for future in in_flight:
+                future.cancel()
+
+        if errors:
+            archive.writestr('errors.txt', '\n'.join(errors) + '\n')
+    yield sink.drain()
@@ -0,0 +1,78 @@
+"""On-disk LRU cache for rendered PDFs.
+
+Entries are files named by their content key. Reads bump the file's mtime,
+and writes evict the least recently used files once the directory grows past
+``max_bytes``. Writes go through a temp file and ``os.replace`` so concurrent
+readers (including other worker processes sharing the directory) never see a
+partial PDF. ``get`` returns the bytes rather than the path: another request
+(or process) may evict the file at any moment, so a path handed to the caller
+could already be gone when it opens it.
+"""
+import os
+import tempfile
+import threading
+
+
+class PdfCache:
+    def __init__(self, root, max_bytes=512 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = sum(entry.stat().st_size for entry in os.scandir(root) if entry.name.endswith('.pdf'))
+
+    def _path(self, key):
+        return os.path.join(self.root, f'{key}.pdf')
+
+    def get(self, key):
+        """Return the cached PDF bytes for ``key`` or ``None``"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                pdf_bytes = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # evicted right after the read, the bytes are still good
+        return pdf_bytes
+
+    def put(self, key, pdf_bytes):
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf_bytes)
+        existed = os.path.exists(path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if not existed:
+                self._size += len(pdf_bytes)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def get_or_render(self, key, render):
+        """Return the cached PDF bytes for ``key``, rendering (and caching) them with ``render()`` on a miss"""
+        pdf_bytes = self.get(key)
+        if pdf_bytes is None:
+            pdf_bytes = render()
+            self.put(key, pdf_bytes)
+        return pdf_bytes
+
+    def _evict(self):
+        """Delete least recently used entries until under budget. Caller must hold the lock."""
+        entries = sorted(
+            (entry for entry in os.scandir(self.root) if entry.name.endswith('.pdf')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        self._size = sum(entry.stat().st_size for entry in entries)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._size <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except FileNotFoundError:
+                pass
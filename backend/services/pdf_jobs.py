@@ -0,0 +1,192 @@
+"""Asynchronous credential PDF export jobs.
+
+``submit`` returns immediately with a job id. The render itself runs in the
+shared render process pool, so web workers never wait on WeasyPrint. At
+most ``max_pending`` renders may be queued or running per process; past that
+``submit`` raises ``QueueFull`` and the caller tells the client to retry
+later instead of letting the backlog (and its latency) grow without bound.
+
+Jobs are documents in the ``pdf_jobs`` collection and a finished job keeps
+its PDF in the document, so a status poll or download can reach any app
+process, not only the one that accepted the job. (A single credential PDF is
+tens of kilobytes, far below the document size limit.) A TTL index drops
+jobs, PDF included, ``job_ttl`` seconds after they finish. A job whose
+process died mid-render is reported failed once it is ``render_timeout``
+seconds old.
+
+Jobs for a PDF that is already cached complete on submit, and identical
+requests in flight in the same process share one render. Long polls wake up
+as soon as a render of this process finishes, and re-read the job every
+``poll_interval`` seconds otherwise.
+"""
+import datetime
+import threading
+import time
+import uuid
+
+from bson.binary import Binary
+from concurrent.futures.process import BrokenProcessPool
+from pymongo import ASCENDING, IndexModel
+
+from services.credential_pdf import cache_key
+from services.pdf_bulk import discard_pool, submit_render
+
+JOBS = 'pdf_jobs'
+
+QUEUED = 'queued'
+DONE = 'done'
+FAILED = 'failed'
+
+PDF_JOB_INDEXES = {
+    JOBS: [
+        IndexModel([('expires_at', ASCENDING)], name='expires_at', expireAfterSeconds=0),
+    ],
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class PdfJobQueue:
+    def __init__(self, db, pdf_cache, max_workers=None, max_pending=64, job_ttl=600, render_timeout=300,
+                 poll_interval=0.5):
+        self.db = db
+        self.pdf_cache = pdf_cache
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self.render_timeout = render_timeout
+        self.poll_interval = poll_interval
+        self._renders = {}  # cache key -> ids of the jobs waiting on that render in this process
+        self._changed = threading.Condition()
+
+    def submit(self, fields, owner_id, filename):
+        """
+        Queue a render of ``fields``
+        :param owner_id: User allowed to poll and download the job
+        :param filename: Download name of the artifact
+        :return: Job dictionary (see ``get``)
+        :raises QueueFull: When ``max_pending`` renders are already queued or running
+        """
+        key = cache_key(fields)
+        now = datetime.datetime.utcnow()
+        job = {
+            '_id': uuid.uuid4().hex,
+            'owner_id': owner_id,
+            'filename': filename,
+            'key': key,
+            'status': QUEUED,
+            'error': None,
+            'created_at': now,
+            'finished_at': None,
+            # Refreshed when the job finishes; this one only cleans up after a process that died mid-render
+            'expires_at': now + datetime.timedelta(seconds=self.render_timeout + self.job_ttl),
+        }
+        cached = self.pdf_cache.get(key)
+        if cached is not None:
+            job.update(self._finished(now, pdf_bytes=cached))
+            self.db[JOBS].insert_one(job)
+            return _public(job)
+
+        with self._changed:
+            if key in self._renders:
+                self._renders[key].append(job['_id'])
+                self.db[JOBS].insert_one(job)
+                return _public(job)
+            if len(self._renders) >= self.max_pending:
+                raise QueueFull()
+            # Inserted before the render starts, so the finishing callback always finds it
+            self.db[JOBS].insert_one(job)
+            try:
+                pool, future = submit_render(fields, self.max_workers)
+            except Exception:
+                self.db[JOBS].delete_one({'_id': job['_id']})
+                raise
+            self._renders[key] = [job['_id']]
+        future.add_done_callback(lambda f, key=key, pool=pool: self._finish(key, f, pool))
+        return _public(job)
+
+    def get(self, job_id, owner_id, wait=0):
+        """
+        Current state of a job, waiting up to ``wait`` seconds for it to finish
+        :return: Job dictionary (``id``, ``status``, ``error``, ``filename`` and timestamps),
+            or ``None`` when unknown, expired or owned by someone else
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            job = self.db[JOBS].find_one({'_id': job_id, 'owner_id': owner_id}, {'pdf': 0})
+            if not job:
+                return None
+            if job['status'] == QUEUED and job['created_at'] < self._stale_before():
+                job = self._fail_stale(job)
+            remaining = deadline - time.monotonic()
+            if job['status'] != QUEUED or remaining <= 0:
+                return _public(job)
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def artifact(self, job):
+        """Bytes of a finished job's PDF, or ``None`` if the job has expired since"""
+        stored = self.db[JOBS].find_one({'_id': job['id'], 'status': DONE}, {'pdf': 1})
+        return bytes(stored['pdf']) if stored and stored.get('pdf') is not None else None
+
+    def pending(self):
+        with self._changed:
+            return len(self._renders)
+
+    def _finish(self, key, future, pool):
+        # Runs on the pool's result thread; store the PDF before waking pollers
+        pdf_bytes, error = None, None
+        try:
+            pdf_bytes = future.result()
+            self.pdf_cache.put(key, pdf_bytes)
+        except BrokenProcessPool as e:
+            # A render worker died; the job fails, the next submit gets a fresh pool
+            discard_pool(pool)
+            error = str(e) or e.__class__.__name__
+            print(f"⚠️ PDF export job failed, render pool replaced: {error}")
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+            print(f"⚠️ PDF export job failed: {error}")
+        with self._changed:
+            job_ids = self._renders.pop(key, [])
+        try:
+            self.db[JOBS].update_many(
+                {'_id': {'$in': job_ids}, 'status': QUEUED},
+                {'$set': self._finished(datetime.datetime.utcnow(), pdf_bytes, error)}
+            )
+        except Exception as e:
+            print(f"⚠️ Failed to record the result of {len(job_ids)} PDF export jobs: {e}")
+        with self._changed:
+            self._changed.notify_all()
+
+    def _finished(self, now, pdf_bytes=None, error=None):
+        """Fields of a job that just finished"""
+        fields = {
+            'status': FAILED if error else DONE,
+            'error': error,
+            'finished_at': now,
+            'expires_at': now + datetime.timedelta(seconds=self.job_ttl),
+        }
+        if not error:
+            fields['pdf'] = Binary(pdf_bytes)
+        return fields
+
+    def _stale_before(self):
+        return datetime.datetime.utcnow() - datetime.timedelta(seconds=self.render_timeout)
+
+    def _fail_stale(self, job):
+        """Fail a job whose render never reported back (its process died), unless it finished meanwhile"""
+        self.db[JOBS].update_one(
+            {'_id': job['_id'], 'status': QUEUED},
+            {'$set': self._finished(datetime.datetime.utcnow(), error='Render did not finish, submit a new job')}
+        )
+        return self.db[JOBS].find_one({'_id': job['_id']}, {'pdf': 0}) or job
+
+
+def _public(job):
+    """Job document as returned to callers: ``id`` instead of ``_id``, without the PDF bytes"""
+    public = {k: v for k, v in job.items() if k not in ('_id', 'pdf')}
+    public['id'] = job['_id']
+    return public
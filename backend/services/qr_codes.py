@@ -0,0 +1,43 @@
+"""Verification QR codes.
+
+A credential's verification URL never changes, so QR codes are generated
+once per URL and kept in an LRU cache (``QR_CACHE_SIZE`` entries). The SVG variant is vector output that WeasyPrint embeds directly
+in the PDF, so bulk exports skip raster rendering and PNG encoding entirely.
+"""
+import base64
+import io
+import os
+from functools import lru_cache
+
+import qrcode
+import qrcode.image.svg
+
+QR_CACHE_SIZE = int(os.environ.get('QR_CACHE_SIZE', 4096))
+
+
+def _qr(url):
+    qr = qrcode.QRCode(box_size=10, border=4, error_correction=qrcode.constants.ERROR_CORRECT_M)
+    qr.add_data(url)
+    qr.make(fit=True)
+    return qr
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def verification_qr_svg(url):
+    """SVG markup (bytes) of the QR code for ``url``"""
+    buffer = io.BytesIO()
+    _qr(url).make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def verification_qr_data_uri(url):
+    """``data:`` URI of the SVG QR code, for ``<img src>`` in HTML templates"""
+    return 'data:image/svg+xml;base64,' + base64.b64encode(verification_qr_svg(url)).decode('ascii')
+
+
+def cache_info():
+    return {
+        'svg': verification_qr_svg.cache_info()._asdict(),
+        'data_uri': verification_qr_data_uri.cache_info()._asdict(),
+    }
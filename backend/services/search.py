@@ -0,0 +1,135 @@
+"""Credential search.
+
+Credentials carry denormalized search fields, maintained on write:
+
+- ``issuer_name``: issuer display name at issuance
+- ``search_metadata``: all string values of ``credential_data``, space-joined
+- ``search_terms``: lowercased tokens of title, issuer, type and metadata
+
+Full-text queries go through the weighted ``credential_search`` text index
+and are ranked by ``textScore``. Prefix autocomplete uses an anchored regex
+on the (multikey-indexed) ``search_terms`` array, which can walk the index
+because the prefix is fixed and the terms are already lowercased.
+Both are always combined with the caller's visibility scope.
+"""
+import re
+
+from pymongo import ASCENDING, TEXT, IndexModel, UpdateOne
+
+SEARCH_INDEXES = [
+    IndexModel(
+        [('title', TEXT), ('issuer_name', TEXT), ('credential_type', TEXT), ('search_metadata', TEXT)],
+        weights={'title': 10, 'issuer_name': 5, 'credential_type': 3, 'search_metadata': 1},
+        name='credential_search'
+    ),
+    IndexModel([('search_terms', ASCENDING)], name='search_terms'),
+]
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return _TOKEN.findall(str(text).lower())
+
+
+def _string_values(value):
+    """Yield every string found in a (nested) metadata value"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _string_values(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _string_values(item)
+
+
+def search_fields(credential, issuer_name):
+    """Compute the denormalized search fields to ``$set`` on a credential"""
+    metadata = ' '.join(_string_values(credential.get('credential_data') or {}))
+    terms = set()
+    for text in (credential.get('title'), issuer_name, credential.get('credential_type'), metadata):
+        if text:
+            terms.update(tokenize(text))
+    return {
+        'issuer_name': issuer_name,
+        'search_metadata': metadata,
+        'search_terms': sorted(terms),
+    }
+
+
+def visibility_filter(user):
+    """Credentials a user may see in search results: their own and the ones they issued, or all for admins"""
+    if user.get('role') == 'admin':
+        return {}
+    return {'$or': [{'recipient_id': user['_id']}, {'issuer_id': user['_id']}]}
+
+
+def _scoped(query, user):
+    scope = visibility_filter(user)
+    return {'$and': [query, scope]} if scope else query
+
+
+def search_credentials(db, text, user, page=1, limit=20):
+    """
+    Ranked full-text search
+    :return: Tuple of ``(credentials, has_more)``; documents include a ``score`` field
+    """
+    projection = {
+        'title': 1, 'issuer_name': 1, 'credential_type': 1, 'issue_date': 1,
+        'score': {'$meta': 'textScore'}
+    }
+    cursor = (
+        db.credentials.find(_scoped({'$text': {'$search': text}}, user), projection)
+        .sort([('score', {'$meta': 'textScore'})])
+        .skip((page - 1) * limit)
+        .limit(limit + 1)
+    )
+    results = list(cursor)
+    return results[:limit], len(results) > limit
+
+
+def suggest_titles(db, prefix, user, limit=10):
+    """Autocomplete: titles of credentials with a term starting with the last word of ``prefix``"""
+    tokens = tokenize(prefix)
+    if not tokens:
+        return []
+    query = {'search_terms': {'$regex': f'^{re.escape(tokens[-1])}'}}
+    if len(tokens) > 1:
+        # Earlier words must match whole terms
+        query = {'$and': [query, {'search_terms': {'$all': tokens[:-1]}}]}
+    titles = []
+    for cred in db.credentials.find(_scoped(query, user), {'title': 1}).limit(limit * 3):
+        if cred.get('title') and cred['title'] not in titles:
+            titles.append(cred['title'])
+        if len(titles) == limit:
+            break
+    return titles
+
+
+def backfill_search_fields(db, batch_size=500):
+    """Populate search fields on credentials created before they existed"""
+    updated = 0
+    cursor = db.credentials.find(
+        {'search_terms': {'$exists': False}},
+        {'title': 1, 'credential_type': 1, 'credential_data': 1, 'issuer_id': 1}
+    ).batch_size(batch_size)
+    batch = []
+    for cred in cursor:
+        batch.append(cred)
+        if len(batch) >= batch_size:
+            updated += _backfill_batch(db, batch)
+            batch = []
+    if batch:
+        updated += _backfill_batch(db, batch)
+    return updated
+
+
+def _backfill_batch(db, batch):
+    issuer_ids = list({c.get('issuer_id') for c in batch if c.get('issuer_id') is not None})
+    names = {u['_id']: u.get('username') for u in db.users.find({'_id': {'$in': issuer_ids}}, {'username': 1})}
+    db.credentials.bulk_write([
+        UpdateOne({'_id': c['_id']}, {'$set': search_fields(c, names.get(c.get('issuer_id')))})
+        for c in batch
+    ], ordered=False)
+    return len(batch)
@@ -0,0 +1,20 @@
+"""JSON conversion of Mongo documents for API responses."""
+import base64
+import datetime
+
+from bson.objectid import ObjectId
+
+
+def json_serialize(obj):
+    """Helper function to convert non-serializable types to JSON serializable format."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return base64.b64encode(obj).decode('utf-8')
+    if isinstance(obj, dict):
+        return {k: json_serialize(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [json_serialize(item) for item in obj]
+    return obj
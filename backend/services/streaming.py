@@ -0,0 +1,33 @@
+"""Helpers for streaming large result sets through Flask generator responses.
+
+The cursor is consumed in fixed-size batches and every document is encoded
+and yielded as soon as its batch is processed, so exporting millions of
+documents holds one batch in memory instead of the whole collection.
+"""
+import json
+from itertools import islice
+
+
+def iter_batches(iterable, size):
+    """Yield lists of up to ``size`` items from ``iterable``"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def ndjson_lines(items):
+    for item in items:
+        yield json.dumps(item) + '\n'
+
+
+def json_array_chunks(items):
+    """Encode ``items`` as a single JSON array, one element per yielded chunk"""
+    yield '['
+    first = True
+    for item in items:
+        yield ('' if first else ',') + json.dumps(item)
+        first = False
+    yield ']'
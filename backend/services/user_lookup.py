@@ -0,0 +1,40 @@
+"""Batched user resolution for credential listings.
+
+Listing routes used to call ``users.find_one`` once per credential to turn
+``issuer_id``/``recipient_id`` into a display name. These helpers collect the
+referenced ids up front and fetch every user in a single ``$in`` query, so a
+listing costs one credentials query plus one users query regardless of size.
+"""
+
+DEFAULT_USER_FIELDS = ('username', 'email')
+
+
+def resolve_users(db, user_ids, fields=DEFAULT_USER_FIELDS):
+    """
+    Fetch the users referenced by ``user_ids`` with one query
+    :param db: PyMongo database handle
+    :param user_ids: Iterable of user ``_id`` values (``None`` entries are skipped)
+    :param fields: User fields to project
+    :return: Dictionary mapping ``_id`` to the (projected) user document
+    """
+    ids = list({uid for uid in user_ids if uid is not None})
+    if not ids:
+        return {}
+    projection = {field: 1 for field in fields}
+    return {user['_id']: user for user in db.users.find({'_id': {'$in': ids}}, projection)}
+
+
+def resolve_credential_users(db, credentials, keys=('issuer_id',), fields=DEFAULT_USER_FIELDS):
+    """
+    Resolve the users referenced by a page of credentials with one query
+    :param db: PyMongo database handle
+    :param credentials: List of credential documents (must be materialized, not a cursor)
+    :param keys: Credential fields holding user ids, e.g. ``issuer_id``/``recipient_id``
+    :param fields: User fields to project
+    :return: Dictionary mapping ``_id`` to the (projected) user document
+    """
+    return resolve_users(
+        db,
+        (credential.get(key) for credential in credentials for key in keys),
+        fields
+    )
@@ -0,0 +1,112 @@
+"""Buffered writer for the verification event log.
+
+``record`` only appends to an in-process buffer; a background thread writes
+the buffer to ``verifications`` with ``insert_many`` whenever it reaches
+``max_batch`` events or ``flush_interval`` seconds pass, and once more at
+shutdown. The same flush folds the batch into the analytics rollup counters,
+so recording a verification costs no synchronous Mongo write at all.
+
+Only inserted events are counted. A flush that fails outright re-queues the
+batch; ``insert_many`` has given each event its ``_id`` by then, so events
+the failed attempt did insert come back as duplicate keys on the retry and
+are counted then, exactly once.
+"""
+import atexit
+import datetime
+import threading
+from collections import deque
+
+from pymongo.errors import BulkWriteError
+
+from services import analytics
+
+DUPLICATE_KEY = 11000
+
+
+class VerificationLogWriter:
+    def __init__(self, db, max_batch=500, flush_interval=1.0, max_buffer=50000):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='verification-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, **event):
+        """Queue one verification event; never blocks on the database"""
+        event.setdefault('created_at', datetime.datetime.utcnow())
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                # Database unreachable for a long time, shed the oldest events rather than grow without bound
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(event)
+            full = len(self._buffer) >= self.max_batch
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of events written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._buffer)
+                self._buffer.clear()
+            if not batch:
+                return 0
+            try:
+                self.db.verifications.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Partial success: never re-queue events that made it in, and only count those.
+                # A duplicate key means an earlier, failed flush inserted the event but never counted it.
+                errors = [error for error in e.details.get('writeErrors', []) if error.get('code') != DUPLICATE_KEY]
+                print(f"⚠️ Verification log flush partially failed, dropping {len(errors)} events: {errors[:1]}")
+                failed = {error['index'] for error in errors}
+                batch = [event for i, event in enumerate(batch) if i not in failed]
+            except Exception as e:
+                print(f"⚠️ Verification log flush failed, re-queueing {len(batch)} events: {e}")
+                with self._lock:
+                    self._buffer.extendleft(reversed(batch))
+                return 0
+            self._apply_rollups(batch)
+            return len(batch)
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        self.flush()
+
+    def _apply_rollups(self, batch):
+        # One $inc per (recipient, outcome, week) instead of one per event
+        grouped = {}
+        for event in batch:
+            if not event.get('recipient_id'):
+                continue
+            key = (event['recipient_id'], bool(event.get('is_valid')), analytics.week_key(event['created_at']))
+            when, count = grouped.get(key, (event['created_at'], 0))
+            grouped[key] = (when, count + 1)
+        ops = [
+            op
+            for (recipient_id, is_valid, _), (when, count) in grouped.items()
+            for op in analytics.verification_ops(recipient_id, is_valid, when, count)
+        ]
+        if ops:
+            try:
+                self.db[analytics.ROLLUPS].bulk_write(ops, ordered=False)
+            except Exception as e:
+                print(f"⚠️ Failed to update verification rollups: {e}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Verification log writer error: {e}")
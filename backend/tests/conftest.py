@@ -0,0 +1,112 @@
+import datetime
+import importlib
+import os
+import uuid
+from types import SimpleNamespace
+
+import jwt
+import mongomock
+import pytest
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+READ_METHODS = ('find', 'find_one', 'aggregate', 'count_documents', 'distinct')
+
+
+class CountingCollection:
+    """Wraps a mongomock collection and counts the read commands sent through it"""
+
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in READ_METHODS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self._counter.append((self._collection.name, name))
+            return attr(*args, **kwargs)
+        return counted
+
+
+class CountingDatabase:
+    def __init__(self, db):
+        self._db = db
+        self.commands = []
+
+    def __getitem__(self, name):
+        return CountingCollection(self._db[name], self.commands)
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().get_database('blockcreds_test')
+
+
+@pytest.fixture
+def mongod():
+    """
+    A scratch database on the real MongoDB server at ``MONGO_TEST_URI``, for what
+    mongomock cannot do (``explain()``, ``$text``); skips the test when there is none
+    """
+    uri = os.environ.get('MONGO_TEST_URI', 'mongodb://localhost:27017')
+    client = MongoClient(uri, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command('ping')
+    except PyMongoError:
+        pytest.skip(f'No MongoDB server at {uri}')
+    name = f'blockcreds_test_{uuid.uuid4().hex[:8]}'
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+
+@pytest.fixture
+def counting_db(db):
+    return CountingDatabase(db)
+
+
+@pytest.fixture(scope='session')
+def backend(tmp_path_factory):
+    """
+    The backend API module. No MongoDB is reachable while it is imported, so it
+    boots in demo mode; ``api`` then points it at a test's ``db``.
+    """
+    root = tmp_path_factory.mktemp('backend')
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv('MONGO_URI', 'mongodb://127.0.0.1:1/blockcreds_test?serverSelectionTimeoutMS=100')
+        env.setenv('PDF_CACHE_PATH', str(root / 'pdf_cache'))
+        env.setenv('BLOB_STORE_PATH', str(root / 'blob_store'))
+        env.setenv('CLIP_WARMUP_ON_BOOT', 'false')
+        env.setenv('SECRET_KEY', 'backend-test-secret-key-of-32-bytes-or-more')
+        env.delenv('CREDENTIAL_CONTRACT_ADDRESS', raising=False)
+        return importlib.import_module('app')
+
+
+@pytest.fixture
+def api(backend, db, monkeypatch):
+    """Flask test client of the backend API, backed by ``db``"""
+    monkeypatch.setattr(backend, 'mongo', SimpleNamespace(db=db))
+    backend.user_cache.clear()
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def login(backend, db):
+    """``login(role, **fields)`` inserts a user and returns it with the headers of a valid token"""
+    def login(role='recipient', **fields):
+        user = {'username': f'{role}-{ObjectId()}', 'email': f'{ObjectId()}@example.com', 'role': role,
+                'password': 'not-a-real-hash', **fields}
+        user['_id'] = db.users.insert_one(user).inserted_id
+        token = jwt.encode(
+            {'user_id': str(user['_id']), 'role': role, 'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+            backend.app.config['SECRET_KEY'], algorithm='HS256'
+        )
+        return user, {'Authorization': f'Bearer {token}'}
+    return login
@@ -0,0 +1,104 @@
+import datetime
+
+from bson import ObjectId
+
+from services import analytics
+
+
+def seed(db):
+    issuer, recipient = ObjectId(), ObjectId()
+    db.users.insert_many([{'_id': issuer, 'username': 'issuer'}, {'_id': recipient, 'username': 'recipient'}])
+    db.credentials.insert_many([
+        {'issuer_id': issuer, 'recipient_id': recipient, 'credential_type': 'Degree', 'is_verified': True,
+         'created_at': datetime.datetime(2024, 1, i + 1)}
+        for i in range(3)
+    ])
+    return recipient
+
+
+def test_rebuild_twice_replaces_rollups_in_place(db):
+    recipient = seed(db)
+    assert analytics.rebuild_rollups(db) == 2
+    analytics.record_users(db, 1)
+    assert analytics.rebuild_rollups(db) == 2
+    overview = analytics.read_overview(db, recipient)
+    assert overview['summary']['total_users'] == 2
+    assert overview['summary']['credentials']['total'] == 3
+    assert db[analytics.ROLLUPS].find_one({'_id': analytics.REBUILD_LEASE_ID}) is None
+
+
+def test_rebuild_drops_rollups_of_removed_users(db):
+    seed(db)
+    db[analytics.ROLLUPS].insert_one({'_id': analytics.user_rollup_id(ObjectId()), 'credentials_total': 4})
+    analytics.rebuild_rollups(db)
+    assert db[analytics.ROLLUPS].count_documents({}) == 2
+
+
+def test_rebuild_skips_while_another_holds_the_lease(db):
+    seed(db)
+    db[analytics.ROLLUPS].insert_one({
+        '_id': analytics.REBUILD_LEASE_ID, 'owner': 'other-worker',
+        'expires_at': datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+    })
+    assert analytics.rebuild_rollups(db) is None
+    analytics.ensure_rollups(db)
+    assert db[analytics.ROLLUPS].find_one({'_id': analytics.GLOBAL_ID}) is None
+
+
+def test_rebuild_takes_over_an_expired_lease(db):
+    seed(db)
+    db[analytics.ROLLUPS].insert_one({
+        '_id': analytics.REBUILD_LEASE_ID, 'owner': 'crashed-worker',
+        'expires_at': datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    })
+    assert analytics.rebuild_rollups(db) == 2
+
+
+def test_ensure_rollups_does_not_raise(db, monkeypatch):
+    def failing(db):
+        raise RuntimeError('node went away')
+
+    monkeypatch.setattr(analytics, '_rebuild', failing)
+    analytics.ensure_rollups(db)
+    assert db[analytics.ROLLUPS].find_one({'_id': analytics.REBUILD_LEASE_ID}) is None
+
+
+def test_rebuild_adds_up_types_that_share_a_field_key(db):
+    db.credentials.insert_many([
+        {'credential_type': None}, {'credential_type': ''}, {'credential_type': 'Other'}, {},
+        {'credential_type': 'a.b'}, {'credential_type': 'a_b'}, {'credential_type': 'Degree'},
+    ])
+
+    analytics.rebuild_rollups(db)
+
+    totals = db[analytics.ROLLUPS].find_one({'_id': analytics.GLOBAL_ID})
+    assert totals['by_type'] == {'Other': 4, 'a_b': 2, 'Degree': 1}
+    assert totals['total_credentials'] == 7
+
+
+def test_rebuild_matches_incremental_counters(db):
+    types = [None, '', 'Other', 'a.b', 'a_b', 'Degree']
+    for credential_type in types:
+        credential = {'credential_type': credential_type, 'created_at': datetime.datetime(2024, 1, 1)}
+        db.credentials.insert_one(credential)
+        analytics.record_credential(db, credential)
+    incremental = db[analytics.ROLLUPS].find_one({'_id': analytics.GLOBAL_ID})['by_type']
+
+    analytics.rebuild_rollups(db)
+
+    assert db[analytics.ROLLUPS].find_one({'_id': analytics.GLOBAL_ID})['by_type'] == incremental
+
+
+def test_verifying_a_credential_updates_total_verified(api, db, login):
+    issuer, headers = login('issuer')
+    credential_id = db.credentials.insert_one({'issuer_id': issuer['_id'], 'is_verified': False}).inserted_id
+
+    def total_verified():
+        return (db[analytics.ROLLUPS].find_one({'_id': analytics.GLOBAL_ID}) or {}).get('total_verified', 0)
+
+    api.put(f'/api/credentials/{credential_id}', json={'is_verified': True}, headers=headers)
+    assert total_verified() == 1
+    api.put(f'/api/credentials/{credential_id}', json={'is_verified': True}, headers=headers)
+    assert total_verified() == 1
+    api.put(f'/api/credentials/{credential_id}', json={'is_verified': False}, headers=headers)
+    assert total_verified() == 0
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from services.batch_stream import parse_stream_args, stream_verifications
+
+
+def test_parse_stream_args_defaults_and_clamps():
+    assert parse_stream_args({}, 16, 30) == (8, 10.0)
+    assert parse_stream_args({'concurrency': 500, 'timeout': 999}, 16, 30) == (16, 30.0)
+    assert parse_stream_args({'concurrency': '0', 'timeout': '0'}, 16, 30) == (1, 0.1)
+
+
+@pytest.mark.parametrize('data', [
+    {'concurrency': 'many'},
+    {'concurrency': None},
+    {'concurrency': [4]},
+    {'timeout': 'soon'},
+    {'timeout': {}},
+    {'timeout': 'nan'},
+    {'timeout': 'inf'},
+])
+def test_parse_stream_args_rejects_malformed_values(data):
+    with pytest.raises(ValueError):
+        parse_stream_args(data, 16, 30)
+
+
+def test_stream_reports_every_code():
+    results = list(stream_verifications(['a', 'b', 'c'], lambda code: code != 'b', max_workers=2))
+    assert sorted((r['credential_id'], r['is_valid']) for r in results) == [('a', True), ('b', False), ('c', True)]
+
+
+def test_stream_reports_slow_codes_as_timed_out():
+    def verify(code):
+        if code == 'slow':
+            time.sleep(1)
+        return True
+
+    results = {r['credential_id']: r for r in stream_verifications(['slow', 'fast'], verify, max_workers=2, timeout=0.2)}
+    assert results['fast']['is_valid'] is True
+    assert results['slow'] == {'credential_id': 'slow', 'is_valid': False, 'error': 'timeout'}
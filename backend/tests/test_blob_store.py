@@ -0,0 +1,168 @@
+import base64
+import datetime
+import os
+import threading
+
+import pytest
+
+from services import blob_store
+from services.blob_store import (
+    BLOB_REFS, LocalBlobStore, RefCountedBlobStore, content_hash, decode_image, rebuild_ref_counts
+)
+
+import migrate_credential_images
+
+
+@pytest.fixture
+def local(tmp_path):
+    return LocalBlobStore(str(tmp_path / 'blobs'))
+
+
+@pytest.fixture
+def store(db, local):
+    return RefCountedBlobStore(local, db, retry_delay=0.01)
+
+
+def exists(local, ref):
+    return os.path.exists(local._path(ref))
+
+
+def data_url(data, content_type='image/png'):
+    return f'data:{content_type};base64,' + base64.b64encode(data).decode()
+
+
+def test_decode_image():
+    assert decode_image(data_url(b'png bytes')) == (b'png bytes', 'image/png')
+    assert decode_image(base64.b64encode(b'raw').decode()) == (b'raw', 'application/octet-stream')
+
+
+def test_local_store_is_content_addressed(local):
+    ref = local.put(b'image')
+
+    assert ref == content_hash(b'image')
+    assert local.put(b'image') == ref
+    assert local.get(ref) == b'image'
+    assert os.listdir(os.path.dirname(local._path(ref))) == [ref]  # no temp files left behind
+    local.delete(ref)
+    local.delete(ref)  # already gone: no error
+    assert not exists(local, ref)
+
+
+def test_blob_is_deleted_with_its_last_reference(db, local, store):
+    ref = store.put(b'image')
+    assert store.put(b'image') == ref
+    assert db[BLOB_REFS].find_one({'_id': ref})['count'] == 2
+
+    store.release(ref)
+    assert store.get(ref) == b'image'
+
+    store.release(ref)
+    assert not exists(local, ref)
+    assert db[BLOB_REFS].find_one({'_id': ref}) is None
+
+
+def test_put_after_the_last_release_stores_the_blob_again(local, store):
+    ref = store.put(b'image')
+    store.release(ref)
+
+    assert store.put(b'image') == ref
+    assert store.get(ref) == b'image'
+
+
+def test_put_waits_for_a_deletion_in_progress(db, local, store):
+    ref = store.put(b'image')
+    # A release has claimed the blob and is about to delete it
+    db[BLOB_REFS].update_one({'_id': ref}, {'$set': {'count': 0, 'deleting_at': datetime.datetime.utcnow()}})
+    put = threading.Thread(target=store.put, args=(b'image',))
+    put.start()
+    put.join(0.1)
+    assert put.is_alive()
+
+    # The release finishes: blob and count document are gone
+    local.delete(ref)
+    db[BLOB_REFS].delete_one({'_id': ref})
+    put.join(5)
+
+    assert not put.is_alive()
+    assert store.get(ref) == b'image'
+    assert db[BLOB_REFS].find_one({'_id': ref})['count'] == 1
+
+
+def test_put_takes_over_a_deletion_abandoned_by_a_crashed_process(db, local, store):
+    ref = store.put(b'image')
+    abandoned = datetime.datetime.utcnow() - datetime.timedelta(seconds=blob_store.DELETE_TIMEOUT + 1)
+    db[BLOB_REFS].update_one({'_id': ref}, {'$set': {'count': 0, 'deleting_at': abandoned}})
+    local.delete(ref)
+
+    store.put(b'image')
+
+    assert store.get(ref) == b'image'
+    assert db[BLOB_REFS].find_one({'_id': ref}) == {'_id': ref, 'count': 1}
+
+
+def test_uncounted_blobs_are_kept(local, store):
+    ref = local.put(b'stored before reference counting')
+
+    store.release(ref)
+
+    assert exists(local, ref)
+
+
+def test_rebuild_ref_counts(db):
+    db.credentials.insert_many([{'image_ref': 'a'}, {'image_ref': 'a'}, {'image_ref': 'b'}, {'image_ref': None}])
+    db[BLOB_REFS].insert_one({'_id': 'a', 'count': 7})
+
+    assert rebuild_ref_counts(db) == 2
+    assert {doc['_id']: doc['count'] for doc in db[BLOB_REFS].find()} == {'a': 2, 'b': 1}
+
+
+def test_migrate_moves_embedded_images_into_the_store(db, local, store):
+    db.credentials.insert_many([
+        {'_id': 1, 'image': data_url(b'shared')},
+        {'_id': 2, 'image': data_url(b'shared')},
+        {'_id': 3, 'image': data_url(b'own', 'image/jpeg')},
+        {'_id': 4, 'image': 'not base64!'},
+        {'_id': 5, 'image_ref': content_hash(b'moved earlier')},
+    ])
+    local.put(b'moved earlier')
+
+    assert migrate_credential_images.migrate(db, store, batch_size=2) == (3, 1)
+
+    shared, own = content_hash(b'shared'), content_hash(b'own')
+    migrated = {c['_id']: c for c in db.credentials.find()}
+    assert migrated[1]['image_ref'] == migrated[2]['image_ref'] == shared
+    assert migrated[3]['image_ref'] == own and migrated[3]['image_content_type'] == 'image/jpeg'
+    assert 'image' not in migrated[1] and 'image' in migrated[4]
+    assert store.get(shared) == b'shared'
+    # Every blob is counted, including the one moved by an earlier run
+    assert {doc['_id']: doc['count'] for doc in db[BLOB_REFS].find()} == {
+        shared: 2, own: 1, content_hash(b'moved earlier'): 1
+    }
+
+    assert migrate_credential_images.migrate(db, store) == (0, 1)
+    assert db[BLOB_REFS].find_one({'_id': shared})['count'] == 2
+
+
+def test_migrate_dry_run_writes_nothing(db, local, store):
+    db.credentials.insert_one({'_id': 1, 'image': data_url(b'image')})
+
+    assert migrate_credential_images.migrate(db, store, dry_run=True) == (1, 0)
+
+    assert 'image' in db.credentials.find_one({'_id': 1})
+    assert not exists(local, content_hash(b'image'))
+    assert db[BLOB_REFS].count_documents({}) == 0
+
+
+def test_deleting_a_credential_keeps_a_shared_image(api, backend, db, login, monkeypatch, local, store):
+    monkeypatch.setattr(backend, 'blob_store', store)
+    issuer, headers = login('issuer')
+    ref = store.put(b'image')
+    store.put(b'image')
+    first, second = db.credentials.insert_many([
+        {'issuer_id': issuer['_id'], 'image_ref': ref}, {'issuer_id': issuer['_id'], 'image_ref': ref}
+    ]).inserted_ids
+
+    assert api.delete(f'/api/credentials/{first}', headers=headers).status_code == 200
+    assert store.get(ref) == b'image'
+    assert api.delete(f'/api/credentials/{second}', headers=headers).status_code == 200
+    assert not exists(local, ref)
@@ -0,0 +1,278 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+from eth_account import Account
+
+import blockchain_service
+from blockchain_service import PendingTransaction, TransactionFailed, TransactionSender
+
+PRIVATE_KEY = '0x' + '11' * 32
+RECIPIENT = '0x' + '22' * 20
+ACCEPTED = None
+
+
+class FakeNode:
+    """Scripted JSON-RPC: each ``eth_sendRawTransaction`` batch pops the next script entry"""
+
+    def __init__(self, pending_count=0):
+        self.pending_count = pending_count
+        self.scripts = []
+        self.broadcasts = []
+        self.receipts = {}
+        self.count_calls = 0
+
+    def get_transaction_count(self, address, block_identifier):
+        self.count_calls += 1
+        return self.pending_count
+
+    def rpc_batch(self, method, params_list):
+        if method == 'eth_getTransactionReceipt':
+            return [{'id': i, 'result': self.receipts.get(tx_hash)} for i, (tx_hash,) in enumerate(params_list)]
+        self.broadcasts.append([raw for raw, in params_list])
+        script = self.scripts.pop(0) if self.scripts else [ACCEPTED] * len(params_list)
+        if isinstance(script, Exception):
+            raise script
+        return [
+            {'id': i, 'result': '0x'} if error is ACCEPTED else {'id': i, 'error': {'code': -32000, 'message': error}}
+            for i, error in enumerate(script)
+        ]
+
+
+@pytest.fixture
+def node():
+    return FakeNode(pending_count=5)
+
+
+@pytest.fixture
+def sender(node):
+    w3 = SimpleNamespace(
+        eth=SimpleNamespace(account=Account, chain_id=1337, get_transaction_count=node.get_transaction_count),
+        provider=SimpleNamespace(endpoint_uri='http://node')
+    )
+    sender = TransactionSender(w3, PRIVATE_KEY, poll_interval=0.01, receipt_timeout=60)
+    # The tests drive the sender by hand
+    sender.stop()
+    for thread in sender._threads:
+        thread.join()
+    sender._rpc_batch = node.rpc_batch
+    signed = []
+    sign = sender._sign
+
+    def recording_sign(tx):
+        signed.append(dict(tx))
+        return sign(tx)
+
+    sender._sign = recording_sign
+    sender.signed = signed
+    return sender
+
+
+def transactions(count):
+    return [
+        PendingTransaction({'to': RECIPIENT, 'value': i, 'gas': 21000, 'gasPrice': 10 ** 9, 'nonce': 0, 'chainId': 1337})
+        for i in range(count)
+    ]
+
+
+def send(sender, batch):
+    sender._sign_batch(batch)
+    sender._send_signed(batch)
+
+
+def test_accepted_batch_uses_consecutive_nonces(sender, node):
+    batch = transactions(3)
+    send(sender, batch)
+
+    assert [p.nonce for p in batch] == [5, 6, 7]
+    assert all(p.sent.is_set() and p.tx_hash for p in batch)
+    assert sender.in_flight() == 3
+    assert sender._nonce == 8
+    assert len(node.broadcasts) == 1
+
+
+def test_nonce_too_low_resyncs_and_re_signs(sender, node):
+    batch = transactions(3)
+    node.scripts.append(['nonce too low', ACCEPTED, ACCEPTED])
+    send(sender, batch)
+
+    assert sender._retry == [batch[0]]
+    assert sender._nonce is None
+    assert not batch[0].sent.is_set()
+    assert sender.in_flight() == 2
+
+    # Another process used nonce 5; the node now counts past our own two as well
+    node.pending_count = 9
+    retried = sender._next_batch()
+    send(sender, retried)
+    assert retried == [batch[0]]
+    assert batch[0].nonce == 9
+    assert batch[0].sent.is_set()
+
+
+def test_rejection_below_accepted_nonce_is_gap_filled(sender, node):
+    batch = transactions(3)
+    node.scripts.append([ACCEPTED, 'insufficient funds for gas', ACCEPTED])
+    send(sender, batch)
+
+    with pytest.raises(TransactionFailed, match='insufficient funds'):
+        batch[1].result(timeout=0)
+    fill = sender.signed[-1]
+    assert fill['nonce'] == 6 and fill['to'] == sender.address and fill['value'] == 0
+    assert fill['gasPrice'] == batch[0].tx['gasPrice']
+    assert len(node.broadcasts) == 2 and len(node.broadcasts[1]) == 1
+    # The nonce is taken by the filler, so the next batch carries on after the batch
+    assert sender._nonce == 8
+
+
+def test_failed_gap_fill_resyncs(sender, node):
+    batch = transactions(3)
+    node.scripts.extend([[ACCEPTED, 'intrinsic gas too low', ACCEPTED], ['replacement transaction underpriced']])
+    send(sender, batch)
+
+    assert sender._nonce is None
+
+
+def test_trailing_rejections_reuse_their_nonces(sender, node):
+    batch = transactions(3)
+    node.scripts.append([ACCEPTED, 'insufficient funds for gas', 'insufficient funds for gas'])
+    send(sender, batch)
+
+    assert sender._nonce == 6
+    assert len(node.broadcasts) == 1  # no gap filler
+    later = transactions(1)
+    send(sender, later)
+    assert later[0].nonce == 6
+
+
+def test_ambiguous_broadcast_resends_the_same_transactions(sender, node):
+    batch = transactions(3)
+    node.scripts.extend([
+        requests.Timeout('read timed out'),
+        # The first attempt did reach the node: one pending, one already mined, one lost
+        ['already known', 'nonce too low', ACCEPTED],
+    ])
+    send(sender, batch)
+
+    assert sender._unconfirmed == batch
+    assert not any(p.sent.is_set() for p in batch)
+
+    unconfirmed, sender._unconfirmed = sender._unconfirmed, []
+    sender._send_signed(unconfirmed, rebroadcast=True)
+
+    assert node.broadcasts[0] == node.broadcasts[1]
+    assert len(sender.signed) == 3  # never re-signed
+    assert [p.nonce for p in batch] == [5, 6, 7]
+    assert all(p.sent.is_set() for p in batch)
+    assert sender.in_flight() == 3
+    assert sender._retry == []
+    assert node.count_calls == 1
+
+
+def test_send_loop_rebroadcasts_before_new_transactions(sender, node):
+    batch = transactions(2)
+    node.scripts.append(requests.ConnectionError('connection reset'))
+    send(sender, batch)
+    newer = transactions(1)
+    sender._queue.put(newer[0])
+
+    sender._stop.clear()
+    sign_batch = sender._sign_batch
+
+    def stop_after_new_batch(pending):
+        sign_batch(pending)
+        sender.stop()
+
+    sender._sign_batch = stop_after_new_batch
+    sender._send_loop()
+
+    assert node.broadcasts[1] == node.broadcasts[0]
+    assert newer[0].nonce == 7
+    assert sender.in_flight() == 3
+
+
+def test_null_reply_id_is_an_ambiguous_broadcast(sender, node, monkeypatch):
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return [{'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'Invalid request'}}]
+
+    monkeypatch.setattr(blockchain_service.requests, 'post', lambda *args, **kwargs: Response())
+    del sender._rpc_batch
+    batch = transactions(2)
+    send(sender, batch)
+
+    assert sender._unconfirmed == batch
+    assert not any(p.done() for p in batch)
+
+
+def test_receipt_timeout_fails_and_resyncs(sender, node):
+    batch = transactions(2)
+    send(sender, batch)
+    mined, dropped = batch
+    node.receipts[mined.tx_hash] = {'status': '0x1', 'blockNumber': '0x10'}
+    dropped.sent_at = time.monotonic() - 61
+
+    sender._poll_receipts()
+
+    assert mined.result(timeout=0)['status'] == '0x1'
+    with pytest.raises(TransactionFailed, match='not mined in time'):
+        dropped.result(timeout=0)
+    assert sender.in_flight() == 0
+    assert sender._nonce is None
+
+
+def test_reverted_receipt_fails(sender, node):
+    batch = transactions(1)
+    send(sender, batch)
+    node.receipts[batch[0].tx_hash] = {'status': '0x0', 'blockNumber': '0x10'}
+
+    sender._poll_receipts()
+
+    with pytest.raises(TransactionFailed, match='reverted'):
+        batch[0].result(timeout=0)
+
+
+def test_rebroadcasts_back_off_up_to_the_cap(sender, node, monkeypatch):
+    waits = []
+    monkeypatch.setattr(sender._stop, 'wait', waits.append)
+    sender.max_rebroadcast_delay = 0.03
+    node.scripts.extend([requests.Timeout('read timed out')] * 4)
+    batch = transactions(1)
+    send(sender, batch)
+
+    for _ in range(3):
+        unconfirmed, sender._unconfirmed = sender._unconfirmed, []
+        sender._send_signed(unconfirmed, rebroadcast=True)
+
+    assert waits == [0.01, 0.02, 0.03, 0.03]
+    assert sender._unconfirmed == batch
+
+    # A new ambiguous batch starts over from poll_interval
+    sender._unconfirmed = []
+    node.scripts.append(requests.Timeout('read timed out'))
+    send(sender, transactions(1))
+    assert waits[-1] == 0.01
+
+
+def test_rebroadcast_gives_up_after_the_timeout(sender, node):
+    batch = transactions(2)
+    node.scripts.extend([requests.Timeout('read timed out'), requests.ConnectionError('node down')])
+    send(sender, batch)
+    sender._unconfirmed_since -= sender.rebroadcast_timeout
+
+    unconfirmed, sender._unconfirmed = sender._unconfirmed, []
+    sender._send_signed(unconfirmed, rebroadcast=True)
+
+    assert sender._unconfirmed == []
+    for pending in batch:
+        assert pending.sent.is_set()
+        # Possibly mined under this hash, so callers can still hand it to the confirmer
+        assert pending.tx_hash == pending._signed[1]
+        with pytest.raises(TransactionFailed, match='unconfirmed after 120s: node down'):
+            pending.result(timeout=0)
+    assert sender.in_flight() == 0
+    assert sender._nonce is None
@@ -0,0 +1,132 @@
+import io
+
+import pytest
+
+from services import analytics
+from services.bulk_issue import rows_from_csv, upsert_recipients, validate_row
+
+TX = '0x' + 'ab' * 32
+
+CSV = (
+    'recipient_email,title,transaction_hash,credential_type,major\n'
+    f'jane@example.com,Bachelor of Science,{TX},Degree,Physics\n'
+    'john@example.com,Master of Arts,not-a-hash,,\n'
+)
+
+
+def row(**fields):
+    return {'recipient_email': 'jane@example.com', 'title': 'Degree', 'transaction_hash': TX, **fields}
+
+
+def test_validate_row():
+    assert validate_row(row()) is None
+    assert validate_row(['not', 'a', 'row']) == 'Row must be an object'
+    assert validate_row({'title': 'Degree'}) == 'Missing required fields: recipient_email, transaction_hash'
+    assert validate_row(row(recipient_email='jane')) == 'Invalid recipient_email'
+    assert 'transaction_hash' in validate_row(row(transaction_hash='fake'))
+    assert validate_row(row(credential_data=['major'])) == 'credential_data must be an object'
+
+
+def test_rows_from_csv_collects_unknown_columns_into_credential_data():
+    rows = rows_from_csv(CSV)
+
+    assert rows[0] == {'recipient_email': 'jane@example.com', 'title': 'Bachelor of Science', 'transaction_hash': TX,
+                       'credential_type': 'Degree', 'credential_data': {'major': 'Physics'}}
+    assert rows[1] == {'recipient_email': 'john@example.com', 'title': 'Master of Arts',
+                       'transaction_hash': 'not-a-hash', 'credential_data': {}}
+
+
+def test_upsert_recipients_creates_only_missing_users(db):
+    existing = db.users.insert_one({'email': 'jane@example.com', 'role': 'recipient'}).inserted_id
+
+    ids, created = upsert_recipients(db, ['jane@example.com', 'new@example.com', 'new@example.com'])
+
+    assert created == 1
+    assert ids['jane@example.com'] == existing
+    assert db.users.find_one({'email': 'new@example.com'})['_id'] == ids['new@example.com']
+
+
+@pytest.fixture
+def issuer(login):
+    return login('issuer', username='Example University')
+
+
+def test_bulk_issue_from_json(api, db, issuer):
+    _, headers = issuer
+    rows = [
+        row(credential_type='Degree', credential_data={'major': 'Physics'}),
+        row(recipient_email='john@example.com', transaction_hash='0x1234'),
+        {'title': 'No recipient'},
+        row(recipient_email=' john@example.com ', title='Certificate', verification_code='code-1'),
+    ]
+
+    response = api.post('/api/credentials/bulk', json={'credentials': rows}, headers=headers)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['summary'] == {'created': 2, 'failed': 2, 'recipients_created': 2}
+    results = body['results']
+    assert [r['row'] for r in results] == [0, 1, 2, 3]
+    assert [r['status'] for r in results] == ['created', 'error', 'error', 'created']
+    assert 'transaction_hash' in results[1]['error']
+    assert results[2]['error'] == 'Missing required fields: recipient_email, transaction_hash'
+
+    john = db.users.find_one({'email': 'john@example.com'})
+    certificate = db.credentials.find_one({'title': 'Certificate'})
+    assert str(certificate['_id']) == results[3]['credential_id']
+    assert certificate['recipient_id'] == john['_id']
+    assert certificate['verification_code'] == 'code-1'
+    assert 'certificate' in certificate['search_terms']
+    assert db[analytics.ROLLUPS].find_one({'_id': analytics.GLOBAL_ID})['total_credentials'] == 2
+
+
+def test_bulk_issue_from_csv_body_and_upload(api, db, issuer):
+    _, headers = issuer
+
+    body = api.post('/api/credentials/bulk', data=CSV, content_type='text/csv', headers=headers).get_json()
+    upload = api.post('/api/credentials/bulk', headers=headers, data={
+        'file': (io.BytesIO(('﻿' + CSV).encode('utf-8')), 'credentials.csv')
+    }).get_json()
+
+    for response in (body, upload):
+        assert [r['status'] for r in response['results']] == ['created', 'error']
+        assert 'transaction_hash' in response['results'][1]['error']
+    degrees = list(db.credentials.find({'title': 'Bachelor of Science'}))
+    assert len(degrees) == 2
+    assert degrees[0]['credential_type'] == 'Degree'
+    assert degrees[0]['credential_data'] == {'major': 'Physics'}
+
+
+def test_rows_rejected_by_the_database_are_reported_on_their_row(api, db, issuer):
+    _, headers = issuer
+    db.credentials.create_index('verification_code', unique=True, sparse=True)
+    rows = [row(verification_code='taken'), row(verification_code='taken'), row(verification_code='free')]
+
+    results = api.post('/api/credentials/bulk', json={'credentials': rows}, headers=headers).get_json()['results']
+
+    assert [r['status'] for r in results] == ['created', 'error', 'created']
+    assert 'duplicate' in results[1]['error'].lower()
+    assert db.credentials.count_documents({}) == 2
+
+
+@pytest.mark.parametrize('kwargs, error', [
+    ({'json': {'credentials': 'nope'}}, 'credentials must be a list'),
+    ({'json': {'credentials': []}}, 'No credentials provided'),
+    ({'data': {'file': (io.BytesIO(b'title\n\xff\xfe'), 'latin1.csv')}}, 'Invalid CSV'),
+])
+def test_malformed_requests_are_rejected(api, issuer, kwargs, error):
+    _, headers = issuer
+
+    response = api.post('/api/credentials/bulk', headers=headers, **kwargs)
+
+    assert response.status_code == 400
+    assert error in response.get_json()['error']
+
+
+def test_row_limit(api, backend, issuer, monkeypatch):
+    monkeypatch.setattr(backend, 'BULK_ISSUE_MAX_ROWS', 2)
+    _, headers = issuer
+
+    response = api.post('/api/credentials/bulk', json={'credentials': [row()] * 3}, headers=headers)
+
+    assert response.status_code == 400
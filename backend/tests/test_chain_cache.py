@@ -0,0 +1,93 @@
+import json
+import os
+import time
+
+from eth_abi import encode
+from web3 import Web3
+
+from services import chain_batch
+from services.chain_cache import ChainEventWatcher, VerificationCache
+
+ISSUER = '0x' + 'ab' * 20
+REGISTRY_ARTIFACT = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'blockchain', 'artifacts', 'blockchain', 'contracts',
+    'CredentialRegistry.sol', 'CredentialRegistry.json'
+)
+
+
+def result(credential_id, valid=True, expires_at=0):
+    return (valid, credential_id, b'\x00' * 32, ISSUER, ISSUER, 1700000000, expires_at, not valid, 'Org')
+
+
+def test_put_if_generation_skips_after_invalidation():
+    cache = VerificationCache()
+    generation = cache.generation
+    cache.invalidate_credential(7)
+    assert not cache.put_if_generation('0x01', result(7), generation)
+    assert cache.get('0x01') is None
+
+
+def test_stores_and_evictions_do_not_bump_generation():
+    cache = VerificationCache(max_entries=1)
+    generation = cache.generation
+    assert cache.put_if_generation('0x01', result(1), generation)
+    assert cache.put_if_generation('0x02', result(2), generation)
+    assert cache.get('01') is None
+    assert cache.get('02') == result(2)
+
+
+def test_expired_entries_are_refetched():
+    cache = VerificationCache()
+    cache.put('0x01', result(1, expires_at=int(time.time()) - 1))
+    assert cache.get('0x01') is None
+
+
+def test_batch_verify_skips_puts_invalidated_mid_batch(monkeypatch):
+    cache = VerificationCache()
+
+    def batch_call(w3, endpoint_uri, contract, name, args_list, chunk_size=200):
+        # A revocation is processed by the event watcher while the batch is in flight
+        cache.invalidate_credential(1)
+        return [result(1) for _ in args_list]
+
+    monkeypatch.setattr(chain_batch, 'batch_call', batch_call)
+    results = chain_batch.batch_verify_codes(None, 'http://node', None, cache, ['0x01', '0x02'])
+    assert results == {'0x01': result(1), '0x02': result(1)}
+    assert cache.stats()['entries'] == 0
+
+
+def test_batch_verify_caches_results(monkeypatch):
+    cache = VerificationCache()
+    calls = []
+
+    def batch_call(w3, endpoint_uri, contract, name, args_list, chunk_size=200):
+        calls.append(args_list)
+        return [result(i + 1) for i in range(len(args_list))]
+
+    monkeypatch.setattr(chain_batch, 'batch_call', batch_call)
+    chain_batch.batch_verify_codes(None, 'http://node', None, cache, ['0x01', '0x02', '0x01'])
+    assert calls == [[['0x01'], ['0x02']]]
+    assert cache.get('0x02') == result(2)
+
+
+def registry_log(signature, indexed, data):
+    """A raw log as returned by eth_getLogs for ``signature`` with ``indexed`` addresses as topics"""
+    return {
+        'address': ISSUER, 'blockHash': b'\x00' * 32, 'blockNumber': 1, 'logIndex': 0,
+        'transactionHash': b'\x00' * 32, 'transactionIndex': 0, 'removed': False,
+        'topics': [Web3.keccak(text=signature)] + [bytes(12) + bytes.fromhex(a[2:]) for a in indexed],
+        'data': data,
+    }
+
+
+def test_issuer_authorized_evicts_the_issuers_results():
+    with open(REGISTRY_ARTIFACT) as f:
+        contract = Web3().eth.contract(address=Web3.to_checksum_address(ISSUER), abi=json.load(f)['abi'])
+    cache = VerificationCache()
+    cache.put('0x01', result(1))
+    watcher = ChainEventWatcher(None, contract, cache)
+    # Re-authorizing an issuer renames its organization, which every cached result carries
+    watcher._handle(registry_log(
+        'IssuerAuthorized(address,string,address)', [ISSUER, '0x' + 'cd' * 20], encode(['string'], ['New Org'])
+    ))
+    assert cache.get('0x01') is None
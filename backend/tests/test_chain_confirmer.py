@@ -0,0 +1,73 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from services import chain_confirmer
+from services.chain_confirmer import CONFIRMED, PENDING, ChainConfirmer, is_transaction_hash
+
+HEAD = 100
+
+
+def tx(i):
+    return '0x' + f'{i:064x}'
+
+
+@pytest.fixture
+def mined(monkeypatch):
+    """Hashes in the returned set have a successful receipt at block HEAD - 5, all others are unmined"""
+    hashes = set()
+
+    def batch_get_receipts(w3, endpoint_uri, tx_hashes, chunk_size=200, timeout=30):
+        return {h: {'status': '0x1', 'blockNumber': hex(HEAD - 5)} if h in hashes else None for h in tx_hashes}
+
+    monkeypatch.setattr(chain_confirmer, 'batch_get_receipts', batch_get_receipts)
+    return hashes
+
+
+def confirmer(db, batch_size=500):
+    w3 = SimpleNamespace(eth=SimpleNamespace(block_number=HEAD))
+    return ChainConfirmer(db, w3, 'http://node', poll_interval=5, batch_size=batch_size)
+
+
+def test_dropped_hashes_do_not_starve_newer_credentials(db, mined):
+    now = datetime.datetime.utcnow()
+    # A bulk request's worth of hashes that will never be mined, all older than the real one
+    db.credentials.insert_many([
+        {'transaction_hash': tx(i), 'chain_status': PENDING, 'created_at': now - datetime.timedelta(minutes=1),
+         'next_check_at': now - datetime.timedelta(minutes=1)}
+        for i in range(500)
+    ])
+    db.credentials.insert_one({'transaction_hash': tx(999), 'chain_status': PENDING, 'created_at': now,
+                               'next_check_at': now})
+    mined.add(tx(999))
+
+    poller = confirmer(db)
+    assert poller.poll() == (0, 0)
+    assert poller.poll() == (1, 0)
+    assert db.credentials.find_one({'transaction_hash': tx(999)})['chain_status'] == CONFIRMED
+
+
+def test_unmined_transactions_back_off_with_age(db, mined):
+    now = datetime.datetime.utcnow()
+    db.credentials.insert_many([
+        {'transaction_hash': tx(1), 'chain_status': PENDING, 'created_at': now},
+        {'transaction_hash': tx(2), 'chain_status': PENDING, 'created_at': now - datetime.timedelta(minutes=20)},
+    ])
+    confirmer(db).poll()
+    fresh = db.credentials.find_one({'transaction_hash': tx(1)})['next_check_at'] - now
+    old = db.credentials.find_one({'transaction_hash': tx(2)})['next_check_at'] - now
+    assert datetime.timedelta(seconds=4) < fresh < datetime.timedelta(seconds=10)
+    assert datetime.timedelta(seconds=110) < old < datetime.timedelta(seconds=130)
+    # Neither is due again right away
+    assert confirmer(db).poll() == (0, 0)
+    assert db.credentials.count_documents({'next_check_at': {'$gt': now}}) == 2
+
+
+def test_is_transaction_hash():
+    assert is_transaction_hash(tx(1))
+    assert not is_transaction_hash('0x1234')
+    assert not is_transaction_hash(tx(1)[2:] + '00')
+    assert not is_transaction_hash('0x' + 'g' * 64)
+    assert not is_transaction_hash(None)
+
@@ -0,0 +1,269 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from web3 import Web3
+
+from services import chain_indexer
+from services.chain_indexer import (
+    CHECKPOINTS, CREDENTIALS, EVENTS, INDEXED_EVENTS, ISSUERS, ChainIndexer, LeaseLost
+)
+
+REGISTRY = '0x' + '11' * 20
+ISSUER = '0x' + 'ab' * 20
+OWNER = '0x' + 'cd' * 20
+ISSUED_AT = 1700000000
+
+
+def code(credential_id):
+    return '0x' + f'{credential_id:064x}'
+
+
+class FakeNode:
+    """A chain of numbered blocks plus the registry logs in them; ``fork`` replaces everything from a block up"""
+
+    def __init__(self, head):
+        self.blocks = {n: self._hash(n, 0) for n in range(head + 1)}
+        self.logs = []
+        self.fork_count = 0
+        self.on_get_logs = None
+
+    @staticmethod
+    def _hash(number, fork):
+        return bytes([fork]) + number.to_bytes(31, 'big')
+
+    @property
+    def block_number(self):
+        return max(self.blocks)
+
+    def mine(self, count=1):
+        for _ in range(count):
+            number = self.block_number + 1
+            self.blocks[number] = self._hash(number, self.fork_count)
+
+    def fork(self, from_block):
+        """Replace ``from_block`` and everything above it, dropping the logs they held"""
+        self.fork_count += 1
+        for number in [n for n in self.blocks if n >= from_block]:
+            self.blocks[number] = self._hash(number, self.fork_count)
+        self.logs = [log for log in self.logs if log['blockNumber'] < from_block]
+
+    def emit(self, block, name, **args):
+        self.logs.append({
+            'topics': [Web3.keccak(text=INDEXED_EVENTS[name])],
+            'transactionHash': Web3.keccak(text=f'{self.fork_count}:{block}:{len(self.logs)}'),
+            'logIndex': 0,
+            'blockNumber': block,
+            'blockHash': self.blocks[block],
+            'args': args,
+        })
+
+    def issue(self, block, credential_id):
+        self.emit(block, 'CredentialIssued', credentialId=credential_id, credentialHash=b'\x01' * 32,
+                  issuer=ISSUER, owner=OWNER, verificationCode=code(credential_id))
+
+    def verify(self, block, credential_id):
+        self.emit(block, 'CredentialVerified', credentialId=credential_id, verifier=OWNER, verifiedAt=ISSUED_AT)
+
+    def revoke(self, block, credential_id):
+        self.emit(block, 'CredentialRevoked', credentialId=credential_id, revokedBy=ISSUER, revokedAt=ISSUED_AT)
+
+    def get_block(self, number):
+        return {'hash': self.blocks[number]}
+
+    def get_logs(self, params):
+        if self.on_get_logs:
+            self.on_get_logs()
+        return [log for log in self.logs if params['fromBlock'] <= log['blockNumber'] <= params['toBlock']]
+
+
+class FakeEvent:
+    def process_log(self, log):
+        return {'args': log['args']}
+
+
+@pytest.fixture
+def node():
+    return FakeNode(head=10)
+
+
+@pytest.fixture
+def structs(monkeypatch):
+    """``credentials(id)`` and ``getIssuerOrganization`` answers; set ``structs.failing`` to make the batch raise"""
+    state = SimpleNamespace(failing=False, calls=[])
+
+    def batch_call(w3, endpoint_uri, contract, function, args):
+        state.calls.append(function)
+        if function == 'getIssuerOrganization':
+            return [('Org',) for _ in args]
+        if state.failing:
+            raise ConnectionError('node unavailable')
+        return [(cid, b'\x01' * 32, b'\x02' * 32, ISSUER, OWNER, ISSUED_AT, 0, False) for (cid,) in args]
+
+    monkeypatch.setattr(chain_indexer, 'batch_call', batch_call)
+    return state
+
+
+def indexer(db, node, **kwargs):
+    events = SimpleNamespace(**{name: FakeEvent for name in INDEXED_EVENTS})
+    contract = SimpleNamespace(address=REGISTRY, events=events)
+    kwargs.setdefault('reorg_window', 4)
+    return ChainIndexer(db, SimpleNamespace(eth=node), 'http://node', contract, **kwargs)
+
+
+def test_poll_mirrors_issuances_revocations_and_verifications(db, node, structs):
+    node.issue(3, 1)
+    node.issue(4, 2)
+    node.verify(5, 1)
+    node.verify(6, 1)
+    node.revoke(7, 2)
+
+    mirror = indexer(db, node)
+    assert mirror.poll() == 5
+    assert db[CHECKPOINTS].find_one()['last_block'] == 10
+
+    valid, credential_id, _, issuer, owner, issued_at, expires_at, revoked, org = mirror.lookup(code(1))
+    assert (valid, credential_id, issuer, owner, issued_at, expires_at, revoked, org) == \
+        (True, 1, ISSUER, OWNER, ISSUED_AT, 0, False, 'Org')
+    assert mirror.lookup(code(2))[0] is False
+    assert db[CREDENTIALS].find_one({'_id': 1})['verifications'] == 2
+    assert mirror.lookup(code(3)) is None
+
+
+def test_reapplying_a_range_does_not_count_verifications_twice(db, node, structs):
+    node.issue(3, 1)
+    node.verify(5, 1)
+    mirror = indexer(db, node)
+    mirror.poll()
+
+    # A poll that wrote its events but died before saving the checkpoint is retried from the same block
+    db[CHECKPOINTS].update_one({}, {'$set': {'last_block': 2}})
+    mirror.poll()
+    assert db[CREDENTIALS].find_one({'_id': 1})['verifications'] == 1
+
+    node.mine()
+    node.verify(11, 1)
+    mirror.poll()
+    assert db[CREDENTIALS].find_one({'_id': 1})['verifications'] == 2
+
+
+def test_reorg_inside_the_window_rebuilds_from_the_remaining_events(db, node, structs):
+    node.issue(7, 1)
+    node.verify(8, 1)
+    node.issue(9, 2)
+    node.revoke(9, 1)
+    mirror = indexer(db, node)
+    mirror.poll()
+    assert db[CREDENTIALS].find_one({'_id': 1})['is_revoked']
+
+    # Blocks 9 and up are replaced: the second issuance and the revocation are gone, a new verification lands
+    node.fork(9)
+    node.verify(10, 1)
+    node.verify(10, 1)
+    mirror.poll()
+
+    assert db[EVENTS].count_documents({'block_number': {'$gte': 9}, 'event': 'CredentialRevoked'}) == 0
+    assert db[CREDENTIALS].find_one({'_id': 2}) is None
+    credential = db[CREDENTIALS].find_one({'_id': 1})
+    assert not credential['is_revoked']
+    assert credential['verifications'] == 3
+    assert mirror.lookup(code(1))[0] is True
+    checkpoint = db[CHECKPOINTS].find_one()
+    assert checkpoint['recent'][-1] == {'number': 10, 'hash': Web3.to_hex(node.blocks[10])}
+
+
+def test_reorg_deeper_than_the_window_rebuilds_from_start_block(db, node, structs):
+    node.issue(2, 1)
+    node.issue(3, 2)
+    node.emit(3, 'IssuerAuthorized', issuer=ISSUER, organization='Org', authorizedBy=OWNER)
+    mirror = indexer(db, node, start_block=1)
+    mirror.poll()
+    lookups = structs.calls.count('getIssuerOrganization')
+
+    # Every stored block hash (the last 4) is replaced, as is the history below them
+    node.fork(2)
+    node.issue(4, 3)
+    mirror.poll()
+
+    assert {doc['_id'] for doc in db[CREDENTIALS].find()} == {3}
+    assert db[EVENTS].count_documents({}) == 1
+    # The issuer's authorization event is gone, so its document is re-read from the contract
+    assert db[ISSUERS].find_one({'_id': ISSUER})['organization'] == 'Org'
+    assert structs.calls.count('getIssuerOrganization') == lookups + 1
+    assert db[CHECKPOINTS].find_one()['last_block'] == 10
+
+
+def test_another_process_takes_over_an_expired_lease_only(db, node, structs):
+    node.issue(3, 1)
+    first = indexer(db, node, block_range=5)
+    second = indexer(db, node, block_range=5)
+    assert first.poll() == 1
+
+    # The live lease holder indexes; the other only follows its checkpoint
+    assert second.poll() == 0
+    assert second.last_block == 4
+    assert db[CHECKPOINTS].find_one()['lease_owner'] == first.worker_id
+
+    db[CHECKPOINTS].update_one({}, {'$set': {'lease_until': datetime.datetime.utcnow() - datetime.timedelta(seconds=1)}})
+    node.issue(6, 2)
+    assert second.poll() == 1
+    assert db[CHECKPOINTS].find_one()['lease_owner'] == second.worker_id
+    assert first.poll() == 0
+    assert first.last_block == 9
+
+
+def test_long_poll_renews_the_lease_and_stops_when_it_was_taken(db, node, structs):
+    node.issue(3, 1)
+    mirror = indexer(db, node, lease_seconds=30)
+
+    def slow_get_logs():
+        # The range took longer than the lease, which nobody else claimed
+        db[CHECKPOINTS].update_one({}, {'$set': {'lease_until': datetime.datetime.utcnow()}})
+    node.on_get_logs = slow_get_logs
+    mirror.poll()
+    assert db[CHECKPOINTS].find_one()['lease_until'] > datetime.datetime.utcnow() + datetime.timedelta(seconds=20)
+
+    def taken_over():
+        db[CHECKPOINTS].update_one({}, {'$set': {'lease_owner': 'other'}})
+    node.on_get_logs = taken_over
+    node.mine()
+    node.issue(11, 2)
+    with pytest.raises(LeaseLost):
+        mirror.poll()
+    assert db[EVENTS].count_documents({'credential_id': 2}) == 0
+    assert db[CHECKPOINTS].find_one()['last_block'] == 10
+
+
+def test_lookup_returns_none_while_the_mirror_lags(db, node, structs):
+    node.issue(3, 1)
+    mirror = indexer(db, node, block_range=8, max_lag=1)
+    mirror.poll()
+    assert mirror.last_block == 7
+    assert mirror.lookup(code(1)) is None
+    assert mirror.lookup_many([code(1), code(2)]) == {code(1): None, code(2): None}
+
+    mirror.poll()
+    assert mirror.lookup(code(1)) is not None
+    node.mine(2)
+    mirror.head = node.block_number
+    assert mirror.lookup(code(1)) is None
+
+
+def test_failed_struct_fetch_is_retried_instead_of_storing_nulls(db, node, structs):
+    node.issue(3, 1)
+    structs.failing = True
+    mirror = indexer(db, node)
+    assert mirror.poll() == 1
+
+    credential = db[CREDENTIALS].find_one({'_id': 1})
+    assert credential['details_pending']
+    assert 'issued_at' not in credential and 'expires_at' not in credential
+    assert mirror.lookup(code(1)) is None
+
+    structs.failing = False
+    mirror.poll()
+    credential = db[CREDENTIALS].find_one({'_id': 1})
+    assert 'details_pending' not in credential
+    assert credential['issued_at'] == ISSUED_AT
+    assert credential['metadata_hash'] == '0x' + '02' * 32
+    assert mirror.lookup(code(1))[5] == ISSUED_AT
@@ -0,0 +1,147 @@
+import threading
+
+import numpy as np
+import pytest
+
+from services.embedding_index import EmbeddingIndex
+
+
+def unit(*values, dim=4):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector / np.linalg.norm(vector)
+
+
+def test_search_ranks_by_similarity():
+    index = EmbeddingIndex(dim=4, initial_capacity=1)
+    index.add('a', unit(1, 0))
+    index.add('b', unit(1, 1))
+    index.add('c', unit(0, 1))
+    ranked = index.search(unit(1, 0.1), top_k=2)
+    assert [cid for cid, _ in ranked] == ['a', 'b']
+    assert ranked[0][1] > ranked[1][1]
+
+
+def test_remove_keeps_rows_dense():
+    index = EmbeddingIndex(dim=4)
+    for i, cid in enumerate('abc'):
+        index.add(cid, unit(*([0] * i + [1])))
+    index.remove('a')
+    assert len(index) == 2
+    assert index.search(unit(0, 0, 1), top_k=1)[0][0] == 'c'
+
+
+def test_search_retries_when_a_write_lands_mid_query():
+    index = EmbeddingIndex(dim=4)
+    index.add('a', unit(1, 0))
+    index.add('b', unit(0, 1))
+    top = EmbeddingIndex._top
+    calls = []
+
+    def racing_top(matrix, count, query, top_k, rows=None):
+        calls.append(count)
+        if len(calls) == 1:
+            # 'a' is deleted while the first product runs; 'b' moves into its row
+            index.remove('a')
+        return top(matrix, count, query, top_k, rows)
+
+    index._top = racing_top
+    result = index.search(unit(1, 0), top_k=2)
+    assert calls == [2, 1]
+    assert [cid for cid, _ in result] == ['b']
+
+
+def test_search_falls_back_to_locked_scoring():
+    index = EmbeddingIndex(dim=4)
+    index.add('a', unit(1, 0))
+    top = EmbeddingIndex._top
+    calls = []
+
+    def racing_optimistic_attempts(matrix, count, query, top_k, rows=None):
+        calls.append(count)
+        if len(calls) <= EmbeddingIndex.OPTIMISTIC_ATTEMPTS:
+            index.add('a', unit(1, 0))
+        return top(matrix, count, query, top_k, rows)
+
+    index._top = racing_optimistic_attempts
+    assert index.search(unit(1, 0), top_k=1)[0][0] == 'a'
+    assert len(calls) == EmbeddingIndex.OPTIMISTIC_ATTEMPTS + 1
+
+
+def clustered(rows, clusters=20, dim=32, noise=0.3, seed=0):
+    """Unit vectors around ``clusters`` centres, shaped like embeddings of similar documents"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    vectors = centres[rng.integers(0, clusters, rows)] + noise * rng.standard_normal((rows, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture
+def ivf_index():
+    index = EmbeddingIndex(dim=32, nprobe=4, auto_train=False)
+    index.IVF_MIN_ROWS = 500
+    for i, vector in enumerate(clustered(2000)):
+        index.add(f'c{i}', vector)
+    return index
+
+
+def test_search_scans_exactly_until_trained(ivf_index):
+    assert ivf_index.nlist == 0
+    assert ivf_index.search(clustered(2000)[7], top_k=1)[0][0] == 'c7'
+
+
+def test_ivf_search_finds_stored_embeddings(ivf_index):
+    vectors = clustered(2000)
+    assert ivf_index.train() == 44
+    rng = np.random.default_rng(1)
+    for i in rng.choice(2000, 50, replace=False):
+        scan = vectors[i] + 0.01 * rng.standard_normal(32)
+        assert ivf_index.search(scan, top_k=1)[0][0] == f'c{i}'
+
+
+def test_ivf_search_scores_only_probed_lists(ivf_index):
+    ivf_index.train(nlist=20)
+    rows = ivf_index._candidates(ivf_index._centroids, ivf_index._lists, len(ivf_index), clustered(2000)[0], 5)
+    assert 0 < len(rows) < len(ivf_index)
+
+
+def test_writes_after_training_are_listed(ivf_index):
+    ivf_index.train()
+    fresh = clustered(1, seed=5)[0]
+    ivf_index.add('fresh', fresh)
+    ivf_index.remove('c0')
+    assert ivf_index.search(fresh, top_k=1)[0][0] == 'fresh'
+    count = len(ivf_index)
+    expected = np.argmax(ivf_index._matrix[:count] @ ivf_index._centroids.T, axis=1)
+    assert (ivf_index._lists[:count] == expected).all()
+
+
+def test_rows_written_during_training_are_relisted(ivf_index, monkeypatch):
+    from services import embedding_index
+
+    kmeans = embedding_index._kmeans
+
+    def racing_kmeans(*args):
+        # Issuance and deletion land while k-means runs outside the lock
+        ivf_index.add('late', clustered(1, seed=9)[0])
+        ivf_index.remove('c3')
+        return kmeans(*args)
+
+    monkeypatch.setattr(embedding_index, '_kmeans', racing_kmeans)
+    ivf_index.train()
+    count = len(ivf_index)
+    expected = np.argmax(ivf_index._matrix[:count] @ ivf_index._centroids.T, axis=1)
+    assert (ivf_index._lists[:count] == expected).all()
+    assert ivf_index.search(clustered(1, seed=9)[0], top_k=1)[0][0] == 'late'
+
+
+def test_index_trains_in_background_once_large_enough():
+    index = EmbeddingIndex(dim=32)
+    index.IVF_MIN_ROWS = 500
+    for i, vector in enumerate(clustered(600)):
+        index.add(f'c{i}', vector)
+    for _ in range(100):
+        if index.nlist:
+            break
+        threading.Event().wait(0.05)
+    assert index.nlist > 0
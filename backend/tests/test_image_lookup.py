@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from services.embedding_index import EmbeddingIndex
+
+
+def unit(seed):
+    vector = np.random.default_rng(seed).standard_normal(512).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def scans(backend, monkeypatch):
+    """Every uploaded 'image' is a seed; encoding it returns that seed's embedding"""
+    encoded = []
+
+    def encode_image(image):
+        encoded.append(image)
+        return unit(int(image))
+
+    monkeypatch.setattr(backend.clip_service, 'encode_image', encode_image)
+    monkeypatch.setattr(backend, 'embedding_index', EmbeddingIndex(auto_train=False))
+    return encoded
+
+
+def store(backend, db, seed, recipient, issuer):
+    credential_id = db.credentials.insert_one({
+        'title': f'Credential {seed}', 'verification_code': f'secret-{seed}',
+        'recipient_id': recipient['_id'], 'issuer_id': issuer['_id'],
+    }).inserted_id
+    backend.embedding_index.add(str(credential_id), unit(seed))
+    return str(credential_id)
+
+
+def test_lookup_requires_a_signed_in_user(api, scans):
+    response = api.post('/api/verify/lookup', json={'image': '1'})
+
+    assert response.status_code == 401
+    assert scans == []  # rejected before any encode
+
+
+def test_verification_code_only_for_own_credentials(api, backend, db, login, scans):
+    holder, holder_headers = login()
+    issuer, issuer_headers = login('issuer')
+    _, stranger_headers = login()
+    _, admin_headers = login('admin')
+    credential_id = store(backend, db, 1, holder, issuer)
+
+    for headers in (holder_headers, issuer_headers, admin_headers):
+        [result] = api.post('/api/verify/lookup', json={'image': '1'}, headers=headers).get_json()['results']
+        assert result['id'] == credential_id
+        assert result['verification_code'] == 'secret-1'
+
+    [result] = api.post('/api/verify/lookup', json={'image': '1'}, headers=stranger_headers).get_json()['results']
+    assert result == {'id': credential_id, 'title': 'Credential 1', 'issue_date': None,
+                      'image_match_score': pytest.approx(1.0), 'is_match': True}
+
+
+def test_weak_matches_are_not_returned(api, backend, db, login, scans):
+    holder, headers = login()
+    store(backend, db, 1, holder, holder)
+
+    assert api.post('/api/verify/lookup', json={'image': '2'}, headers=headers).get_json() == {'results': []}
@@ -0,0 +1,61 @@
+import re
+
+import pytest
+
+from services.indexes import INDEXES, ROUTE_QUERIES, assert_no_collscans, ensure_indexes, find_collscans
+
+
+def plan(*stages):
+    """Nested winning plan with ``stages`` from the root down"""
+    node = None
+    for stage in reversed(stages):
+        node = {'stage': stage, **({'inputStage': node} if node else {})}
+    return node
+
+
+class ExplainedCollection:
+    def __init__(self, winning_plan):
+        self.winning_plan = winning_plan
+
+    def find(self, query):
+        return self
+
+    def sort(self, sort):
+        return self
+
+    def explain(self):
+        return {'queryPlanner': {'winningPlan': self.winning_plan}}
+
+
+def test_find_collscans_reports_nested_collection_scans():
+    plans = {'credentials': plan('FETCH', 'IXSCAN'), 'users': plan('SORT', 'COLLSCAN')}
+    db = {name: ExplainedCollection(winning_plan) for name, winning_plan in plans.items()}
+    queries = [('GET /a', 'credentials', {}, None), ('GET /b', 'users', {}, [('x', 1)])]
+
+    assert find_collscans(db, queries) == [('GET /b', 'users', plans['users'])]
+    with pytest.raises(AssertionError, match=r'GET /b \(users\)'):
+        assert_no_collscans(db, queries)
+
+
+def test_route_queries_name_backend_routes(backend):
+    def normalized(rule):
+        return re.sub(r'<[^>]*>', '<>', rule)
+
+    routes = {f'{method} {normalized(rule.rule)}' for rule in backend.app.url_map.iter_rules() for method in rule.methods}
+    for route, collection, _, _ in ROUTE_QUERIES:
+        if route.split(' ')[0] in ('GET', 'POST', 'PUT', 'DELETE'):
+            assert normalized(route) in routes, f'{route} is not a backend API route'
+        assert collection in INDEXES
+
+
+def test_route_queries_use_indexes(mongod):
+    ensure_indexes(mongod)
+
+    assert_no_collscans(mongod)
+
+
+def test_missing_index_is_reported(mongod):
+    ensure_indexes(mongod)
+    mongod.users.drop_index('email')
+
+    assert [route for route, _, _ in find_collscans(mongod)] == ['POST /api/login']
@@ -0,0 +1,158 @@
+import threading
+
+import pytest
+
+from services import model_serving
+from services.model_serving import BackgroundWarmup, EncodeBatcher
+
+
+class FakeEncoder:
+    """Doubles every input, recording the size of each forward pass"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def __call__(self, batch):
+        self.batches.append(len(batch))
+        if self.fail:
+            raise RuntimeError('CUDA out of memory')
+        return [value * 2 for value in batch]
+
+
+def test_concurrent_requests_share_a_forward_pass():
+    encoder = FakeEncoder()
+    batcher = EncodeBatcher(encoder, max_batch_size=16, max_wait_ms=200)
+
+    futures = [batcher.submit(i) for i in range(5)]
+
+    assert [f.result(timeout=5) for f in futures] == [0, 2, 4, 6, 8]
+    assert encoder.batches == [5]
+
+
+def test_batches_are_capped_at_max_batch_size():
+    encoder = FakeEncoder()
+    batcher = EncodeBatcher(encoder, max_batch_size=2, max_wait_ms=200)
+
+    futures = [batcher.submit(i) for i in range(5)]
+
+    assert [f.result(timeout=5) for f in futures] == [0, 2, 4, 6, 8]
+    assert encoder.batches == [2, 2, 1]
+
+
+def test_lone_request_is_served_after_max_wait():
+    encoder = FakeEncoder()
+    batcher = EncodeBatcher(encoder, max_wait_ms=1)
+
+    assert batcher.submit(21).result(timeout=5) == 42
+    assert batcher.submit(1).result(timeout=5) == 2
+    assert encoder.batches == [1, 1]
+
+
+def test_inputs_are_stacked_before_the_forward_pass():
+    stacked = []
+
+    def stack(inputs):
+        stacked.append(list(inputs))
+        return tuple(inputs)
+
+    batcher = EncodeBatcher(FakeEncoder(), stack=stack, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in (1, 2)]
+
+    assert [f.result(timeout=5) for f in futures] == [2, 4]
+    assert stacked == [[1, 2]]
+
+
+def test_a_failed_forward_pass_fails_every_request_of_the_batch():
+    batcher = EncodeBatcher(FakeEncoder(fail=True), max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(3)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match='out of memory'):
+            future.result(timeout=5)
+
+
+class FlakyModel:
+    """Warmup fails ``failures`` times, then succeeds and makes the model ready"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = 0
+        self.ready = False
+
+    def warmup(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise OSError('model download interrupted')
+        self.ready = True
+
+
+def test_warmup_retries_until_the_model_is_ready():
+    model = FlakyModel(failures=2)
+    warmup = BackgroundWarmup(model.warmup, lambda: model.ready, retry_delay=0.01)
+
+    warmup.start().join(timeout=5)
+
+    assert model.ready
+    assert model.attempts == 3
+    assert warmup.start() is None  # nothing left to do once ready
+
+
+def test_warmup_backoff_doubles_up_to_the_cap(monkeypatch):
+    sleeps = []
+    real_sleep = model_serving.time.sleep
+
+    def sleep(seconds):
+        # time.sleep is patched for every thread; only count the warmup's own waits
+        if threading.current_thread().name == 'clip-warmup':
+            sleeps.append(seconds)
+        else:
+            real_sleep(seconds)
+
+    monkeypatch.setattr(model_serving.time, 'sleep', sleep)
+    model = FlakyModel(failures=5)
+
+    BackgroundWarmup(model.warmup, lambda: model.ready, retry_delay=1, max_retry_delay=4).start().join(timeout=5)
+
+    assert sleeps == [1, 2, 4, 4, 4]
+
+
+def test_only_one_warmup_runs_at_a_time():
+    release = threading.Event()
+    model = FlakyModel(failures=0)
+
+    def slow_warmup():
+        release.wait(5)
+        model.warmup()
+
+    warmup = BackgroundWarmup(slow_warmup, lambda: model.ready)
+    first = warmup.start()
+
+    assert warmup.start() is first
+    release.set()
+    first.join(timeout=5)
+    assert model.attempts == 1
+
+
+class FakeClipService:
+    model_name = 'fake'
+
+    def __init__(self, is_ready):
+        self.is_ready = is_ready
+        self.warmups_started = 0
+
+    def start_background_warmup(self):
+        self.warmups_started += 1
+
+
+@pytest.mark.parametrize('is_ready, status', [(False, 503), (True, 200)])
+def test_readiness_reports_the_model_state(api, backend, monkeypatch, is_ready, status):
+    service = FakeClipService(is_ready)
+    monkeypatch.setattr(backend, 'clip_service', service)
+
+    response = api.get('/api/health/ready')
+
+    assert response.status_code == status
+    assert response.get_json() == {'ready': is_ready, 'clip_model': 'fake', 'database': True}
+    # Probing never starts work; the boot warmup does
+    assert service.warmups_started == 0
@@ -0,0 +1,98 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from services import pdf_bulk
+from services.credential_pdf import cache_key
+from services.pdf_cache import PdfCache
+
+
+def fake_render(fields):
+    """Stands in for WeasyPrint in the pool workers; ``crash_marker`` kills the worker (once, or with ``always``)"""
+    marker = fields.get('crash_marker')
+    if marker and (fields.get('always') or not os.path.exists(marker)):
+        open(marker, 'w').close()
+        os._exit(1)
+    if fields.get('fail'):
+        raise ValueError(f"cannot render {fields['title']}")
+    return f"%PDF {fields['title']}".encode()
+
+
+def no_renderer():
+    pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(pdf_bulk, 'render_pdf', fake_render)
+    monkeypatch.setattr(pdf_bulk, 'get_renderer', no_renderer)
+    monkeypatch.setattr(pdf_bulk, '_pool', None)
+    yield
+    if pdf_bulk._pool:
+        pdf_bulk._pool.shutdown(cancel_futures=True)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PdfCache(str(tmp_path / 'pdfs'))
+
+
+def entries(count, **extra):
+    return [(f'credential-{i}.pdf', {'title': f'Credential {i}', **extra}) for i in range(count)]
+
+
+def unzip(chunks):
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def test_renders_every_entry_and_fills_the_cache(pool, cache):
+    files = unzip(pdf_bulk.stream_pdf_zip(entries(7), cache, max_workers=2))
+
+    assert files == {f'credential-{i}.pdf': f'%PDF Credential {i}'.encode() for i in range(7)}
+    assert cache.get(cache_key({'title': 'Credential 3'}))
+
+
+def test_cache_hits_skip_the_pool(pool, cache):
+    cache.put(cache_key({'title': 'Credential 1'}), b'%PDF cached')
+
+    files = unzip(pdf_bulk.stream_pdf_zip(entries(2), cache, max_workers=1))
+
+    assert files['credential-1.pdf'] == b'%PDF cached'
+    assert files['credential-0.pdf'] == b'%PDF Credential 0'
+
+
+def test_failed_renders_are_listed_in_errors_txt(pool, cache):
+    batch = entries(2) + [('broken.pdf', {'title': 'Broken', 'fail': True})]
+
+    files = unzip(pdf_bulk.stream_pdf_zip(batch, cache, max_workers=2))
+
+    assert set(files) == {'credential-0.pdf', 'credential-1.pdf', 'errors.txt'}
+    assert b'broken.pdf: cannot render Broken' in files['errors.txt']
+
+
+def test_dead_worker_replaces_the_pool_and_retries_lost_renders(pool, cache, tmp_path):
+    marker = str(tmp_path / 'crashed')
+    first_pool = pdf_bulk.render_pool(2)
+    batch = entries(4) + [('crash.pdf', {'title': 'Crash', 'crash_marker': marker})]
+
+    files = unzip(pdf_bulk.stream_pdf_zip(batch, cache, max_workers=2))
+
+    assert os.path.exists(marker)
+    assert 'errors.txt' not in files
+    assert files['crash.pdf'] == b'%PDF Crash'
+    assert len(files) == 5
+    assert pdf_bulk._pool is not first_pool
+
+
+def test_render_that_kills_every_worker_fails_after_one_retry(pool, cache, tmp_path):
+    batch = [('crash.pdf', {'title': 'Crash', 'crash_marker': str(tmp_path / 'crashed'), 'always': True})]
+
+    files = unzip(pdf_bulk.stream_pdf_zip(batch, cache, max_workers=1))
+
+    assert set(files) == {'errors.txt'}
+    assert files['errors.txt'].startswith(b'crash.pdf: ')
+    # The next export gets a working pool again
+    assert unzip(pdf_bulk.stream_pdf_zip(entries(1), cache, max_workers=1)) == {'credential-0.pdf': b'%PDF Credential 0'}
@@ -0,0 +1,107 @@
+import datetime
+import os
+
+import pytest
+
+from services.credential_pdf import cache_key, pdf_fields
+from services.pdf_cache import PdfCache
+
+CREDENTIAL = {
+    '_id': 'c1',
+    'title': 'Bachelor of Science',
+    'issue_date': datetime.datetime(2024, 6, 1, 9, 30),
+    'issuer_name': 'Example University',
+    'transaction_hash': '0x' + 'ab' * 32,
+}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PdfCache(str(tmp_path), max_bytes=1000)
+
+
+def age(cache, key, seconds):
+    """Pretend ``key`` was last used ``seconds`` ago"""
+    when = datetime.datetime.now().timestamp() - seconds
+    os.utime(cache._path(key), (when, when))
+
+
+def test_cache_key_only_depends_on_stored_fields():
+    fields = pdf_fields(CREDENTIAL, 'Jane Doe', 'https://example.org/verification/c1')
+
+    # Nothing derived from the current date, so the key is the same on every day the PDF is requested
+    assert fields['verification_date'] == 'June 01, 2024'
+    assert cache_key(fields) == cache_key(pdf_fields(dict(CREDENTIAL), 'Jane Doe', 'https://example.org/verification/c1'))
+    assert cache_key(fields) == cache_key(dict(reversed(list(fields.items()))))
+
+
+def test_cache_key_uses_the_confirmation_date_once_confirmed():
+    confirmed = {**CREDENTIAL, 'confirmed_at': datetime.datetime(2024, 6, 2, 12, 0)}
+
+    fields = pdf_fields(confirmed, 'Jane Doe', 'https://example.org/verification/c1')
+
+    assert fields['verification_date'] == 'June 02, 2024'
+
+
+def test_cache_key_changes_with_the_rendered_content():
+    base = pdf_fields(CREDENTIAL, 'Jane Doe', 'https://example.org/verification/c1')
+
+    assert cache_key(base) != cache_key({**base, 'title': 'Master of Science'})
+    assert cache_key(base) != cache_key({**base, 'recipient_name': 'John Doe'})
+
+
+def test_get_returns_the_bytes(cache):
+    cache.put('a', b'%PDF a')
+
+    assert cache.get('a') == b'%PDF a'
+    assert cache.get('missing') is None
+
+
+def test_get_or_render_renders_once(cache):
+    renders = []
+
+    def render():
+        renders.append(1)
+        return b'%PDF rendered'
+
+    assert cache.get_or_render('k', render) == b'%PDF rendered'
+    assert cache.get_or_render('k', render) == b'%PDF rendered'
+    assert len(renders) == 1
+
+
+def test_get_or_render_renders_again_after_eviction(cache):
+    cache.put('k', b'%PDF old')
+    os.remove(cache._path('k'))
+
+    assert cache.get_or_render('k', lambda: b'%PDF new') == b'%PDF new'
+    assert cache.get('k') == b'%PDF new'
+
+
+def test_eviction_drops_least_recently_used_entries(cache):
+    for key in ('old', 'read', 'newer'):
+        cache.put(key, b'x' * 300)
+    age(cache, 'old', 300)
+    age(cache, 'read', 200)
+    age(cache, 'newer', 100)
+    cache.get('read')  # bumps it to most recently used
+
+    cache.put('latest', b'x' * 300)  # 1200 bytes > 1000, evicts down to 900
+
+    assert cache.get('old') is None
+    assert cache.get('newer') is not None
+    assert cache.get('read') is not None
+    assert cache.get('latest') is not None
+
+
+def test_overwriting_an_entry_does_not_grow_the_size(cache):
+    for _ in range(5):
+        cache.put('same', b'x' * 300)
+
+    assert cache._size == 300
+    assert cache.get('same') is not None
+
+
+def test_size_is_recovered_from_disk(tmp_path):
+    PdfCache(str(tmp_path)).put('a', b'x' * 123)
+
+    assert PdfCache(str(tmp_path))._size == 123
@@ -0,0 +1,222 @@
+import datetime
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from services import pdf_jobs
+from services.pdf_cache import PdfCache
+from services.pdf_jobs import DONE, FAILED, QUEUED, PdfJobQueue, QueueFull
+
+OWNER = 'user-1'
+
+
+class FakeRenders:
+    """Stands in for the render pool: every submit gets a future the test resolves by hand"""
+
+    def __init__(self):
+        self.submitted = []
+        self.discarded = []
+
+    def submit_render(self, fields, max_workers=None):
+        future = Future()
+        self.submitted.append((fields, future))
+        return 'pool', future
+
+    def discard_pool(self, pool):
+        self.discarded.append(pool)
+
+    def finish(self, index=-1, pdf_bytes=None, error=None):
+        fields, future = self.submitted[index]
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(pdf_bytes or f"%PDF {fields['title']}".encode())
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    fake = FakeRenders()
+    monkeypatch.setattr(pdf_jobs, 'submit_render', fake.submit_render)
+    monkeypatch.setattr(pdf_jobs, 'discard_pool', fake.discard_pool)
+    return fake
+
+
+def queue(db, tmp_path, name='a', **kwargs):
+    """One app process: its own PDF cache directory and render bookkeeping, the shared database"""
+    return PdfJobQueue(db, PdfCache(str(tmp_path / name)), poll_interval=0.01, **kwargs)
+
+
+def fields(title='Diploma'):
+    return {'title': title, 'verify_url': f'https://example.org/verification/{title}'}
+
+
+def test_submit_poll_download(db, tmp_path, renders):
+    jobs = queue(db, tmp_path)
+
+    job = jobs.submit(fields(), OWNER, 'credential-1.pdf')
+    assert job['status'] == QUEUED
+    assert jobs.get(job['id'], OWNER)['status'] == QUEUED
+
+    renders.finish()
+    done = jobs.get(job['id'], OWNER)
+    assert done['status'] == DONE and done['error'] is None
+    assert done['filename'] == 'credential-1.pdf'
+    assert jobs.artifact(done) == b'%PDF Diploma'
+    assert jobs.pending() == 0
+
+
+def test_any_process_can_poll_and_download(db, tmp_path, renders):
+    accepted_by = queue(db, tmp_path, 'a')
+    other = queue(db, tmp_path, 'b')
+
+    job = accepted_by.submit(fields(), OWNER, 'credential-1.pdf')
+    assert other.get(job['id'], OWNER)['status'] == QUEUED
+    renders.finish()
+
+    assert other.get(job['id'], OWNER)['status'] == DONE
+    assert other.artifact(other.get(job['id'], OWNER)) == b'%PDF Diploma'
+
+
+def test_jobs_are_only_visible_to_their_owner(db, tmp_path, renders):
+    jobs = queue(db, tmp_path)
+    job = jobs.submit(fields(), OWNER, 'credential-1.pdf')
+
+    assert jobs.get(job['id'], 'someone-else') is None
+    assert jobs.get('unknown', OWNER) is None
+
+
+def test_cached_pdf_completes_on_submit(db, tmp_path, renders):
+    jobs = queue(db, tmp_path)
+    first = jobs.submit(fields(), OWNER, 'credential-1.pdf')
+    renders.finish()
+
+    second = jobs.submit(fields(), OWNER, 'credential-1.pdf')
+
+    assert second['status'] == DONE
+    assert len(renders.submitted) == 1
+    assert jobs.artifact(second) == jobs.artifact(jobs.get(first['id'], OWNER))
+
+
+def test_identical_jobs_share_one_render(db, tmp_path, renders):
+    jobs = queue(db, tmp_path)
+    first = jobs.submit(fields(), OWNER, 'credential-1.pdf')
+    second = jobs.submit(fields(), 'user-2', 'credential-1.pdf')
+
+    assert len(renders.submitted) == 1
+    renders.finish()
+
+    assert jobs.get(first['id'], OWNER)['status'] == DONE
+    assert jobs.get(second['id'], 'user-2')['status'] == DONE
+
+
+def test_queue_full(db, tmp_path, renders):
+    jobs = queue(db, tmp_path, max_pending=2)
+    jobs.submit(fields('a'), OWNER, 'a.pdf')
+    jobs.submit(fields('b'), OWNER, 'b.pdf')
+
+    with pytest.raises(QueueFull):
+        jobs.submit(fields('c'), OWNER, 'c.pdf')
+    # Joining a render that is already running does not count against the limit
+    assert jobs.submit(fields('a'), 'user-2', 'a.pdf')['status'] == QUEUED
+    assert db[pdf_jobs.JOBS].count_documents({}) == 3
+
+
+def test_failed_render(db, tmp_path, renders):
+    jobs = queue(db, tmp_path)
+    job = jobs.submit(fields(), OWNER, 'credential-1.pdf')
+
+    renders.finish(error=ValueError('bad markup'))
+
+    failed = jobs.get(job['id'], OWNER)
+    assert failed['status'] == FAILED and failed['error'] == 'bad markup'
+    assert jobs.artifact(failed) is None
+
+
+def test_dead_render_worker_discards_the_pool(db, tmp_path, renders):
+    jobs = queue(db, tmp_path)
+    job = jobs.submit(fields(), OWNER, 'credential-1.pdf')
+
+    renders.finish(error=BrokenProcessPool('worker died'))
+
+    assert jobs.get(job['id'], OWNER)['status'] == FAILED
+    assert renders.discarded == ['pool']
+
+
+def test_long_poll_returns_when_the_render_finishes(db, tmp_path, renders):
+    jobs = queue(db, tmp_path)
+    job = jobs.submit(fields(), OWNER, 'credential-1.pdf')
+    threading.Timer(0.05, renders.finish).start()
+
+    assert jobs.get(job['id'], OWNER, wait=5)['status'] == DONE
+
+
+def test_long_poll_gives_up_after_wait(db, tmp_path, renders):
+    jobs = queue(db, tmp_path)
+    job = jobs.submit(fields(), OWNER, 'credential-1.pdf')
+
+    assert jobs.get(job['id'], OWNER, wait=0.05)['status'] == QUEUED
+
+
+def test_job_of_a_dead_process_fails_after_render_timeout(db, tmp_path, renders):
+    jobs = queue(db, tmp_path, render_timeout=60)
+    job = jobs.submit(fields(), OWNER, 'credential-1.pdf')
+    db[pdf_jobs.JOBS].update_one(
+        {'_id': job['id']}, {'$set': {'created_at': datetime.datetime.utcnow() - datetime.timedelta(seconds=61)}}
+    )
+
+    stale = queue(db, tmp_path, 'b', render_timeout=60).get(job['id'], OWNER)
+
+    assert stale['status'] == FAILED
+    assert 'did not finish' in stale['error']
+
+
+def test_finished_jobs_expire_after_job_ttl(db, tmp_path, renders):
+    jobs = queue(db, tmp_path, job_ttl=600)
+    job = jobs.submit(fields(), OWNER, 'credential-1.pdf')
+    renders.finish()
+
+    stored = db[pdf_jobs.JOBS].find_one({'_id': job['id']})
+    assert stored['expires_at'] - stored['finished_at'] == datetime.timedelta(seconds=600)
+
+
+def test_submit_that_cannot_reach_the_pool_leaves_no_job(db, tmp_path, monkeypatch):
+    def broken(fields, max_workers=None):
+        raise OSError('cannot fork')
+
+    monkeypatch.setattr(pdf_jobs, 'submit_render', broken)
+    jobs = queue(db, tmp_path)
+
+    with pytest.raises(OSError):
+        jobs.submit(fields(), OWNER, 'credential-1.pdf')
+    assert db[pdf_jobs.JOBS].count_documents({}) == 0
+    assert jobs.pending() == 0
+
+
+def test_export_job_routes(api, backend, db, login, tmp_path, renders, monkeypatch):
+    monkeypatch.setattr(backend, 'pdf_jobs', queue(db, tmp_path))
+    holder, headers = login()
+    _, other_headers = login()
+    credential_id = db.credentials.insert_one({
+        'title': 'Diploma', 'recipient_id': holder['_id'], 'issue_date': datetime.datetime(2024, 6, 1)
+    }).inserted_id
+
+    created = api.post(f'/api/credentials/{credential_id}/export/jobs', headers=headers)
+    assert created.status_code == 202
+    job = created.get_json()
+    assert job['status'] == QUEUED
+    assert api.get(f"/api/export/jobs/{job['job_id']}/download", headers=headers).status_code == 409
+
+    renders.finish()
+    # A poll that lands on another app process sees the same job
+    monkeypatch.setattr(backend, 'pdf_jobs', queue(db, tmp_path, 'other-process'))
+    polled = api.get(job['status_url'], headers=headers).get_json()
+    assert polled['status'] == DONE
+    assert api.get(job['status_url'], headers=other_headers).status_code == 404
+
+    download = api.get(polled['download_url'], headers=headers)
+    assert download.status_code == 200
+    assert download.mimetype == 'application/pdf'
+    assert download.data == b'%PDF Diploma'
+    assert f'credential-{credential_id}.pdf' in download.headers['Content-Disposition']
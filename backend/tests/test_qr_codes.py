@@ -0,0 +1,43 @@
+import base64
+
+import pytest
+
+from services import qr_codes
+from services.qr_codes import verification_qr_data_uri, verification_qr_svg
+
+URL = 'https://example.org/verification/c1'
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    verification_qr_svg.cache_clear()
+    verification_qr_data_uri.cache_clear()
+
+
+def test_svg_output():
+    svg = verification_qr_svg(URL)
+
+    assert b'<svg' in svg
+    assert b'<path' in svg  # SvgPathImage: one path, no per-module rects
+
+
+def test_cached_per_url():
+    first = verification_qr_svg(URL)
+
+    assert verification_qr_svg(URL) is first
+    assert qr_codes.cache_info()['svg']['hits'] == 1
+    assert qr_codes.cache_info()['svg']['misses'] == 1
+
+
+def test_different_urls_get_different_codes():
+    assert verification_qr_svg(URL) != verification_qr_svg('https://example.org/verification/c2')
+    assert qr_codes.cache_info()['svg']['currsize'] == 2
+
+
+def test_data_uri_embeds_the_cached_svg():
+    uri = verification_qr_data_uri(URL)
+
+    assert uri.startswith('data:image/svg+xml;base64,')
+    assert base64.b64decode(uri.split(',', 1)[1]) == verification_qr_svg(URL)
+    verification_qr_data_uri(URL)
+    assert qr_codes.cache_info()['data_uri']['hits'] == 1
@@ -0,0 +1,167 @@
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from services.indexes import ensure_indexes, find_collscans
+from services.search import (
+    _scoped, backfill_search_fields, search_credentials, search_fields, suggest_titles, tokenize, visibility_filter
+)
+
+RECIPIENT = {'_id': ObjectId(), 'role': 'recipient'}
+ISSUER = {'_id': ObjectId(), 'role': 'issuer'}
+ADMIN = {'_id': ObjectId(), 'role': 'admin'}
+STRANGER = {'_id': ObjectId(), 'role': 'recipient'}
+
+
+def credential(title, recipient=RECIPIENT, issuer=ISSUER, **fields):
+    doc = {'title': title, 'recipient_id': recipient['_id'], 'issuer_id': issuer['_id'], **fields}
+    doc.update(search_fields(doc, 'Example University'))
+    return doc
+
+
+@pytest.fixture
+def seeded(db):
+    other_recipient = {'_id': ObjectId()}
+    db.credentials.insert_many([
+        credential('Diploma in Physics'),
+        credential('Diploma in Chemistry', recipient=other_recipient),
+        credential('Data Science Certificate', issuer={'_id': ObjectId()}),
+    ])
+    return db
+
+
+def test_search_fields_index_nested_metadata():
+    fields = search_fields(
+        {'title': 'Bachelor of Science', 'credential_type': 'Degree',
+         'credential_data': {'major': 'Physics', 'honours': ['Cum Laude'], 'gpa': 3.9}},
+        'Example University'
+    )
+
+    assert fields['search_metadata'] == 'Physics Cum Laude'
+    assert fields['search_terms'] == sorted(
+        {'bachelor', 'of', 'science', 'example', 'university', 'degree', 'physics', 'cum', 'laude'}
+    )
+    assert tokenize('Ça-va, ÉTÉ!') == ['ça', 'va', 'été']
+
+
+def test_visibility_filter_by_role():
+    assert visibility_filter(ADMIN) == {}
+    assert visibility_filter(RECIPIENT) == {'$or': [{'recipient_id': RECIPIENT['_id']}, {'issuer_id': RECIPIENT['_id']}]}
+
+
+@pytest.mark.parametrize('user, titles', [
+    (RECIPIENT, ['Diploma in Physics', 'Data Science Certificate']),
+    (ISSUER, ['Diploma in Physics', 'Diploma in Chemistry']),
+    (ADMIN, ['Diploma in Physics', 'Diploma in Chemistry', 'Data Science Certificate']),
+    (STRANGER, []),
+])
+def test_suggestions_are_scoped_to_the_caller(seeded, user, titles):
+    assert sorted(suggest_titles(seeded, 'd', user)) == sorted(titles)
+
+
+def test_suggestions_complete_the_last_word(seeded):
+    assert suggest_titles(seeded, 'Diploma in ch', ADMIN) == ['Diploma in Chemistry']
+    assert suggest_titles(seeded, 'physics dip', ADMIN) == ['Diploma in Physics']
+    assert suggest_titles(seeded, '.*', ADMIN) == []  # no word, no regex from user input
+    assert suggest_titles(seeded, 'd', ADMIN, limit=1) == ['Diploma in Physics']
+
+
+class RecordingCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.queries = []
+
+    def find(self, query, *args):
+        self.queries.append(query)
+        return self.collection.find(query, *args)
+
+
+def test_suggestion_query_is_an_anchored_prefix_on_the_indexed_terms(seeded):
+    db = SimpleNamespace(credentials=RecordingCollection(seeded.credentials))
+
+    suggest_titles(db, 'Dip.', ADMIN)
+
+    assert db.credentials.queries == [{'search_terms': {'$regex': '^dip'}}]
+
+
+class RecordingCursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = []
+
+    def sort(self, sort):
+        self.calls.append(('sort', sort))
+        return self
+
+    def skip(self, count):
+        self.calls.append(('skip', count))
+        return self
+
+    def limit(self, count):
+        self.calls.append(('limit', count))
+        return self
+
+    def __iter__(self):
+        skip = dict(self.calls)['skip']
+        return iter(self.docs[skip:skip + dict(self.calls)['limit']])
+
+
+class TextSearchCollection:
+    """mongomock has no ``$text``; record the query and serve a ranked list"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.finds = []
+
+    def find(self, query, projection):
+        self.finds.append((query, projection))
+        self.cursor = RecordingCursor(self.docs)
+        return self.cursor
+
+
+@pytest.mark.parametrize('user, expected', [
+    (ADMIN, {'$text': {'$search': 'diploma'}}),
+    (ISSUER, {'$and': [{'$text': {'$search': 'diploma'}}, visibility_filter(ISSUER)]}),
+])
+def test_text_search_is_scoped_and_ranked(user, expected):
+    collection = TextSearchCollection([{'title': f'Diploma {i}'} for i in range(5)])
+    db = SimpleNamespace(credentials=collection)
+
+    results, has_more = search_credentials(db, 'diploma', user, page=2, limit=2)
+
+    [(query, projection)] = collection.finds
+    assert query == expected
+    assert projection['score'] == {'$meta': 'textScore'}
+    assert ('sort', [('score', {'$meta': 'textScore'})]) in collection.cursor.calls
+    assert [r['title'] for r in results] == ['Diploma 2', 'Diploma 3'] and has_more
+
+
+def test_backfill_adds_search_fields_to_old_credentials(db):
+    issuer = db.users.insert_one({'username': 'Example University'}).inserted_id
+    db.credentials.insert_many([
+        {'title': 'Diploma', 'issuer_id': issuer, 'credential_data': {'major': 'Physics'}},
+        {'title': 'Certificate', 'issuer_id': None},
+        credential('Already indexed'),
+    ])
+
+    assert backfill_search_fields(db, batch_size=1) == 2
+
+    diploma = db.credentials.find_one({'title': 'Diploma'})
+    assert diploma['issuer_name'] == 'Example University'
+    assert 'physics' in diploma['search_terms']
+    assert backfill_search_fields(db) == 0
+
+
+@pytest.mark.parametrize('user', [RECIPIENT, ADMIN])
+def test_search_queries_use_indexes(mongod, user):
+    ensure_indexes(mongod)
+    mongod.credentials.insert_many([credential('Diploma in Physics'), credential('Physics Olympiad')])
+    queries = [
+        ('search', 'credentials', _scoped({'$text': {'$search': 'physics'}}, user), None),
+        ('suggest', 'credentials', _scoped({'search_terms': {'$regex': '^phy'}}, user), None),
+    ]
+
+    assert find_collscans(mongod, queries) == []
+    results, _ = search_credentials(mongod, 'physics', user)
+    assert {r['title'] for r in results} == {'Diploma in Physics', 'Physics Olympiad'}
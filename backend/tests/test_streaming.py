@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from services.streaming import iter_batches, json_array_chunks, ndjson_lines
+
+
+def test_iter_batches_pulls_one_batch_at_a_time():
+    pulled = []
+
+    def source():
+        for i in range(5):
+            pulled.append(i)
+            yield i
+
+    batches = iter_batches(source(), 2)
+
+    assert next(batches) == [0, 1]
+    assert pulled == [0, 1]
+    assert list(batches) == [[2, 3], [4]]
+
+
+def test_ndjson_lines():
+    assert list(ndjson_lines([{'a': 1}, {'b': 'x'}])) == ['{"a": 1}\n', '{"b": "x"}\n']
+
+
+@pytest.mark.parametrize('items', [[], [{'a': 1}], [{'a': 1}, {'b': [2, 3]}]])
+def test_json_array_chunks_is_one_valid_array(items):
+    chunks = list(json_array_chunks(items))
+
+    assert len(chunks) == len(items) + 2
+    assert json.loads(''.join(chunks)) == items
+
+
+@pytest.fixture
+def credentials(db, login):
+    holder, _ = login(username='Jane Doe')
+    db.credentials.insert_many([
+        {'title': f'Credential {i}', 'recipient_id': holder['_id'] if i % 2 else None,
+         'image': 'base64 image', 'image_embedding': b'\0' * 8}
+        for i in range(5)
+    ])
+    return holder
+
+
+def test_admin_export_streams_ndjson(api, backend, login, credentials, monkeypatch):
+    monkeypatch.setattr(backend, 'EXPORT_BATCH_SIZE', 2)
+    _, headers = login('admin')
+
+    response = api.get('/api/admin/credentials/export', headers=headers, buffered=False)
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    assert 'filename=credentials.ndjson' in response.headers['Content-Disposition']
+    lines = [chunk.decode() for chunk in response.response]
+    response.close()
+
+    assert len(lines) == 5 and all(line.endswith('\n') for line in lines)
+    records = [json.loads(line) for line in lines]
+    assert [r['title'] for r in records] == [f'Credential {i}' for i in range(5)]
+    assert [r['owner'] for r in records] == ['Unknown', 'Jane Doe', 'Unknown', 'Jane Doe', 'Unknown']
+    assert records[1]['recipient_id'] == str(credentials['_id'])
+    assert not any('image' in r or 'image_embedding' in r for r in records)
+
+
+def test_admin_export_as_json_array(api, login, credentials):
+    _, headers = login('admin')
+
+    response = api.get('/api/admin/credentials/export?format=json', headers=headers)
+
+    assert response.mimetype == 'application/json'
+    assert [r['title'] for r in response.get_json()] == [f'Credential {i}' for i in range(5)]
+
+
+def test_export_rejects_unknown_formats(api, login):
+    _, headers = login('admin')
+
+    assert api.get('/api/admin/credentials/export?format=xml', headers=headers).status_code == 400
+
+
+@pytest.mark.parametrize('role', ['recipient', 'issuer'])
+def test_export_is_admin_only(api, login, credentials, role):
+    _, headers = login(role)
+
+    assert api.get('/api/admin/credentials/export', headers=headers).status_code == 403
+    assert api.get('/api/admin/credentials/export').status_code == 401
@@ -0,0 +1,101 @@
+import pytest
+
+from services import ttl_cache
+from services.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(ttl=30)
+    cache.set('a', 1)
+
+    clock[0] += 29.9
+    assert cache.get('a') == 1
+    clock[0] += 0.1
+    assert cache.get('a') is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+
+def test_invalidate_and_clear():
+    cache = TTLCache()
+    cache.set('a', 1)
+    cache.set('b', 2)
+
+    cache.invalidate('a')
+    cache.invalidate('missing')
+    assert cache.get('a') is None and cache.get('b') == 2
+    cache.clear()
+    assert cache.get('b') is None
+
+
+def current_user(backend, headers):
+    """The user document ``token_required`` hands to a route handler"""
+    with backend.app.test_request_context(headers=headers):
+        return backend.token_required(lambda user: user)()
+
+
+def test_cached_user_has_no_password_hash(api, backend, login):
+    user, headers = login()
+
+    assert 'password' not in current_user(backend, headers)
+    assert 'password' not in backend.user_cache.get(str(user['_id']))
+
+
+def test_handlers_get_an_isolated_copy(api, backend, login):
+    _, headers = login(organization={'name': 'Example University', 'departments': ['Physics']})
+
+    first = current_user(backend, headers)
+    first['role'] = 'admin'
+    first['organization']['departments'].append('Forged')
+
+    second = current_user(backend, headers)
+    assert second['role'] == 'recipient'
+    assert second['organization']['departments'] == ['Physics']
+
+
+def test_profile_update_is_visible_on_the_next_request(api, backend, login):
+    _, headers = login()
+    current_user(backend, headers)  # cached
+
+    assert api.put('/api/profile', json={'username': 'renamed'}, headers=headers).status_code == 200
+
+    assert current_user(backend, headers)['username'] == 'renamed'
+
+
+def test_admin_role_change_is_visible_on_the_next_request(api, backend, login):
+    user, headers = login()
+    _, admin_headers = login('admin')
+    current_user(backend, headers)
+
+    response = api.put(f"/api/admin/users/{user['_id']}", json={'role': 'issuer'}, headers=admin_headers)
+
+    assert response.status_code == 200
+    assert 'password' not in response.get_json()['user']
+    assert current_user(backend, headers)['role'] == 'issuer'
+
+
+def test_deleted_user_is_rejected_on_the_next_request(api, backend, login):
+    user, headers = login()
+    _, admin_headers = login('admin')
+    assert api.get('/api/profile', headers=headers).status_code == 200
+
+    assert api.delete(f"/api/admin/users/{user['_id']}", headers=admin_headers).status_code == 200
+
+    assert api.get('/api/profile', headers=headers).status_code == 404
@@ -0,0 +1,85 @@
+import datetime
+
+import pytest
+from bson import ObjectId
+
+from services.listings import all_credentials, issued_credentials, user_credentials
+from services.user_lookup import resolve_credential_users
+
+ONE_PAGE = [('credentials', 'find'), ('users', 'find')]
+
+
+def seed(db, count):
+    """One issuer and one recipient, and ``count`` credentials that each name a different second user"""
+    issuer_id, recipient_id = ObjectId(), ObjectId()
+    now = datetime.datetime(2024, 1, 1)
+    others = [{'_id': ObjectId(), 'username': f'user-{i}', 'email': f'user-{i}@example.com'} for i in range(count)]
+    db.users.insert_many(others + [
+        {'_id': issuer_id, 'username': 'issuer', 'email': 'issuer@example.com'},
+        {'_id': recipient_id, 'username': 'recipient', 'email': 'recipient@example.com'},
+    ])
+    db.credentials.insert_many(
+        [{'title': f'Held {i}', 'issuer_id': other['_id'], 'recipient_id': recipient_id,
+          'issue_date': now + datetime.timedelta(minutes=i)} for i, other in enumerate(others)] +
+        [{'title': f'Issued {i}', 'issuer_id': issuer_id, 'recipient_id': other['_id'],
+          'issue_date': now + datetime.timedelta(minutes=i)} for i, other in enumerate(others)]
+    )
+    return issuer_id, recipient_id
+
+
+LISTINGS = {
+    'credentials': lambda db, ids, limit: user_credentials(db, ids[1], limit),
+    'issuer': lambda db, ids, limit: issued_credentials(db, ids[0], limit),
+    'admin': lambda db, ids, limit: all_credentials(db, limit),
+}
+
+
+@pytest.mark.parametrize('listing', sorted(LISTINGS))
+@pytest.mark.parametrize('count', [1, 200])
+def test_listing_command_count_is_constant(counting_db, listing, count):
+    ids = seed(counting_db._db, count)
+    counting_db.commands.clear()
+    rows, _ = LISTINGS[listing](counting_db, ids, 200)
+    assert len(rows) == count if listing != 'admin' else 2 * count
+    assert counting_db.commands == ONE_PAGE
+
+
+def test_listing_rows_carry_resolved_names(db):
+    issuer_id, recipient_id = seed(db, 3)
+    held, _ = user_credentials(db, recipient_id, 50)
+    issued, _ = issued_credentials(db, issuer_id, 50)
+    everything, _ = all_credentials(db, 50)
+    assert [row['issuer_name'] for row in held] == ['user-2', 'user-1', 'user-0']
+    assert [row['recipient'] for row in issued] == ['user-2@example.com', 'user-1@example.com', 'user-0@example.com']
+    assert {row['owner'] for row in everything} == {'recipient', 'user-0', 'user-1', 'user-2'}
+
+
+def test_paged_listing_resolves_page_users_in_one_query(counting_db):
+    _, recipient_id = seed(counting_db._db, 500)
+    counting_db.commands.clear()
+    rows, next_cursor = user_credentials(counting_db, recipient_id, 50)
+    assert next_cursor is not None
+    assert len(rows) == 50
+    assert counting_db.commands == ONE_PAGE
+    counting_db.commands.clear()
+    more, _ = user_credentials(counting_db, recipient_id, 50, next_cursor)
+    assert {row['_id'] for row in more}.isdisjoint(row['_id'] for row in rows)
+    assert counting_db.commands == ONE_PAGE
+
+
+def test_page_verifies_on_chain_in_one_call(counting_db):
+    _, recipient_id = seed(counting_db._db, 3)
+    counting_db._db.credentials.update_many({}, {'$set': {'transaction_hash': '0x01', 'verification_code': '0xab'}})
+    calls = []
+
+    def verify_many(codes):
+        calls.append(codes)
+        return {'0xab': (True,)}
+
+    rows, _ = user_credentials(counting_db, recipient_id, 50, verify_many=verify_many)
+    assert calls == [['0xab'] * 3]
+    assert all(row['is_verified'] for row in rows)
+
+
+def test_resolve_users_skips_missing_ids(db):
+    assert resolve_credential_users(db, [{'issuer_id': None}, {}]) == {}
@@ -0,0 +1,135 @@
+import datetime
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from services import analytics
+from services.verification_log import VerificationLogWriter
+
+WHEN = datetime.datetime(2024, 3, 4, 12, 0)
+
+
+class FlakyDatabase:
+    """``db`` whose next ``insert_many`` calls fail as scripted, then go through to the real collection"""
+
+    def __init__(self, db):
+        self.real = db
+        self.failures = []
+
+    def __getitem__(self, name):
+        return self.real[name]
+
+    @property
+    def verifications(self):
+        return self
+
+    def insert_many(self, documents, ordered=True):
+        documents = list(documents)
+        if not self.failures:
+            return self.real.verifications.insert_many(documents, ordered=ordered)
+        failure = self.failures.pop(0)
+        if callable(failure):
+            failure = failure(documents)
+        raise failure
+
+
+@pytest.fixture
+def flaky(db):
+    return FlakyDatabase(db)
+
+
+@pytest.fixture
+def writer(flaky):
+    # Flushed by hand; the background thread never wakes up on its own during a test
+    writer = VerificationLogWriter(flaky, max_batch=1000, flush_interval=3600)
+    yield writer
+    writer._stopped.set()
+    writer._wakeup.set()
+
+
+def record(writer, recipient, is_valid=True, count=1):
+    for _ in range(count):
+        writer.record(recipient_id=recipient, is_valid=is_valid, created_at=WHEN)
+
+
+def counters(db, recipient):
+    doc = db[analytics.ROLLUPS].find_one({'_id': analytics.user_rollup_id(recipient)}) or {}
+    return doc.get('verifications_total', 0), doc.get('verifications_valid', 0)
+
+
+def test_record_buffers_without_writing(db, writer):
+    record(writer, 'r1', count=3)
+
+    assert db.verifications.count_documents({}) == 0
+    assert len(writer._buffer) == 3
+
+
+def test_flush_writes_the_batch_and_its_rollups(db, writer):
+    record(writer, 'r1', count=2)
+    record(writer, 'r1', is_valid=False)
+    writer.record(recipient_id=None, is_valid=False, created_at=WHEN)
+
+    assert writer.flush() == 4
+
+    assert db.verifications.count_documents({}) == 4
+    assert counters(db, 'r1') == (3, 2)
+    week = db[analytics.ROLLUPS].find_one({'_id': analytics.user_rollup_id('r1')})['verifications_by_week']
+    assert week == {analytics.week_key(WHEN): 3}
+    assert writer.flush() == 0
+
+
+def test_full_buffer_sheds_the_oldest_events(flaky):
+    writer = VerificationLogWriter(flaky, max_batch=1000, flush_interval=3600, max_buffer=2)
+    for recipient in ('r1', 'r2', 'r3'):
+        record(writer, recipient)
+
+    assert writer.dropped == 1
+    assert [event['recipient_id'] for event in writer._buffer] == ['r2', 'r3']
+
+
+def test_transient_failure_requeues_the_batch(db, flaky, writer):
+    record(writer, 'r1', count=2)
+    flaky.failures.append(AutoReconnect('primary stepped down'))
+
+    assert writer.flush() == 0
+    assert len(writer._buffer) == 2
+    assert counters(db, 'r1') == (0, 0)
+
+    record(writer, 'r1')
+    assert writer.flush() == 3
+    assert db.verifications.count_documents({}) == 3
+    assert counters(db, 'r1') == (3, 3)
+
+
+def test_events_inserted_by_a_failed_flush_are_counted_once(db, flaky, writer):
+    record(writer, 'r1', count=3)
+
+    def lost_reply(documents):
+        # The insert reached the server but the reply never came back
+        db.verifications.insert_many(documents[:2])
+        return AutoReconnect('connection reset')
+
+    flaky.failures.append(lost_reply)
+    assert writer.flush() == 0
+    assert writer.flush() == 3
+
+    assert db.verifications.count_documents({}) == 3
+    assert counters(db, 'r1') == (3, 3)
+
+
+def test_partial_failure_only_counts_inserted_events(db, flaky, writer):
+    record(writer, 'r1', count=2)
+    record(writer, 'r2', is_valid=False, count=2)
+
+    def reject_r2(documents):
+        errors = [{'index': i, 'code': 121, 'errmsg': 'Document failed validation'}
+                  for i, doc in enumerate(documents) if doc['recipient_id'] == 'r2']
+        db.verifications.insert_many([doc for doc in documents if doc['recipient_id'] != 'r2'])
+        return BulkWriteError({'writeErrors': errors, 'nInserted': len(documents) - len(errors)})
+
+    flaky.failures.append(reject_r2)
+
+    assert writer.flush() == 2
+    assert counters(db, 'r1') == (2, 2)
+    assert counters(db, 'r2') == (0, 0)
+    assert len(writer._buffer) == 0  # rejected events are not retried forever
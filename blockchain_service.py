@@ -1,6 +1,12 @@
 from web3 import Web3
 import os
 import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
 
 # Connect to local blockchain (e.g., Ganache, Hardhat, or Infura)
 WEB3_PROVIDER = os.environ.get('WEB3_PROVIDER', 'http://127.0.0.1:7545')
@@ -16,24 +22,400 @@ with open(CONTRACT_PATH) as f:
 
 credential_registry = web3.eth.contract(address=contract_address, abi=abi)
 
-# Example function to register a credential on-chain
-def register_credential_on_chain(issuer_address, recipient_address, verification_code, metadata):
-    # You must unlock the account or use a private key
-    # For demo, use the first account
-    account = web3.eth.accounts[0]
-    tx = credential_registry.functions.registerCredential(
-        issuer_address,
-        recipient_address,
-        verification_code,
-        metadata
-    ).build_transaction({
-        'from': account,
-        'nonce': web3.eth.get_transaction_count(account)
-    })
-    signed_tx = web3.eth.account.sign_transaction(tx, private_key=os.environ.get('PRIVATE_KEY'))
-    tx_hash = web3.eth.send_raw_transaction(signed_tx.rawTransaction)
-    return web3.toHex(tx_hash)
+
+class TransactionFailed(Exception):
+    pass
+
+
+class PendingTransaction:
+    """
+    A queued transaction. ``sent`` is set once it has been broadcast (``tx_hash``
+    and ``nonce`` are known from then on) or has failed; ``result()`` waits for
+    the receipt. A transaction whose broadcast was never confirmed fails but
+    keeps its ``tx_hash``: the node may have taken it after all.
+    """
+
+    def __init__(self, tx):
+        self.tx = tx
+        self.nonce = None
+        self.tx_hash = None
+        self.sent_at = None
+        self.sent = threading.Event()
+        # (raw transaction, hash) as last signed, re-broadcast unchanged when a send is ambiguous
+        self._signed = None
+        self._future = Future()
+
+    def result(self, timeout=None):
+        """Wait for the mined receipt; raises ``TransactionFailed`` on revert, drop or rejection"""
+        return self._future.result(timeout)
+
+    def done(self):
+        return self._future.done()
+
+
+class TransactionSender:
+    """
+    Pipelined transaction submission for one signing account.
+
+    Nonces are assigned locally instead of calling ``get_transaction_count``
+    per transaction, so concurrent callers never collide. A sender thread
+    drains the queue, signs up to ``max_batch`` transactions with consecutive
+    nonces and broadcasts them in one JSON-RPC batch without waiting for any
+    of them to be mined. A receipt thread resolves each ``PendingTransaction``
+    as its receipt appears.
+
+    Failures are reconciled so one bad transaction never stalls the rest:
+
+    - ``nonce too low`` (another process used the account): resync the nonce
+      from the node and re-sign the affected transactions
+    - any other rejection: the transaction fails; if later nonces were already
+      broadcast, its nonce is filled with a zero-value self-transfer so they
+      can still be mined, otherwise the nonce is reused
+    - no receipt within ``receipt_timeout`` (dropped from the mempool): the
+      transaction fails and the nonce is resynced from the node
+
+    A broadcast that fails without telling which transactions the node took
+    (timeout after the node accepted the batch, missing replies) is retried
+    with the very same signed transactions, so nonces and hashes do not
+    change and nothing is submitted twice. On that retry ``already known`` and
+    ``nonce too low`` mean the first attempt went through; those transactions
+    are tracked by hash like accepted ones. Retries back off exponentially (up
+    to ``max_rebroadcast_delay``) and stop after ``rebroadcast_timeout``: the
+    transactions then fail with ``TransactionFailed`` but keep their hash, so a
+    caller that stored it (the chain confirmer polls stored hashes) still
+    learns from the chain whether the first attempt was mined.
+    """
+
+    def __init__(self, w3, private_key, endpoint_uri=None, max_batch=50, poll_interval=1.0, receipt_timeout=600,
+                 rebroadcast_timeout=120, max_rebroadcast_delay=30):
+        self.w3 = w3
+        self.account = w3.eth.account.from_key(private_key)
+        self.address = self.account.address
+        self.endpoint_uri = endpoint_uri or getattr(w3.provider, 'endpoint_uri', None)
+        self.max_batch = max_batch
+        self.poll_interval = poll_interval
+        self.receipt_timeout = receipt_timeout
+        self.rebroadcast_timeout = rebroadcast_timeout
+        self.max_rebroadcast_delay = max_rebroadcast_delay
+        self.chain_id = w3.eth.chain_id
+        self._queue = queue.Queue()
+        self._retry = []  # re-signed ahead of the queue after a nonce resync
+        self._unconfirmed = []  # signed batch whose broadcast outcome is unknown, re-broadcast as is
+        self._unconfirmed_since = None
+        self._rebroadcast_delay = poll_interval
+        self._lock = threading.Lock()
+        self._nonce = None
+        self._in_flight = {}  # tx hash -> PendingTransaction
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._send_loop, name='tx-sender', daemon=True),
+            threading.Thread(target=self._receipt_loop, name='tx-receipts', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, contract_function, **tx_fields):
+        """
+        Queue a contract call; gas and fees are estimated here, in the caller's thread
+        :param contract_function: Bound contract function, e.g. ``contract.functions.issueCredential(...)``
+        :param tx_fields: Extra transaction fields (``gas``, ``value``, fee fields)
+        :return: ``PendingTransaction``
+        """
+        # The placeholder nonce stops web3 from querying one; the sender thread assigns the real one
+        tx = contract_function.build_transaction({
+            'from': self.address, 'nonce': 0, 'chainId': self.chain_id, **tx_fields
+        })
+        pending = PendingTransaction(tx)
+        self._queue.put(pending)
+        return pending
+
+    def stop(self):
+        self._stop.set()
+
+    def resync_nonce(self):
+        """Forget the local nonce; the next batch starts from the node's pending count"""
+        with self._lock:
+            self._nonce = None
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._in_flight)
+
+    def _next_batch(self):
+        batch, self._retry = self._retry[:self.max_batch], self._retry[self.max_batch:]
+        if not batch:
+            try:
+                batch.append(self._queue.get(timeout=self.poll_interval))
+            except queue.Empty:
+                return []
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _sign(self, tx):
+        signed = self.account.sign_transaction(tx)
+        # web3 v7 renamed rawTransaction to raw_transaction
+        raw = getattr(signed, 'raw_transaction', None) or signed.rawTransaction
+        return Web3.to_hex(raw), Web3.to_hex(signed.hash)
+
+    def _send_loop(self):
+        while not self._stop.is_set():
+            if self._unconfirmed:
+                # Goes before anything new, whose nonces follow this batch's
+                batch, self._unconfirmed = self._unconfirmed, []
+                self._send_signed(batch, rebroadcast=True)
+                continue
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._sign_batch(batch)
+            except Exception as e:
+                # No nonce from the node: nothing was signed or broadcast, so retry with fresh nonces
+                print(f"⚠️ Could not sign {len(batch)} transactions, retrying: {e}")
+                self.resync_nonce()
+                self._retry = batch + self._retry
+                self._stop.wait(self.poll_interval)
+                continue
+            self._send_signed(batch)
+
+    def _sign_batch(self, batch):
+        """Assign consecutive nonces to ``batch`` and sign every transaction"""
+        with self._lock:
+            if self._nonce is None:
+                self._nonce = self.w3.eth.get_transaction_count(self.address, 'pending')
+            first_nonce = self._nonce
+            self._nonce += len(batch)
+
+        for offset, pending in enumerate(batch):
+            pending.nonce = first_nonce + offset
+            pending.tx['nonce'] = pending.nonce
+            pending._signed = self._sign(pending.tx)
+
+    def _send_signed(self, batch, rebroadcast=False):
+        """
+        Broadcast a signed batch and reconcile each transaction's outcome
+        :param rebroadcast: The batch was already broadcast once, possibly successfully
+        """
+        try:
+            errors = self._broadcast([pending._signed[0] for pending in batch])
+        except Exception as e:
+            now = time.monotonic()
+            if not rebroadcast:
+                self._unconfirmed_since, self._rebroadcast_delay = now, self.poll_interval
+            if now - self._unconfirmed_since >= self.rebroadcast_timeout:
+                self._abandon(batch, e)
+                return
+            # The node may have taken some or all of the batch: send the same transactions again, never re-sign
+            print(f"⚠️ Transaction broadcast failed, re-broadcasting {len(batch)} transactions "
+                  f"in {self._rebroadcast_delay:.1f}s: {e}")
+            self._unconfirmed = batch
+            self._stop.wait(self._rebroadcast_delay)
+            self._rebroadcast_delay = min(self._rebroadcast_delay * 2, self.max_rebroadcast_delay)
+            return
+
+        first_nonce = batch[0].nonce
+        accepted, rejected, retry = [], [], []
+        now = time.monotonic()
+        for pending, error in zip(batch, errors):
+            tx_hash = pending._signed[1]
+            message = (error or '').lower()
+            # Retrying, "nonce too low" most likely means the first attempt was mined; the receipt tells
+            if error is None or 'already known' in message or (rebroadcast and 'nonce too low' in message):
+                pending.tx_hash, pending.sent_at = tx_hash, now
+                with self._lock:
+                    self._in_flight[tx_hash] = pending
+                pending.sent.set()
+                accepted.append(pending.nonce)
+            elif 'nonce too low' in message:
+                retry.append(pending)
+            else:
+                rejected.append((pending, error))
+
+        for pending, error in rejected:
+            pending._future.set_exception(TransactionFailed(error))
+            pending.sent.set()
+
+        if retry:
+            # Our nonces were used by someone else; later nonces of this batch are unaffected
+            print(f"⚠️ Nonce too low for {len(retry)} transactions, resyncing from the node")
+            self.resync_nonce()
+            self._retry = retry + self._retry
+
+        highest_accepted = max(accepted, default=first_nonce - 1)
+        gaps = [pending.nonce for pending, _ in rejected if pending.nonce < highest_accepted]
+        trailing = [pending.nonce for pending, _ in rejected if pending.nonce > highest_accepted]
+        if trailing and not retry:
+            # Nothing above these nonces was broadcast, so the next batch can simply reuse them
+            with self._lock:
+                if self._nonce == first_nonce + len(batch):
+                    self._nonce = min(trailing)
+        for nonce in gaps:
+            self._fill_gap(nonce, batch[0].tx)
+
+    def _abandon(self, batch, error):
+        """Fail a batch that could not be re-broadcast in time, handing out the hashes it may have been mined under"""
+        print(f"❌ Giving up on {len(batch)} transactions after {self.rebroadcast_timeout}s of failed broadcasts: {error}")
+        for pending in batch:
+            pending.tx_hash = pending._signed[1]
+            pending._future.set_exception(TransactionFailed(
+                f'Broadcast of nonce {pending.nonce} unconfirmed after {self.rebroadcast_timeout}s: {error}'
+            ))
+            pending.sent.set()
+        # Whatever the node did take, its pending count tells the next batch where to start
+        self.resync_nonce()
+
+    def _fill_gap(self, nonce, template):
+        """Occupy ``nonce`` with a zero-value self-transfer so the transactions after it can be mined"""
+        tx = {'from': self.address, 'to': self.address, 'value': 0, 'gas': 21000, 'nonce': nonce, 'chainId': self.chain_id}
+        for field in ('gasPrice', 'maxFeePerGas', 'maxPriorityFeePerGas'):
+            if field in template:
+                tx[field] = template[field]
+        raw, _ = self._sign(tx)
+        try:
+            error = self._broadcast([raw])[0]
+        except Exception as e:
+            # Maybe sent, maybe not; the resync below picks up the node's view either way
+            error = str(e)
+        if error:
+            # Later transactions stay stuck until they time out; resync so new ones are not queued behind them
+            print(f"⚠️ Could not fill nonce gap {nonce}: {error}")
+            self.resync_nonce()
+
+    def _rpc_batch(self, method, params_list):
+        """Post one JSON-RPC batch; returns replies aligned with ``params_list``"""
+        payload = [
+            {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+            for i, params in enumerate(params_list)
+        ]
+        response = requests.post(self.endpoint_uri, json=payload, timeout=30)
+        response.raise_for_status()
+        replies = response.json()
+        if not isinstance(replies, list):
+            # Node does not support batching, fall back to one request per item
+            replies = []
+            for i, params in enumerate(params_list):
+                reply = requests.post(
+                    self.endpoint_uri, json={'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}, timeout=30
+                )
+                reply.raise_for_status()
+                replies.append(reply.json())
+        ordered = [None] * len(params_list)
+        for reply in replies:
+            # Errors about the request as a whole (parse error, invalid request) carry a null id
+            reply_id = reply.get('id') if isinstance(reply, dict) else None
+            if isinstance(reply_id, int) and 0 <= reply_id < len(ordered):
+                ordered[reply_id] = reply
+        return ordered
+
+    def _broadcast(self, raw_transactions):
+        """
+        Send signed transactions in nonce order
+        :return: An error message (or ``None``) per transaction
+        :raises Exception: When it is unknown whether some transactions were accepted
+        """
+        replies = self._rpc_batch('eth_sendRawTransaction', [[raw] for raw in raw_transactions])
+        missing = sum(reply is None for reply in replies)
+        if missing:
+            raise RuntimeError(f'No reply for {missing} of {len(replies)} transactions')
+        return [None if 'result' in reply else (reply.get('error') or {}).get('message', 'Unknown error') for reply in replies]
+
+    def _receipt_loop(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.poll_interval)
+            try:
+                self._poll_receipts()
+            except Exception as e:
+                print(f"⚠️ Receipt poll failed: {e}")
+
+    def _poll_receipts(self):
+        """Resolve every in-flight transaction whose receipt is available, or that timed out"""
+        with self._lock:
+            tracked = list(self._in_flight.items())
+        if not tracked:
+            return
+        replies = self._rpc_batch('eth_getTransactionReceipt', [[tx_hash] for tx_hash, _ in tracked])
+
+        now = time.monotonic()
+        for (tx_hash, pending), reply in zip(tracked, replies):
+            receipt = (reply or {}).get('result')
+            if receipt:
+                if int(receipt.get('status', '0x0'), 16) == 1:
+                    pending._future.set_result(receipt)
+                else:
+                    pending._future.set_exception(TransactionFailed(f'Transaction {tx_hash} reverted'))
+            elif now - pending.sent_at > self.receipt_timeout:
+                pending._future.set_exception(TransactionFailed(f'Transaction {tx_hash} not mined in time'))
+                self.resync_nonce()
+            else:
+                continue
+            with self._lock:
+                self._in_flight.pop(tx_hash, None)
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    """The process-wide sender for the PRIVATE_KEY account, started on first use"""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = TransactionSender(
+                web3, os.environ.get('PRIVATE_KEY'),
+                max_batch=int(os.environ.get('TX_MAX_BATCH', 50)),
+                receipt_timeout=float(os.environ.get('TX_RECEIPT_TIMEOUT', 600)),
+                rebroadcast_timeout=float(os.environ.get('TX_REBROADCAST_TIMEOUT', 120))
+            )
+        return _sender
+
+
+# Register a credential on-chain; returns a PendingTransaction (``.sent.wait()`` then ``.tx_hash``, or ``.result()`` for the receipt)
+def register_credential_on_chain(credential_hash, metadata_hash, owner_address, verification_code, expires_at=0):
+    return get_sender().submit(
+        credential_registry.functions.issueCredential(
+            credential_hash,
+            metadata_hash,
+            owner_address,
+            expires_at,
+            verification_code
+        )
+    )
 
 # Example function to verify credential on-chain
 def verify_credential_on_chain(verification_code):
-    return credential_registry.functions.isCredentialValid(verification_code).call()
+    return credential_registry.functions.verifyCredential(verification_code).call()
+
+
+if __name__ == '__main__':
+    # Smoke test against a local Hardhat/Ganache node whose PRIVATE_KEY account is an authorized issuer:
+    #   python blockchain_service.py 200
+    import secrets
+    import sys
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    sender = get_sender()
+    started = time.monotonic()
+    submitted = [
+        register_credential_on_chain(
+            Web3.keccak(text=f'credential-{secrets.token_hex(8)}'),
+            Web3.keccak(text='metadata'),
+            sender.address,
+            f'SMOKE-{secrets.token_hex(6)}'
+        )
+        for _ in range(count)
+    ]
+    failed = 0
+    for pending in submitted:
+        try:
+            pending.result(timeout=sender.receipt_timeout)
+        except Exception as e:
+            failed += 1
+            print(f"❌ nonce {pending.nonce}: {e}")
+    elapsed = time.monotonic() - started
+    print(f"✅ {count - failed}/{count} transactions mined in {elapsed:.1f}s ({count / elapsed:.1f} tx/s)")
+    sender.stop()